@@ -0,0 +1,81 @@
+import base64
+import gzip
+import json
+import os
+
+# records url fetches to DIR/cassette.jsonl.gz and plays them back, for the
+# tools that fetch with urlopen/requests.get (generate.py, get_pending_jobs.py)
+#
+# - the same format as worker_health/cassette.py, one json entry per line
+#   keyed by 'GET <url>'. repeated fetches are served in recorded order, the
+#   last one repeats.
+# - flush() appends the recorded entries to the file and forgets them, so a
+#   tool recording in a loop (generate.py --daemon) only holds one cycle
+# - standard library only. the tools import it with sys.path.insert() of
+#   <repo>/common, found through realpath() so symlinked scripts work
+
+FILE_NAME = "cassette.jsonl.gz"
+
+
+class MissingResponse(Exception):
+    pass
+
+
+class UrlCassette:
+    def __init__(self, directory, replaying):
+        self.directory = directory
+        self.path = os.path.join(directory, FILE_NAME)
+        self.replaying = replaying
+        # {key: [entry, ...]}, for replay. the unflushed ones when recording.
+        self.entries = {}
+        # {key: next entry index} for replay
+        self.positions = {}
+        # the first flush replaces an older recording, later ones append
+        self.flushed = False
+        if replaying:
+            with gzip.open(self.path, "rt") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.entries.setdefault(entry["key"], []).append(entry)
+
+    # fetch_func() returns the response body (bytes), it's only called when
+    # recording
+    def fetch(self, url, fetch_func):
+        key = "GET %s" % url
+        if self.replaying:
+            return self.play(key)
+        content = fetch_func()
+        entry = {"key": key, "status": 200, "headers": {}}
+        try:
+            entry["body"] = content.decode()
+        except UnicodeDecodeError:
+            entry["body_b64"] = base64.b64encode(content).decode()
+        self.entries.setdefault(key, []).append(entry)
+        return content
+
+    def play(self, key):
+        entries = self.entries.get(key)
+        if not entries:
+            raise MissingResponse(
+                "no recorded response for %s in %s" % (key, self.path)
+            )
+        position = self.positions.get(key, 0)
+        self.positions[key] = position + 1
+        entry = entries[min(position, len(entries) - 1)]
+        if "body_b64" in entry:
+            return base64.b64decode(entry["body_b64"])
+        return entry["body"].encode()
+
+    def flush(self):
+        if self.replaying:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        mode = "at" if self.flushed else "wt"
+        # appended gzip members read back as one file
+        with gzip.open(self.path, mode) as f:
+            for key in sorted(self.entries):
+                for entry in self.entries[key]:
+                    f.write(json.dumps(entry, separators=(",", ":")))
+                    f.write("\n")
+        self.entries = {}
+        self.flushed = True
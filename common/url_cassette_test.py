@@ -0,0 +1,42 @@
+import gzip
+
+import pytest
+
+import url_cassette
+
+URL = "https://example.com/pending/proj-autophone/gecko-t-bitbar-gw-perf-p2"
+
+
+def no_network():
+    raise AssertionError("replay shouldn't fetch")
+
+
+def test_replays_recorded_responses(tmp_path):
+    recording = url_cassette.UrlCassette(str(tmp_path), replaying=False)
+    assert (
+        recording.fetch(URL, lambda: b'{"pendingTasks": 5}') == b'{"pendingTasks": 5}'
+    )
+    recording.fetch("https://example.com/binary", lambda: b"\xff\x00")
+    recording.flush()
+
+    replay = url_cassette.UrlCassette(str(tmp_path), replaying=True)
+    assert replay.fetch(URL, no_network) == b'{"pendingTasks": 5}'
+    assert replay.fetch("https://example.com/binary", no_network) == b"\xff\x00"
+    with pytest.raises(url_cassette.MissingResponse):
+        replay.fetch("https://example.com/other", no_network)
+
+
+def test_flush_appends_and_forgets_entries(tmp_path):
+    # an older recording is replaced
+    (tmp_path / url_cassette.FILE_NAME).write_bytes(gzip.compress(b"old\n"))
+    recording = url_cassette.UrlCassette(str(tmp_path), replaying=False)
+    for pending in range(3):
+        body = b'{"pendingTasks": %d}' % pending
+        recording.fetch(URL, lambda: body)
+        recording.flush()
+        assert recording.entries == {}
+
+    # each cycle's response, in order, then the last one repeats
+    replay = url_cassette.UrlCassette(str(tmp_path), replaying=True)
+    bodies = [replay.fetch(URL, no_network) for _i in range(4)]
+    assert bodies == [b'{"pendingTasks": %d}' % n for n in (0, 1, 2, 2)]
@@ -4,6 +4,7 @@
 #               counts among device types (p2, g5).
 #
 
+import atexit
 import os
 import yaml
 import hashlib
@@ -24,8 +25,16 @@ from urllib.error import HTTPError
 
 from collections import OrderedDict
 
+# shared with get_pending_jobs.py
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "common")
+)
+from url_cassette import MissingResponse, UrlCassette
+
 
 verbose = False
+# set by --record/--replay
+cassette = None
 
 
 class DPCGException(Exception):
@@ -70,7 +79,10 @@ class DevicePoolConfigGenerator:
 
     @staticmethod
     def get_url(url):
-        data = urlopen(url).read()
+        if cassette:
+            data = cassette.fetch(url, lambda: urlopen(url).read())
+        else:
+            data = urlopen(url).read()
         output = json.loads(data)
         return output
 
@@ -143,6 +155,9 @@ class DevicePoolConfigGenerator:
                     self.generate()
                 except HTTPError:
                     print("request failed, skipping this cycle...")
+                # one cycle's responses are kept in memory at a time
+                if cassette:
+                    cassette.flush()
                 print("Sleeping for %s minutes..." % self.sleep_time_min)
                 print("--")
                 time.sleep(self.sleep_time_sec)
@@ -471,16 +486,30 @@ if __name__ == "__main__":
     parser.add_argument(
         "-v", "--verbose", help="verbose mode", action="store_true", default=False
     )
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--record", metavar="DIR", help="save every http response to DIR"
+    )
+    group.add_argument(
+        "--replay",
+        metavar="DIR",
+        help="serve http responses saved with --record from DIR (no network)",
+    )
     args = parser.parse_args()
 
     # hacky
     verbose = args.verbose
+    if args.record:
+        cassette = UrlCassette(args.record, replaying=False)
+        atexit.register(cassette.flush)
+    elif args.replay:
+        cassette = UrlCassette(args.replay, replaying=True)
 
     dpcg = DevicePoolConfigGenerator(
         config_dir=args.config_dir, daemon_mode=args.daemon
     )
     try:
         dpcg.main()
-    except DPCGException as e:
+    except (DPCGException, MissingResponse) as e:
         print("ERROR: %s:" % e)
         sys.exit(1)
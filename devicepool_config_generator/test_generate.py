@@ -118,3 +118,37 @@ def test_extract_devices_from_device_groups(generate_obj, dgs):
         },
     }
     assert res == expected
+
+
+def test_url_cassette_replays_recorded_responses(tmp_path, monkeypatch):
+    import generate
+
+    url = "https://example.com/pending/proj-autophone/gecko-t-bitbar-gw-perf-p2"
+    bodies = iter([b'{"pendingTasks": 5}', b'{"pendingTasks": 7}'])
+
+    class FakeResponse:
+        def read(self):
+            return next(bodies)
+
+    monkeypatch.setattr(generate, "urlopen", lambda url: FakeResponse())
+    recording = generate.UrlCassette(str(tmp_path), replaying=False)
+    monkeypatch.setattr(generate, "cassette", recording)
+    # two --daemon cycles, flushed after each
+    for pending in (5, 7):
+        assert generate.DevicePoolConfigGenerator.get_url(url) == {
+            "pendingTasks": pending
+        }
+        recording.flush()
+        assert recording.entries == {}
+
+    def no_network(url):
+        raise AssertionError("replay shouldn't fetch")
+
+    monkeypatch.setattr(generate, "urlopen", no_network)
+    monkeypatch.setattr(
+        generate, "cassette", generate.UrlCassette(str(tmp_path), replaying=True)
+    )
+    assert generate.DevicePoolConfigGenerator.get_url(url) == {"pendingTasks": 5}
+    assert generate.DevicePoolConfigGenerator.get_url(url) == {"pendingTasks": 7}
+    with pytest.raises(generate.MissingResponse):
+        generate.DevicePoolConfigGenerator.get_url("https://example.com/other")
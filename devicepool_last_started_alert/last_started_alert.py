@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import argparse
+import collections
 import datetime
 import json
 import logging
@@ -9,6 +10,8 @@ import pprint
 import re
 import socket
 import subprocess
+import tempfile
+import threading
 import time
 from urllib.request import urlopen
 from urllib.error import HTTPError
@@ -20,6 +23,8 @@ from pdpyras import EventsAPISession
 MINUTES_OF_LOGS_TO_INSPECT = 15
 MINIMUM_LINES_OF_JOURNALCTL_OUTPUT = 10
 DAEMON_MODE_CHECK_FREQUENCY_SECONDS = 5 * 60
+# how long --follow-journal waits before restarting journalctl if it exits
+FOLLOW_RESTART_SECONDS = 5
 # TODO: load this from config file
 PD_SERVICE_ID = "PAYN6NV"
 
@@ -46,6 +51,19 @@ class LastStarted:
         self.pp = pprint.PrettyPrinter(indent=4)
         self.pd_session = None
         self.journalctl_lines_of_output = None
+        # the journal is read incrementally (see read_journal()). the last
+        # MINUTES_OF_LOGS_TO_INSPECT are kept as per second counts:
+        #   [epoch second, lines, started lines, finished lines, running lines]
+        self.journal_cursor = None
+        self.journal_window = collections.deque()
+        self.journal_counts = [0, 0, 0, 0]
+        # with --follow-journal a thread counts the lines as they're logged
+        self.journal_thread = None
+        self.journal_lock = threading.Lock()
+        # ends follow_journal()
+        self.journal_stopped = threading.Event()
+        # set when a test run starts during an incident, to check right away
+        self.journal_started = threading.Event()
 
         # TODO: persist in state dict/file?
         self.consecutive_failed_checks = 0
@@ -180,37 +198,137 @@ class LastStarted:
         self.pd_session.resolve(self.get_dedup_key(get_new_if_not_set=False))
         self.set_currently_alerting(False)
 
-    def started_lines_present(self, output):
-        if re.search(STARTED_REGEX, output):
-            return True
-        return False
-
-    def completed_lines_present(self, output):
-        if re.search(FINISHED_REGEX, output):
-            return True
-        return False
-
-    def running_lines_present(self, output):
-        lines = output.split("\n")
-        for line in lines:
-            matches = re.search(RUNNING_REGEX, line)
-            if matches:
-                count = matches.group(1)
-                if int(count) != 0:
-                    return True
-        return False
-
-    def get_journalctl_output(self):
+    def started_lines_present(self):
+        return self.journal_counts[1] > 0
+
+    def completed_lines_present(self):
+        return self.journal_counts[2] > 0
+
+    # lines with a non-zero RUNNING count
+    def running_lines_present(self):
+        return self.journal_counts[3] > 0
+
+    # returns True for a started line
+    def count_journal_line(self, timestamp, message):
+        counts = [
+            1,
+            1 if re.search(STARTED_REGEX, message) else 0,
+            1 if re.search(FINISHED_REGEX, message) else 0,
+            0,
+        ]
+        matches = re.search(RUNNING_REGEX, message)
+        if matches and int(matches.group(1)) != 0:
+            counts[3] = 1
+        second = int(timestamp)
+        if not self.journal_window or self.journal_window[-1][0] != second:
+            self.journal_window.append([second, 0, 0, 0, 0])
+        bucket = self.journal_window[-1]
+        for i, count in enumerate(counts):
+            bucket[i + 1] += count
+            self.journal_counts[i] += count
+        return counts[1] == 1
+
+    # yields (epoch seconds, message) for the journal entries after the last
+    # one read (journalctl --after-cursor, the first call starts
+    # MINUTES_OF_LOGS_TO_INSPECT back). with follow, keeps yielding entries as
+    # they're logged.
+    def read_journal_entries(self, follow=False):
         # NOTE: user running needs to be in adm group to not need sudo
-        cmd = (
-            "journalctl -u bitbar --since '%s minutes ago'" % MINUTES_OF_LOGS_TO_INSPECT
-        )
-        res = self.run_cmd(cmd)
-
-        lines = res.split("\n")
-        self.journalctl_lines_of_output = len(lines)
+        cmd = [
+            "journalctl",
+            "-u",
+            "bitbar",
+            "--no-pager",
+            "-o",
+            "json",
+            "--output-fields=MESSAGE",
+        ]
+        if follow:
+            cmd.append("--follow")
+        if self.journal_cursor:
+            cmd.extend(["--after-cursor", self.journal_cursor])
+        else:
+            cmd.extend(["--since", "%s minutes ago" % MINUTES_OF_LOGS_TO_INSPECT])
+        # streamed, an entry at a time. errors go to a file, not a pipe:
+        # nothing reads them until journalctl exits.
+        stderr = tempfile.TemporaryFile()
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr)
+        try:
+            for line in process.stdout:
+                try:
+                    entry = json.loads(line)
+                    cursor = entry["__CURSOR"]
+                    timestamp = int(entry["__REALTIME_TIMESTAMP"]) / 1000000
+                except (ValueError, KeyError, TypeError) as e:
+                    # the cursor stays at the last good entry
+                    print("skipping unreadable journal entry (%r): %r" % (e, line))
+                    continue
+                self.journal_cursor = cursor
+                message = entry.get("MESSAGE") or ""
+                if isinstance(message, list):
+                    # messages that aren't valid utf-8 are arrays of bytes
+                    message = bytes(message).decode("utf-8", "replace")
+                yield timestamp, message
+        finally:
+            process.stdout.close()
+            returncode = process.wait()
+            stderr.seek(0)
+            errors = stderr.read().decode("utf-8", "replace").strip()
+            stderr.close()
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, cmd, stderr=errors)
+
+    # forgets the lines older than MINUTES_OF_LOGS_TO_INSPECT
+    def expire_journal_window(self):
+        since = time.time() - MINUTES_OF_LOGS_TO_INSPECT * 60
+        while self.journal_window and self.journal_window[0][0] < since:
+            bucket = self.journal_window.popleft()
+            for i in range(len(self.journal_counts)):
+                self.journal_counts[i] -= bucket[i + 1]
+        self.journalctl_lines_of_output = self.journal_counts[0]
+
+    # counts the journal entries since the last call
+    def read_journal(self):
+        for timestamp, message in self.read_journal_entries():
+            self.count_journal_line(timestamp, message)
+        self.expire_journal_window()
+
+    # --follow-journal: counts the lines in a thread as they're logged (vs
+    # reading them at each check)
+    def start_following_journal(self):
+        self.journal_thread = threading.Thread(target=self.follow_journal, daemon=True)
+        self.journal_thread.start()
+
+    def follow_journal(self):
+        while not self.journal_stopped.is_set():
+            try:
+                for timestamp, message in self.read_journal_entries(follow=True):
+                    with self.journal_lock:
+                        started = self.count_journal_line(timestamp, message)
+                    if started and self.currently_alerting():
+                        self.journal_started.set()
+            except subprocess.CalledProcessError as e:
+                print(
+                    "journalctl exited with %s (%s), restarting in %s seconds"
+                    % (e.returncode, e.stderr, FOLLOW_RESTART_SECONDS)
+                )
+            except Exception as e:
+                # e.g. journalctl couldn't be started, the thread has to
+                # survive or the checks would use a stale window
+                print(
+                    "following the journal failed (%r), restarting in %s seconds"
+                    % (e, FOLLOW_RESTART_SECONDS)
+                )
+            # restarts after the last good entry (the cursor is kept), nothing
+            # is missed
+            self.journal_stopped.wait(FOLLOW_RESTART_SECONDS)
 
-        return res
+    # sleeps until the next check, or until a test run starts during an
+    # incident (with --follow-journal)
+    def wait_for_next_check(self, seconds):
+        if self.journal_started.wait(seconds):
+            print("Test run started during an incident, checking now.")
+            self.journal_started.clear()
 
     def run_cmd(self, cmd):
         return (
@@ -224,7 +342,7 @@ class LastStarted:
             toml.dump(dict_to_write, writer)
 
     def enough_journalctl_lines(self):
-        if self.journalctl_lines_of_output:
+        if self.journalctl_lines_of_output is not None:
             if self.journalctl_lines_of_output >= MINIMUM_LINES_OF_JOURNALCTL_OUTPUT:
                 return True
             return False
@@ -247,12 +365,17 @@ current_dedup_key = ""
 
     def perform_check(self, args):
         # TODO: make this set an instance var, default functions to use it
-        output = self.get_journalctl_output()
+        with self.journal_lock:
+            if self.journal_thread and self.journal_thread.is_alive():
+                # already counted as they were logged
+                self.expire_journal_window()
+            else:
+                self.read_journal()
+            started_lines_present = self.started_lines_present()
+            running_lines_present = self.running_lines_present()
+            enough_journalctl_lines = self.enough_journalctl_lines()
         currently_alerting = self.currently_alerting()
         jobs_in_queues = self.jobs_in_queues()
-        started_lines_present = self.started_lines_present(output)
-        running_lines_present = self.running_lines_present(output)
-        enough_journalctl_lines = self.enough_journalctl_lines()
 
         # INFO
         if args.verbose:
@@ -325,6 +448,12 @@ if __name__ == "__main__":
         help="specify multiple times for even more verbosity",
     )
     parser.add_argument("-d", "--daemon-mode", action="store_true")
+    parser.add_argument(
+        "-f",
+        "--follow-journal",
+        action="store_true",
+        help="in daemon mode, tail the journal and check as soon as a test run starts during an incident",
+    )
     args = parser.parse_args()
 
     ls = LastStarted()
@@ -341,8 +470,11 @@ if __name__ == "__main__":
             "Daemon mode activated. Will perform checks every %s seconds."
             % DAEMON_MODE_CHECK_FREQUENCY_SECONDS
         )
+        if args.follow_journal:
+            print("Following the journal.")
+            ls.start_following_journal()
         while True:
             ls.perform_check(args)
-            time.sleep(DAEMON_MODE_CHECK_FREQUENCY_SECONDS)
+            ls.wait_for_next_check(DAEMON_MODE_CHECK_FREQUENCY_SECONDS)
     else:
         ls.perform_check(args)
@@ -0,0 +1,192 @@
+import argparse
+import io
+import json
+import threading
+
+import pytest
+
+import last_started_alert
+
+
+def entry(cursor, timestamp, message):
+    return {
+        "__CURSOR": cursor,
+        "__REALTIME_TIMESTAMP": str(int(timestamp * 1000000)),
+        "MESSAGE": message,
+    }
+
+
+class FakePopen:
+    # stands in for subprocess.Popen. each journalctl run gets the next
+    # script item: a list of json lines (or raw bytes) to print, an error
+    # message (journalctl exits with 1) or an exception to raise. when the
+    # script runs out, done is set.
+    def __init__(self, script, done=None):
+        self.script = list(script)
+        self.done = done
+        self.commands = []
+
+    def __call__(self, cmd, stdout=None, stderr=None):
+        self.commands.append(cmd)
+        self.returncode = 0
+        item = []
+        if self.script:
+            item = self.script.pop(0)
+        elif self.done:
+            self.done.set()
+        if isinstance(item, Exception):
+            raise item
+        if isinstance(item, str):
+            stderr.write(item.encode())
+            self.returncode = 1
+            item = []
+        lines = [
+            line if isinstance(line, bytes) else (json.dumps(line) + "\n").encode()
+            for line in item
+        ]
+        self.stdout = io.BytesIO(b"".join(lines))
+        return self
+
+    def wait(self):
+        return self.returncode
+
+
+@pytest.fixture
+def ls(tmp_path, monkeypatch):
+    monkeypatch.setattr(last_started_alert, "STATE_FILE", str(tmp_path / "state.toml"))
+    monkeypatch.delenv("PAGERDUTY_TOKEN", raising=False)
+    return last_started_alert.LastStarted()
+
+
+def use_journal(monkeypatch, script, done=None):
+    popen = FakePopen(script, done)
+    monkeypatch.setattr(last_started_alert.subprocess, "Popen", popen)
+    return popen
+
+
+def test_read_journal_entries_continues_after_the_cursor(ls, monkeypatch):
+    popen = use_journal(
+        monkeypatch,
+        [
+            [
+                entry("c1", 1000.5, "test run 1 started"),
+                # messages that aren't valid utf-8
+                entry("c2", 1001, list(b"bad \xff bytes")),
+            ],
+            [entry("c3", 1002, "test run 1 finished")],
+        ],
+    )
+    assert list(ls.read_journal_entries()) == [
+        (1000.5, "test run 1 started"),
+        (1001, "bad � bytes"),
+    ]
+    assert "--since" in popen.commands[0]
+    assert ls.journal_cursor == "c2"
+
+    assert list(ls.read_journal_entries()) == [(1002, "test run 1 finished")]
+    assert popen.commands[1][-2:] == ["--after-cursor", "c2"]
+    assert ls.journal_cursor == "c3"
+
+
+def test_unreadable_entries_are_skipped(ls, monkeypatch):
+    use_journal(
+        monkeypatch,
+        [
+            [
+                entry("c1", 1000, "one"),
+                b"{not json\n",
+                {"__REALTIME_TIMESTAMP": "1001000000", "MESSAGE": "no cursor"},
+                entry("c4", 1002, "four"),
+            ]
+        ],
+    )
+    assert [m for _t, m in ls.read_journal_entries()] == ["one", "four"]
+    assert ls.journal_cursor == "c4"
+
+
+def test_journalctl_errors_are_raised(ls, monkeypatch):
+    use_journal(monkeypatch, ["No journal files were found."])
+    with pytest.raises(last_started_alert.subprocess.CalledProcessError) as e:
+        list(ls.read_journal_entries())
+    assert e.value.stderr == "No journal files were found."
+
+
+def test_journal_window_counts_and_expires(ls, monkeypatch):
+    now = 10000
+    monkeypatch.setattr(last_started_alert.time, "time", lambda: now)
+    window_seconds = last_started_alert.MINUTES_OF_LOGS_TO_INSPECT * 60
+    old = now - window_seconds - 10
+    assert ls.count_journal_line(old, "test run 1 started")
+    assert not ls.count_journal_line(old + 0.5, "test run 1 finished")
+    assert not ls.count_journal_line(
+        now - 5, "gecko-t-bitbar-gw-perf-p2 DISABLED 0 RUNNING 3"
+    )
+    ls.count_journal_line(now - 5, "gecko-t-bitbar-gw-perf-p2 DISABLED 0 RUNNING 0")
+    # one bucket per second
+    assert [bucket[0] for bucket in ls.journal_window] == [old, now - 5]
+    assert ls.journal_counts == [4, 1, 1, 1]
+
+    ls.expire_journal_window()
+    assert ls.journal_counts == [2, 0, 0, 1]
+    assert ls.journalctl_lines_of_output == 2
+    assert not ls.started_lines_present()
+    assert not ls.completed_lines_present()
+    assert ls.running_lines_present()
+    assert not ls.enough_journalctl_lines()
+
+
+def test_read_journal_counts_new_entries(ls, monkeypatch):
+    now = 10000
+    monkeypatch.setattr(last_started_alert.time, "time", lambda: now)
+    use_journal(
+        monkeypatch,
+        [
+            [entry("c%s" % i, now - 60 + i, "line %s" % i) for i in range(9)],
+            [entry("c9", now - 1, "test run 2 started")],
+        ],
+    )
+    ls.read_journal()
+    assert ls.journalctl_lines_of_output == 9
+    assert not ls.enough_journalctl_lines()
+    ls.read_journal()
+    assert ls.journalctl_lines_of_output == 10
+    assert ls.enough_journalctl_lines()
+    assert ls.started_lines_present()
+
+
+def test_follow_journal_survives_errors(ls, monkeypatch):
+    monkeypatch.setattr(last_started_alert, "FOLLOW_RESTART_SECONDS", 0.01)
+    popen = use_journal(
+        monkeypatch,
+        [
+            OSError("journalctl not found"),
+            [entry("c1", 1000, "test run 1 started"), b"{truncated"],
+            [entry("c2", 1001, "test run 2 started")],
+        ],
+        done=ls.journal_stopped,
+    )
+    ls.set_currently_alerting(True)
+    thread = threading.Thread(target=ls.follow_journal, daemon=True)
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive()
+
+    # restarted from the last good entry each time
+    assert "--since" in popen.commands[1]
+    assert popen.commands[2][-2:] == ["--after-cursor", "c1"]
+    assert popen.commands[3][-2:] == ["--after-cursor", "c2"]
+    assert ls.journal_counts[:2] == [2, 2]
+    # a test run started during an incident
+    assert ls.journal_started.is_set()
+
+
+def test_checks_read_the_journal_if_the_follower_died(ls, monkeypatch):
+    use_journal(monkeypatch, [[entry("c1", 1000, "test run 1 started")]])
+    ls.journal_thread = threading.Thread(target=lambda: None)
+    ls.journal_thread.start()
+    ls.journal_thread.join()
+    monkeypatch.setattr(ls, "jobs_in_queues", lambda: 0)
+    monkeypatch.setattr(last_started_alert.time, "time", lambda: 1000)
+    ls.perform_check(argparse.Namespace(verbose=0))
+    assert ls.journal_cursor == "c1"
+    assert ls.started_lines_present()
@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
 
 import sys
+import atexit
 import logging
 import json
+import os
 import datetime
 import math
 import time
@@ -16,11 +18,25 @@ except:
     print("Please `pip3 install tqdm requests requests-cache` or use the Pipfile.")
     sys.exit(1)
 
+# shared with devicepool_config_generator/generate.py
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "common")
+)
+from url_cassette import UrlCassette
+
+# optional, decodes the 2000-row treeherder pages much faster than r.json()
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 LOG_LEVELS = ["BONKERS", "INTENSE", "DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
 DEFAULT_LOG_LEVEL = "WARNING"
 
 REQUEST_DEBUGGING = False
 REQUEST_CACHING = False
+# set by --record/--replay
+cassette = None
 
 if REQUEST_DEBUGGING:
     # These two lines enable debugging at httplib level (requests->urllib3->http.client)
@@ -40,6 +56,7 @@ if REQUEST_DEBUGGING:
     requests_log.setLevel(logging.DEBUG)
     requests_log.propagate = True
 
+
 #
 # TC schema
 #
@@ -65,8 +82,15 @@ class PendingJobs:
         }
         if self.log_level <= 0:
             tqdm.write("Fetching %s... " % an_url)
-        r = requests.get(an_url, headers=headers)
-        return r.json()
+        if cassette:
+            content = cassette.fetch(
+                an_url, lambda: requests.get(an_url, headers=headers).content
+            )
+        else:
+            content = requests.get(an_url, headers=headers).content
+        if orjson:
+            return orjson.loads(content)
+        return json.loads(content)
 
     def get_push_pending_jobs(
         self, project, push_id, platform_filter=None, inspect=True
@@ -432,8 +456,23 @@ if __name__ == "__main__":
         const=-1,
         help="specify multiple times for more verbosity",
     )
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--record", metavar="DIR", help="save every http response to DIR"
+    )
+    group.add_argument(
+        "--replay",
+        metavar="DIR",
+        help="serve http responses saved with --record from DIR (no network)",
+    )
     args = parser.parse_args()
 
+    if args.record:
+        cassette = UrlCassette(args.record, replaying=False)
+        atexit.register(cassette.flush)
+    elif args.replay:
+        cassette = UrlCassette(args.replay, replaying=True)
+
     if args.caching:
         try:
             import requests_cache
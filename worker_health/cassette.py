@@ -0,0 +1,164 @@
+import atexit
+import base64
+import gzip
+import json
+import logging
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+logger = logging.getLogger(__name__)
+
+# records http responses to an archive and plays them back
+#
+# - `--record DIR` saves every response fetched through tc_client's session
+#   (continuationToken pages included) to DIR/cassette.jsonl.gz
+# - `--replay DIR` serves those responses instead of hitting the network,
+#   so cpu-side code can be profiled on production-shaped data
+# - responses are keyed by method, url (with query) and request body.
+#   repeated requests are served in recorded order, the last one repeats.
+# - requests missing from the archive fail with a ConnectionError
+
+FILE_NAME = "cassette.jsonl.gz"
+# only these headers are kept
+KEPT_HEADERS = ["Content-Type", "Retry-After"]
+
+
+class Cassette:
+    def __init__(self, directory, mode):
+        if mode not in ("record", "replay"):
+            raise ValueError("mode must be 'record' or 'replay' (got %s)" % mode)
+        self.directory = directory
+        self.path = os.path.join(directory, FILE_NAME)
+        self.mode = mode
+        # {key: [entry, ...]}
+        self.entries = {}
+        # {key: next entry index} for replay
+        self.positions = {}
+        self.lock = threading.Lock()
+        if self.replaying:
+            self.load()
+
+    @property
+    def replaying(self):
+        return self.mode == "replay"
+
+    @staticmethod
+    def key(method, url, body=None):
+        if body:
+            if isinstance(body, str):
+                body = body.encode()
+            return "%s %s %s" % (method, url, base64.b64encode(body).decode())
+        return "%s %s" % (method, url)
+
+    def load(self):
+        with gzip.open(self.path, "rt") as f:
+            for line in f:
+                entry = json.loads(line)
+                self.entries.setdefault(entry["key"], []).append(entry)
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with self.lock:
+            entries = [e for key in sorted(self.entries) for e in self.entries[key]]
+        with gzip.open(self.path, "wt") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, separators=(",", ":")))
+                f.write("\n")
+        logger.info("saved %s responses to %s" % (len(entries), self.path))
+
+    def record(self, key, status, headers, content):
+        entry = {"key": key, "status": status, "headers": headers}
+        try:
+            entry["body"] = content.decode()
+        except UnicodeDecodeError:
+            entry["body_b64"] = base64.b64encode(content).decode()
+        with self.lock:
+            self.entries.setdefault(key, []).append(entry)
+
+    # returns (status, headers, content), None if the key wasn't recorded
+    def play(self, key):
+        with self.lock:
+            entries = self.entries.get(key)
+            if not entries:
+                return None
+            position = self.positions.get(key, 0)
+            self.positions[key] = position + 1
+            entry = entries[min(position, len(entries) - 1)]
+        if "body_b64" in entry:
+            content = base64.b64decode(entry["body_b64"])
+        else:
+            content = entry["body"].encode()
+        return entry["status"], entry["headers"], content
+
+
+class CassetteAdapter(HTTPAdapter):
+    # wraps the real adapter, which is only used when recording
+    def __init__(self, cassette, adapter):
+        super().__init__()
+        self.cassette = cassette
+        self.adapter = adapter
+
+    def send(self, request, **kwargs):
+        key = Cassette.key(request.method, request.url, request.body)
+        if self.cassette.replaying:
+            played = self.cassette.play(key)
+            if played is None:
+                raise requests.exceptions.ConnectionError(
+                    "no recorded response for %s in %s" % (key, self.cassette.path),
+                    request=request,
+                )
+            return self.build_replayed_response(request, *played)
+        response = self.adapter.send(request, **kwargs)
+        headers = {
+            name: response.headers[name]
+            for name in KEPT_HEADERS
+            if name in response.headers
+        }
+        self.cassette.record(key, response.status_code, headers, response.content)
+        return response
+
+    @staticmethod
+    def build_replayed_response(request, status, headers, content):
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = content
+        response.url = request.url
+        response.request = request
+        response.reason = "Replayed"
+        return response
+
+    def close(self):
+        self.adapter.close()
+
+
+def add_arguments(parser):
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--record",
+        metavar="DIR",
+        help="save every http response to DIR (see --replay).",
+    )
+    group.add_argument(
+        "--replay",
+        metavar="DIR",
+        help="serve http responses saved with --record from DIR (no network).",
+    )
+
+
+# returns a Cassette for --record/--replay (None if neither was passed).
+# recordings are saved at exit.
+def from_args(args):
+    if args.record:
+        cassette = Cassette(args.record, "record")
+        atexit.register(cassette.save)
+        return cassette
+    if args.replay:
+        return Cassette(args.replay, "replay")
+    return None
@@ -0,0 +1,62 @@
+import pytest
+import requests
+import taskcluster.utils
+
+import cassette
+import fake_tc_queue
+import tc_client
+import utils
+
+
+def test_repeated_requests_replay_in_order(tmp_path):
+    recording = cassette.Cassette(str(tmp_path), "record")
+    key = cassette.Cassette.key("GET", "https://example.com/pending/p/wt")
+    recording.record(key, 200, {}, b'{"pendingTasks": 1}')
+    recording.record(key, 200, {}, b'{"pendingTasks": 2}')
+    recording.record("GET https://example.com/binary", 200, {}, b"\xff\x00")
+    recording.save()
+
+    replay = cassette.Cassette(str(tmp_path), "replay")
+    assert replay.play(key)[2] == b'{"pendingTasks": 1}'
+    assert replay.play(key)[2] == b'{"pendingTasks": 2}'
+    # the last response repeats
+    assert replay.play(key)[2] == b'{"pendingTasks": 2}'
+    assert replay.play("GET https://example.com/binary")[2] == b"\xff\x00"
+    assert replay.play("GET https://example.com/missing") is None
+
+
+def test_record_then_replay_pages_without_network(tmp_path, monkeypatch):
+    # restored after the test
+    monkeypatch.setattr(
+        taskcluster.utils,
+        "makeSingleHttpRequest",
+        taskcluster.utils.makeSingleHttpRequest,
+    )
+    tc_client.install_taskcluster_transport()
+    fleet = fake_tc_queue.FakeFleet(workers=12, worker_types=1)
+    url_template = "%s/api/queue/v1/provisioners/%s/worker-types/%s/workers"
+    root_url = tc_client.ROOT_URL
+    try:
+        tc_client.use_cassette(cassette.Cassette(str(tmp_path), "record"))
+        with fake_tc_queue.FakeQueueServer(fleet, page_size=5) as server:
+            tc_client.set_root_url(server.root_url)
+            url = url_template % (
+                server.root_url,
+                fleet.provisioner,
+                fleet.worker_types[0],
+            )
+            recorded = list(utils.iter_jsonc(url, "workers"))
+            task_id = next(iter(fleet.tasks))
+            status = tc_client.queue_client().status(task_id)
+        tc_client._cassette.save()
+
+        # the server is gone, everything comes from the archive
+        tc_client.use_cassette(cassette.Cassette(str(tmp_path), "replay"))
+        assert list(utils.iter_jsonc(url, "workers")) == recorded
+        assert len(recorded) == 12
+        assert tc_client.queue_client().status(task_id) == status
+        with pytest.raises(requests.exceptions.ConnectionError):
+            tc_client.get("%s/api/queue/v1/task/unrecorded/status" % server.root_url)
+    finally:
+        tc_client.use_cassette(None)
+        tc_client.set_root_url(root_url)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+import argparse
+import contextlib
+import io
+import logging
+import os
+import tempfile
+from time import time as timer
+
+import fake_tc_queue
+import fitness
+import http_metrics
+import tc_client
+import worker_health
+
+# times fitness.py and WorkerHealth.gather_data() against fake_tc_queue.py
+# at several fleet sizes, without touching production taskcluster.
+#
+# client-side rate limiting is off (the default), so the numbers measure the
+# tools, not the limiter.
+# "first row" is how long fitness took to show its first worker.
+
+
+def run_fitness(provisioner, engine, stream):
+    f = fitness.Fitness(log_level=0, provisioner=provisioner, task_cache=False)
+    f.args = argparse.Namespace(
+        engine=engine,
+        sort_order="worker_id",
+        only_show_alerting=False,
+        humanize_hashes=False,
+        ping=False,
+        daemon_url=None,
+        stream=stream,
+        table=False,
+    )
+    with contextlib.redirect_stdout(io.StringIO()):
+        renderer = f.main(provisioner, None, None)
+    return renderer.first_row_seconds
+
+
+def run_worker_health(devicepool_config_path):
+    wh = worker_health.WorkerHealth(
+        task_cache=False, devicepool_config_path=devicepool_config_path
+    )
+    wh.gather_data()
+
+
+def measure(func, *args):
+    tc_client.reset_stats()
+    http_metrics.reset()
+    start = timer()
+    first_row = func(*args)
+    elapsed = timer() - start
+    return elapsed, first_row, tc_client.get_stats()["requests"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="benchmark fitness and worker_health against a local fake queue."
+    )
+    parser.add_argument(
+        "-s",
+        "--sizes",
+        default="10,500,5000",
+        help="comma separated fleet sizes (default is 10,500,5000).",
+    )
+    parser.add_argument(
+        "-t",
+        "--worker-types",
+        default=10,
+        type=int,
+        help="worker types in each fleet (default is 10).",
+    )
+    parser.add_argument(
+        "--latency-ms",
+        default=0,
+        type=float,
+        help="per response latency added by the fake server.",
+    )
+    parser.add_argument(
+        "-e",
+        "--engine",
+        default="threadpool",
+        choices=["threadpool", "asyncio"],
+        help="fitness engine to use (default is threadpool).",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="run fitness with --stream (rows as each worker finishes).",
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="print per-endpoint metrics."
+    )
+    args = parser.parse_args()
+
+    # worker_health logs at INFO by default
+    logging.getLogger().setLevel(logging.WARNING)
+    tc_client.install_taskcluster_transport()
+
+    print(
+        "%-8s %-14s %10s %10s %10s %10s"
+        % ("workers", "tool", "seconds", "first row", "requests", "req/s")
+    )
+    for size in [int(s) for s in args.sizes.split(",")]:
+        fleet = fake_tc_queue.FakeFleet(workers=size, worker_types=args.worker_types)
+        with fake_tc_queue.FakeQueueServer(
+            fleet, latency=args.latency_ms / 1000
+        ) as server, tempfile.TemporaryDirectory() as tmp_dir:
+            tc_client.set_root_url(server.root_url)
+            config_path = os.path.join(tmp_dir, "config.yml")
+            fleet.write_devicepool_config(config_path)
+
+            runs = [
+                ("fitness", run_fitness, fleet.provisioner, args.engine, args.stream),
+                ("worker_health", run_worker_health, config_path),
+            ]
+            for name, func, *func_args in runs:
+                elapsed, first_row, requests = measure(func, *func_args)
+                # worker_health has no rows
+                first_row = "-" if first_row is None else "%.2f" % first_row
+                print(
+                    "%-8s %-14s %10.2f %10s %10s %10.1f"
+                    % (
+                        size,
+                        name,
+                        elapsed,
+                        first_row,
+                        requests,
+                        requests / max(elapsed, 0.001),
+                    )
+                )
+                if args.verbose:
+                    print(http_metrics.format_table())
@@ -0,0 +1,564 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime
+import http.server
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from urllib.parse import parse_qs, urlsplit
+
+import yaml
+
+# local stand-in for the taskcluster queue api, for offline benchmarking
+#
+# serves a synthetic fleet of any size:
+#   - /provisioners/<p>/worker-types                       (listWorkerTypes)
+#   - /provisioners/<p>/worker-types/<wt>/workers          (listWorkers, quarantined=true)
+#   - /provisioners/<p>/worker-types/<wt>/workers/<g>/<id> (getWorker, PUT quarantineWorker)
+#   - /task/<taskId>/status                                (status)
+#   - /pending/<p>/<wt>                                    (pendingTasks)
+#   - /task-group/<taskGroupId>/list                       (listTaskGroup)
+#
+# with push_minutes (--push-minutes), tasks are grouped by push, and the
+# pushes are in the index (see fitness_history.py):
+#   - /api/index/v1/namespaces/gecko.v2.<project>.pushdate.<y>.<m>.<d> (listNamespaces)
+#   - /api/index/v1/tasks/<push namespace>.firefox                     (listTasks)
+#
+# list endpoints page with continuationToken. latency and errors (500s,
+# 429s and truncated json) can be injected.
+#
+# usage:
+#   ./fake_tc_queue.py --workers 500 --port 8080
+#   TC_ROOT_URL=http://127.0.0.1:8080 ./fitness.py
+
+API_PREFIX = "/api/queue/v1"
+INDEX_API_PREFIX = "/api/index/v1"
+DEFAULT_PROVISIONER = "proj-autophone"
+# taskcluster's default (and max) page size
+DEFAULT_PAGE_SIZE = 1000
+# weights for the state of generated tasks
+TASK_STATES = [
+    ("completed", 80),
+    ("failed", 8),
+    ("exception", 5),
+    ("running", 5),
+    ("pending", 2),
+]
+
+
+def tc_timestamp(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.") + "%03dZ" % (dt.microsecond // 1000)
+
+
+class FakeFleet:
+    def __init__(
+        self,
+        workers=50,
+        worker_types=5,
+        tasks_per_worker=10,
+        quarantined_ratio=0.05,
+        provisioner=DEFAULT_PROVISIONER,
+        seed=0,
+        now=None,
+        recent_task_limit=None,
+        worker_groups=1,
+        push_minutes=None,
+        project="autoland",
+    ):
+        self.provisioner = provisioner
+        self.rng = random.Random(seed)
+        self.now = now or datetime.datetime.now(datetime.timezone.utc)
+        self.worker_types = [
+            "gecko-t-fake-test-%s" % i for i in range(max(worker_types, 1))
+        ]
+        # {worker_type: {worker_id: worker}}
+        self.workers = {wt: {} for wt in self.worker_types}
+        # {task_id: status}
+        self.tasks = {}
+        # {task_group_id: [task_id, ...]}
+        self.task_groups = {}
+        self.project = project
+        # {push time ('20200131123456'): task_group_id}
+        self.pushes = {}
+        self.pending = {wt: self.rng.randint(0, 200) for wt in self.worker_types}
+        self.lock = threading.Lock()
+
+        task_number = 0
+        states = [state for state, _weight in TASK_STATES]
+        weights = [weight for _state, weight in TASK_STATES]
+        for i in range(workers):
+            worker_type = self.worker_types[i % len(self.worker_types)]
+            worker_id = "fake-%s" % i
+            worker_group = "fake-group"
+            if worker_groups > 1:
+                worker_group = "fake-group-%s" % (i % worker_groups)
+            recent_tasks = []
+            for j in range(tasks_per_worker):
+                task_id = "fakeTask%014d" % task_number
+                task_number += 1
+                # most recent task last
+                minutes_ago = (tasks_per_worker - j) * self.rng.randint(5, 30)
+                state = self.rng.choices(states, weights)[0]
+                # one group per worker type, or per push
+                task_group_id = None
+                if push_minutes:
+                    task_group_id = self.push_group_id(minutes_ago, push_minutes)
+                self.tasks[task_id] = self.task_status(
+                    task_id,
+                    worker_type,
+                    worker_group,
+                    worker_id,
+                    state,
+                    minutes_ago,
+                    task_group_id,
+                )
+                self.task_groups.setdefault(
+                    self.tasks[task_id]["status"]["taskGroupId"], []
+                ).append(task_id)
+                recent_tasks.append({"taskId": task_id, "runId": 0})
+            # like taskcluster, recentTasks can be shorter than the history
+            if recent_task_limit:
+                recent_tasks = recent_tasks[-recent_task_limit:]
+            worker = {
+                "workerGroup": worker_group,
+                "workerId": worker_id,
+                "firstClaim": tc_timestamp(self.now - datetime.timedelta(days=30)),
+                "recentTasks": recent_tasks,
+            }
+            if recent_tasks:
+                worker["latestTask"] = recent_tasks[-1]
+            if self.rng.random() < quarantined_ratio:
+                worker["quarantineUntil"] = tc_timestamp(
+                    self.now + datetime.timedelta(days=1000)
+                )
+            self.workers[worker_type][worker_id] = worker
+
+    # the push before a task started. pushes are push_minutes apart.
+    def push_group_id(self, minutes_ago, push_minutes):
+        pushed = self.now - datetime.timedelta(
+            minutes=(minutes_ago // push_minutes + 1) * push_minutes
+        )
+        push = pushed.strftime("%Y%m%d%H%M%S")
+        if push not in self.pushes:
+            self.pushes[push] = "fakePush%014d" % zlib.crc32(push.encode())
+        return self.pushes[push]
+
+    def task_status(
+        self,
+        task_id,
+        worker_type,
+        worker_group,
+        worker_id,
+        state,
+        minutes_ago,
+        task_group_id=None,
+    ):
+        started = self.now - datetime.timedelta(minutes=minutes_ago)
+        run = {"runId": 0, "state": state, "workerGroup": worker_group}
+        if state != "pending":
+            run["workerId"] = worker_id
+            run["started"] = tc_timestamp(started)
+        if state not in ("pending", "running"):
+            run["resolved"] = tc_timestamp(started + datetime.timedelta(minutes=4))
+        if not task_group_id:
+            # stable across processes (cassette urls include it)
+            task_group_id = "fakeGroup%013d" % zlib.crc32(worker_type.encode())
+        return {
+            "status": {
+                "taskId": task_id,
+                "provisionerId": self.provisioner,
+                "workerType": worker_type,
+                "taskGroupId": task_group_id,
+                "schedulerId": "gecko-level-3",
+                "deadline": tc_timestamp(started + datetime.timedelta(days=1)),
+                "expires": tc_timestamp(started + datetime.timedelta(days=365)),
+                "retriesLeft": 5,
+                "state": state,
+                "runs": [run],
+            }
+        }
+
+    def list_worker_summaries(self, worker_type, quarantined=False):
+        # listWorkers doesn't include recentTasks
+        summaries = []
+        with self.lock:
+            for worker in self.workers.get(worker_type, {}).values():
+                if quarantined and "quarantineUntil" not in worker:
+                    continue
+                summary = {
+                    key: value for key, value in worker.items() if key != "recentTasks"
+                }
+                summaries.append(summary)
+        return summaries
+
+    def quarantine(self, worker_type, worker_id, quarantine_until, worker_group=None):
+        with self.lock:
+            worker = self.workers.get(worker_type, {}).get(worker_id)
+            if not worker:
+                return None
+            if worker_group and worker["workerGroup"] != worker_group:
+                return None
+            worker["quarantineUntil"] = quarantine_until
+            return dict(worker)
+
+    # listNamespaces of a day's pushes
+    def list_push_namespaces(self, namespace):
+        m = re.match(r"^gecko\.v2\.([^.]+)\.pushdate\.(\d+)\.(\d+)\.(\d+)$", namespace)
+        if not m or m.group(1) != self.project:
+            return []
+        day = "%04d%02d%02d" % tuple(int(part) for part in m.groups()[1:])
+        return [
+            {
+                "namespace": "%s.%s" % (namespace, push),
+                "name": push,
+                "expires": tc_timestamp(self.now + datetime.timedelta(days=365)),
+            }
+            for push in sorted(self.pushes)
+            if push.startswith(day)
+        ]
+
+    # listTasks of a push's builds, the first task of the push stands in
+    def list_push_tasks(self, namespace):
+        m = re.match(
+            r"^gecko\.v2\.[^.]+\.pushdate\.[\d.]+\.(\d{14})\.firefox$", namespace
+        )
+        if not m or m.group(1) not in self.pushes:
+            return []
+        return [
+            {
+                "namespace": "%s.linux64-opt" % namespace,
+                "taskId": self.task_groups[self.pushes[m.group(1)]][0],
+                "rank": 0,
+                "data": {},
+                "expires": tc_timestamp(self.now + datetime.timedelta(days=365)),
+            }
+        ]
+
+    def devicepool_config(self):
+        # the shape WorkerHealth.set_configured_worker_counts() reads
+        config = {"device_groups": {}, "projects": {}}
+        for i, worker_type in enumerate(self.worker_types):
+            device_group = "test-fake-%s" % i
+            config["device_groups"][device_group] = {
+                worker_id: None for worker_id in self.workers[worker_type]
+            }
+            config["projects"]["fake-test-%s" % i] = {
+                "device_group_name": device_group,
+                "additional_parameters": {"TC_WORKER_TYPE": worker_type},
+            }
+        return config
+
+    def write_devicepool_config(self, path):
+        with open(path, "w") as f:
+            yaml.dump(self.devicepool_config(), f)
+
+
+class FakeQueueHandler(http.server.BaseHTTPRequestHandler):
+    # keep-alive, so connection pooling behaves like production
+    protocol_version = "HTTP/1.1"
+    # headers and body are separate writes, avoid delayed ack stalls
+    disable_nagle_algorithm = True
+
+    routes = [
+        (r"/provisioners/([^/]+)/worker-types/?$", "list_worker_types"),
+        (r"/provisioners/([^/]+)/worker-types/([^/]+)/workers/?$", "list_workers"),
+        (
+            r"/provisioners/([^/]+)/worker-types/([^/]+)/workers/([^/]+)/([^/]+)$",
+            "get_worker",
+        ),
+        (r"/task/([^/]+)/status$", "task_status"),
+        (r"/pending/([^/]+)/([^/]+)$", "pending_tasks"),
+        (r"/task-group/([^/]+)/list$", "list_task_group"),
+    ]
+    index_routes = [
+        (r"/namespaces/([^/]+)$", "list_namespaces"),
+        (r"/tasks/([^/]+)$", "list_tasks"),
+    ]
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, body, raw=None):
+        data = raw if raw is not None else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if status == 429:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def inject(self):
+        # returns True if an error response was sent
+        server = self.server
+        if server.latency:
+            time.sleep(
+                max(server.latency + server.rng.uniform(-1, 1) * server.jitter, 0)
+            )
+        if server.error_rate and server.rng.random() < server.error_rate:
+            kind = server.rng.choice(server.error_kinds)
+            if kind == "500":
+                self.send_json(500, {"code": "InternalServerError"})
+            elif kind == "429":
+                self.send_json(429, {"code": "TooManyRequests"})
+            else:
+                # truncated json, for decode error handling
+                self.send_json(200, None, raw=b'{"workers": [')
+            return True
+        return False
+
+    def route(self):
+        parts = urlsplit(self.path)
+        if parts.path.startswith(API_PREFIX):
+            path = parts.path[len(API_PREFIX) :]
+            routes = self.routes
+        elif parts.path.startswith(INDEX_API_PREFIX):
+            path = parts.path[len(INDEX_API_PREFIX) :]
+            routes = self.index_routes
+        else:
+            return None, None, None
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        for pattern, name in routes:
+            m = re.match(pattern, path)
+            if m:
+                return name, m.groups(), query
+        return None, None, None
+
+    def paginate(self, items, list_key, query):
+        page_size = min(
+            int(query.get("limit", DEFAULT_PAGE_SIZE)), self.server.page_size
+        )
+        start = int(query.get("continuationToken", 0))
+        body = {list_key: items[start : start + page_size]}
+        if start + page_size < len(items):
+            body["continuationToken"] = str(start + page_size)
+        return body
+
+    def do_GET(self):
+        self.server.count_request()
+        if self.inject():
+            return
+        name, args, query = self.route()
+        fleet = self.server.fleet
+        if name == "list_worker_types":
+            worker_types = [
+                {"provisionerId": args[0], "workerType": wt}
+                for wt in fleet.worker_types
+            ]
+            self.send_json(200, self.paginate(worker_types, "workerTypes", query))
+        elif name == "list_workers":
+            workers = fleet.list_worker_summaries(
+                args[1], quarantined=query.get("quarantined") == "true"
+            )
+            self.send_json(200, self.paginate(workers, "workers", query))
+        elif name == "get_worker":
+            worker = fleet.workers.get(args[1], {}).get(args[3])
+            if worker and worker["workerGroup"] == args[2]:
+                self.send_json(200, worker)
+            else:
+                self.send_json(404, {"code": "ResourceNotFound"})
+        elif name == "task_status":
+            status = fleet.tasks.get(args[0])
+            if status:
+                self.send_json(200, status)
+            else:
+                self.send_json(404, {"code": "ResourceNotFound"})
+        elif name == "pending_tasks":
+            self.send_json(
+                200,
+                {
+                    "provisionerId": args[0],
+                    "workerType": args[1],
+                    "pendingTasks": fleet.pending.get(args[1], 0),
+                },
+            )
+        elif name == "list_task_group":
+            tasks = [
+                {"status": fleet.tasks[task_id]["status"]}
+                for task_id in fleet.task_groups.get(args[0], [])
+            ]
+            body = self.paginate(tasks, "tasks", query)
+            body["taskGroupId"] = args[0]
+            self.send_json(200, body)
+        elif name == "list_namespaces":
+            namespaces = fleet.list_push_namespaces(args[0])
+            self.send_json(200, self.paginate(namespaces, "namespaces", query))
+        elif name == "list_tasks":
+            tasks = fleet.list_push_tasks(args[0])
+            self.send_json(200, self.paginate(tasks, "tasks", query))
+        else:
+            self.send_json(404, {"code": "ResourceNotFound"})
+
+    def do_PUT(self):
+        # quarantineWorker
+        self.server.count_request()
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        name, args, _query = self.route()
+        if name != "get_worker" or "quarantineUntil" not in payload:
+            self.send_json(400, {"code": "InputError"})
+            return
+        worker = self.server.fleet.quarantine(
+            args[1], args[3], payload["quarantineUntil"], worker_group=args[2]
+        )
+        if worker:
+            self.send_json(200, worker)
+        else:
+            self.send_json(404, {"code": "ResourceNotFound"})
+
+
+class FakeQueueServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        fleet,
+        host="127.0.0.1",
+        port=0,
+        page_size=DEFAULT_PAGE_SIZE,
+        latency=0,
+        jitter=0,
+        error_rate=0,
+        error_kinds=("500", "429", "json"),
+        seed=0,
+        verbose=False,
+    ):
+        super().__init__((host, port), FakeQueueHandler)
+        self.fleet = fleet
+        self.page_size = page_size
+        # seconds
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_kinds = list(error_kinds)
+        self.rng = random.Random(seed)
+        self.verbose = verbose
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def root_url(self):
+        return "http://%s:%s" % self.server_address[:2]
+
+    def count_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="serve a synthetic taskcluster queue api for offline benchmarking."
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="default is 127.0.0.1.")
+    parser.add_argument("--port", default=8080, type=int, help="default is 8080.")
+    parser.add_argument(
+        "-w", "--workers", default=50, type=int, help="workers in the fleet."
+    )
+    parser.add_argument(
+        "-t", "--worker-types", default=5, type=int, help="worker types in the fleet."
+    )
+    parser.add_argument(
+        "--tasks-per-worker",
+        default=10,
+        type=int,
+        help="tasks per worker (default is 10).",
+    )
+    parser.add_argument(
+        "--recent-task-limit",
+        default=None,
+        type=int,
+        help="only list this many of them in recentTasks (default is all).",
+    )
+    parser.add_argument(
+        "--worker-groups",
+        default=1,
+        type=int,
+        help="worker groups the workers are spread over (default is 1).",
+    )
+    parser.add_argument(
+        "--push-minutes",
+        default=None,
+        type=int,
+        help="group tasks by push, a push every N minutes, and index the pushes "
+        "(default is a group per worker type).",
+    )
+    parser.add_argument(
+        "--page-size",
+        default=DEFAULT_PAGE_SIZE,
+        type=int,
+        help="max items per page (default is %s)." % DEFAULT_PAGE_SIZE,
+    )
+    parser.add_argument(
+        "--latency-ms", default=0, type=float, help="added to every response."
+    )
+    parser.add_argument(
+        "--jitter-ms", default=0, type=float, help="random +/- variation of latency."
+    )
+    parser.add_argument(
+        "--error-rate",
+        default=0,
+        type=float,
+        help="fraction of GETs that fail (500, 429 or truncated json).",
+    )
+    parser.add_argument("--seed", default=0, type=int, help="for the fleet and errors.")
+    parser.add_argument(
+        "--devicepool-config",
+        metavar="PATH",
+        help="write a devicepool config.yml for the fleet (for WorkerHealth).",
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="log requests.")
+    args = parser.parse_args()
+
+    fleet = FakeFleet(
+        workers=args.workers,
+        worker_types=args.worker_types,
+        tasks_per_worker=args.tasks_per_worker,
+        seed=args.seed,
+        recent_task_limit=args.recent_task_limit,
+        worker_groups=args.worker_groups,
+        push_minutes=args.push_minutes,
+    )
+    if args.devicepool_config:
+        fleet.write_devicepool_config(args.devicepool_config)
+        print("wrote %s" % args.devicepool_config)
+    server = FakeQueueServer(
+        fleet,
+        host=args.host,
+        port=args.port,
+        page_size=args.page_size,
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate,
+        seed=args.seed,
+        verbose=args.verbose,
+    )
+    print(
+        "serving %s workers in %s worker types on %s"
+        % (args.workers, len(fleet.worker_types), server.root_url)
+    )
+    print("  e.g. TC_ROOT_URL=%s ./fitness.py" % server.root_url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
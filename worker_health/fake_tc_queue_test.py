@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import fake_tc_queue
+import tc_client
+import utils
+
+
+@pytest.fixture
+def fake_queue():
+    fleet = fake_tc_queue.FakeFleet(workers=25, worker_types=2, tasks_per_worker=3)
+    with fake_tc_queue.FakeQueueServer(fleet, page_size=4) as server:
+        yield fleet, server
+
+
+def test_fleet_is_deterministic():
+    a = fake_tc_queue.FakeFleet(workers=10, seed=1)
+    b = fake_tc_queue.FakeFleet(workers=10, seed=1, now=a.now)
+    assert a.workers == b.workers
+    assert a.tasks == b.tasks
+
+
+def test_task_group_ids_are_stable_across_processes():
+    # task group ids end up in cassette urls, they can't depend on hash()
+    script = (
+        "import fake_tc_queue; f = fake_tc_queue.FakeFleet(workers=4, worker_types=2); "
+        "print(sorted({t['status']['taskGroupId'] for t in f.tasks.values()}))"
+    )
+    group_ids = set()
+    for seed in ("1", "2"):
+        env = dict(os.environ, PYTHONHASHSEED=seed)
+        group_ids.add(
+            subprocess.check_output(
+                [sys.executable, "-c", script],
+                env=env,
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+            )
+        )
+    assert len(group_ids) == 1
+
+
+def test_list_workers_pages(fake_queue):
+    fleet, server = fake_queue
+    worker_type = fleet.worker_types[0]
+    url = "%s/api/queue/v1/provisioners/%s/worker-types/%s/workers" % (
+        server.root_url,
+        fleet.provisioner,
+        worker_type,
+    )
+    workers = list(utils.iter_jsonc(url, "workers"))
+    assert sorted(w["workerId"] for w in workers) == sorted(fleet.workers[worker_type])
+    # 13 workers in pages of 4
+    assert server.requests == 4
+
+
+def test_task_status(fake_queue):
+    fleet, server = fake_queue
+    task_id = next(iter(fleet.tasks))
+    response = tc_client.get(
+        "%s/api/queue/v1/task/%s/status" % (server.root_url, task_id)
+    )
+    assert response.json()["status"]["taskId"] == task_id
+    response = tc_client.get("%s/api/queue/v1/task/missing/status" % server.root_url)
+    assert response.status_code == 404
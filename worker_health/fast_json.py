@@ -0,0 +1,24 @@
+import json
+
+# json decoding for http responses
+#
+# uses orjson (if installed) on the raw response bytes, this skips decoding
+# the body to a str and is several times faster on large pages. falls back
+# to the stdlib json module.
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson.JSONDecodeError is a subclass, so this catches errors from both
+JSONDecodeError = json.JSONDecodeError
+
+BACKEND = "orjson" if orjson else "json"
+
+
+# data: bytes (e.g. response.content) or str
+def loads(data):
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -1,27 +1,34 @@
 #!/usr/bin/env python3
 
 import argparse
-import json
+import collections
 import os
 import pprint
 import subprocess
 import sys
+import threading
 from multiprocessing.pool import ThreadPool
-from time import time as timer
 
 import humanhash
 import pendulum
 import requests
-import taskcluster
 from natsort import natsorted
-from requests.adapters import HTTPAdapter
-from urllib.request import urlopen
-
-# from requests.packages.urllib3.util.retry import Retry
-from urllib3.util import Retry
 
+import cassette
+import fast_json
+import fitness_analytics
+import fitness_async
+import fitness_history
+import fitness_renderer
+import http_metrics
+import phase_profiler
+import ping_probe
 import quarantine
+import task_run_store
+import tc_client
+import tc_time
 import utils
+import worker_group_index
 
 # TODO: figure out how to properly import
 from worker_health import USER_AGENT_STRING, logger
@@ -35,27 +42,7 @@ WORKERTYPE_THREAD_COUNT = 4
 TASK_THREAD_COUNT = 6
 ALERT_PERCENT = 0.85
 DEFAULT_PROVISIONER = "proj-autophone"
-
-
-# https://www.peterbe.com/plog/best-practice-with-retries-with-requests
-def requests_retry_session(
-    retries=3,
-    backoff_factor=0.3,
-    status_forcelist=(500, 502, 504),
-    session=None,
-):
-    session = session or requests.Session()
-    retry = Retry(
-        total=retries,
-        read=retries,
-        connect=retries,
-        backoff_factor=backoff_factor,
-        status_forcelist=status_forcelist,
-    )
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-    return session
+DEFAULT_DAEMON_PORT = 8765
 
 
 class Fitness:
@@ -65,6 +52,7 @@ class Fitness:
         provisioner=DEFAULT_PROVISIONER,
         alert_percent=ALERT_PERCENT,
         testing_mode=False,
+        task_cache=True,
     ):
         self.args = None
         self.verbosity = log_level
@@ -75,29 +63,79 @@ class Fitness:
         self.worker_id_maxlen = 0
         self.quarantine = quarantine.Quarantine()
         self.quarantine_data = {}
+        self.task_run_store = task_run_store.TaskRunStore(enabled=task_cache)
+        self.worker_group_index = worker_group_index.WorkerGroupIndex(
+            enabled=task_cache
+        )
+        # {worker_type: Counter({endpoint: taskcluster api calls})}
+        self.api_calls = {}
+        self.api_calls_lock = threading.Lock()
+        # a ping_probe.BatchPinger when pings are batched
+        self.pinger = None
+        # a fitness_analytics.RunCollector with --analytics or --export
+        self.run_collector = None
+        # a fitness_history.HistoryWalker with --history or --since
+        self.history = None
+        # one tc_time.now() per report (main and fitness_daemon.py set it)
+        self.now = None
+
+        # size the shared http pool for the nested worker type/task thread pools
+        tc_client.set_pool_size(WORKERTYPE_THREAD_COUNT * TASK_THREAD_COUNT)
+
+    def count_api_call(self, worker_type, endpoint, count=1):
+        with self.api_calls_lock:
+            counts = self.api_calls.setdefault(worker_type, collections.Counter())
+            counts[endpoint] += count
+
+    def format_api_calls(self):
+        lines = ["taskcluster api calls per worker type:"]
+        with self.api_calls_lock:
+            for worker_type, counts in natsorted(self.api_calls.items()):
+                lines.append(
+                    "  %s: %s (%s)"
+                    % (
+                        worker_type,
+                        sum(counts.values()),
+                        ", ".join(
+                            "%s %s" % (endpoint, count)
+                            for endpoint, count in sorted(counts.items())
+                        ),
+                    )
+                )
+        return "\n".join(lines)
 
     def get_worker_jobs(self, queue, worker_type, worker):
         # TODO: need to get worker-group...
         return utils.get_jsonc(
-            "https://firefox-ci-tc.services.mozilla.com/api/queue/v1/provisioners/%s/worker-types/%s/workers/%s/%s"
+            "%s/provisioners/%s/worker-types/%s/workers/%s/%s"
             # "https://queue.taskcluster.net/v1/provisioners/%s/worker-types/%s/workers/%s/%s"
-            % (self.provisioner, queue, worker_type, worker),
+            % (tc_client.queue_url(), self.provisioner, queue, worker_type, worker),
             self.verbosity,
         )
 
     def get_task_status(self, taskid):
         _url, output, exception = self.get_jsonc2(
-            "https://firefox-ci-tc.services.mozilla.com/api/queue/v1/task/%s/status"
-            % taskid
+            "%s/task/%s/status"
+            % (tc_client.queue_url(), taskid)
             # "https://queue.taskcluster.net/v1/task/%s/status" % taskid
         )
         return taskid, output, exception
 
-    def format_workertype_fitness_report_result(self, res):
-        return_string = ""
-        worker_id = res["worker_id"]
-        del res["worker_id"]
+    # writes a device's fetched get_task_status tuples to the task run store
+    # (one transaction)
+    def store_task_statuses(self, task_results):
+        self.task_run_store.put_many(
+            (task_id, output) for task_id, output, _exception in task_results
+        )
 
+    # returns get_task_status tuples for resolved tasks in the task run store,
+    # and the ids of the tasks that still need to be fetched
+    def get_stored_task_statuses(self, task_ids):
+        stored = self.task_run_store.get_resolved(task_ids)
+        results = [(task_id, status, None) for task_id, status in stored.items()]
+        return results, [task_id for task_id in task_ids if task_id not in stored]
+
+    def format_worker_id(self, worker_id):
         if self.args.humanize_hashes:
             # TODO: have to do this per worker type? ugh!!!!!
             # - currently only works for aws-metal (probably other tc worker ids also though...)
@@ -105,9 +143,15 @@ class Fitness:
             # possible solution: hash the entire name... best solution anyways.
             h_sanitized = worker_id.split("-")[1]
             hh = humanhash.humanize(h_sanitized, words=3)
-            return_string += ("%s (%s)" % (worker_id, hh)).ljust(
-                self.worker_id_maxlen + 36
-            )
+            return "%s (%s)" % (worker_id, hh)
+        return worker_id
+
+    def format_workertype_fitness_report_result(self, res):
+        return_string = ""
+        worker_id = self.format_worker_id(res["worker_id"])
+
+        if self.args.humanize_hashes:
+            return_string += worker_id.ljust(self.worker_id_maxlen + 36)
         else:
             return_string += worker_id.ljust(self.worker_id_maxlen + 2)
         return_string += self.sr_dict_format(res)
@@ -117,46 +161,36 @@ class Fitness:
         # TODO: show when worker last started a task (taskStarted in TC)
         # - aws metal nodes has quarantined nodes that have been deleted that never drop off from worker-data
 
-        start = timer()
-        worker_count = 0
-        working_count = 0
-        # TODO: for this calculation, should we use a count of hosts that are reporting (vs all)?
-        sr_total = 0
+        self.now = tc_time.now()
+        renderer = fitness_renderer.FitnessRenderer(
+            self, stream=self.args.stream, table=self.args.table
+        )
+        # with --stream, rows are rendered as each worker finishes
+        on_result = None
+        if self.args.stream:
+            on_result = renderer.add_device_result
+        workertype_results = []
+        ## daemon mode (fitness_daemon.py has the reports in memory)
+        if self.args.daemon_url:
+            workertype_results = self.get_daemon_report(
+                provisioner, worker_type, worker_id
+            )
         ## host mode
-        if worker_type and worker_id:
-            worker_count = 1
+        elif worker_type and worker_id:
             self.get_pending_tasks_multi([worker_type])
-            url = (
-                "https://firefox-ci-tc.services.mozilla.com/api/queue/v1/provisioners/%s/worker-types/%s/workers?limit=5"
-                # "https://queue.taskcluster.net/v1/provisioners/%s/worker-types/%s/workers?limit=5"
-                % (self.provisioner, worker_type)
-            )
-            # print(url)
-            worker_group_result = utils.get_jsonc(url, self.verbosity)
-            # worker_group = worker_group_result['workerTypes'][0][]
-            # import pprint
-            # pprint.pprint(worker_group_result)
-            # sys.exit()
-            if len(worker_group_result["workers"]) == 0:
+            device_result = self.host_fitness_report(worker_type, worker_id)
+            if not device_result:
                 print("%s.%s: %s" % (worker_type, worker_id, "no data"))
                 return
-            worker_group = worker_group_result["workers"][0]["workerGroup"]
-            _worker, res_obj, _e = self.device_fitness_report(
-                worker_type, worker_group, worker_id
-            )
-            res_obj["worker_id"] = worker_id
-            sr_total += res_obj["sr"]
-            print(
-                "%s.%s"
-                % (worker_type, self.format_workertype_fitness_report_result(res_obj))
-            )
+            renderer.add_device_result(worker_type, device_result)
         else:
             ### queue mode
             if worker_type:
                 worker_types = [worker_type]
             ### provisioner mode
             else:
-                worker_types_result = self.get_worker_types(provisioner)
+                with phase_profiler.phase("worker types"):
+                    worker_types_result = self.get_worker_types(provisioner)
                 worker_types = []
                 if "workerTypes" in worker_types_result:
                     for provisioner in worker_types_result["workerTypes"]:
@@ -167,97 +201,160 @@ class Fitness:
                     logger.warning(
                         "error fetching workerTypes, results are incomplete!"
                     )
-            self.get_pending_tasks_multi(worker_types)
 
-            # TODO: process and then display? padding of worker_id is not consistent for whole provisioner report
-            # - because we haven't scanned the potentially longest worker_ids when we display the first worker_group's data
-            for a_worker_type in worker_types:
-                wt, res_obj, _e = self.workertype_fitness_report(a_worker_type)
+            # history mode walks task groups, which only the threadpool engine does
+            if self.args.engine == "asyncio" and not self.history:
+                # all worker types are fetched at once, then displayed in order
+                engine = fitness_async.AsyncFitnessEngine(
+                    self,
+                    concurrency=WORKERTYPE_THREAD_COUNT * TASK_THREAD_COUNT,
+                    on_result=on_result,
+                )
+                workertype_results = engine.run(worker_types)
+            else:
+                self.get_pending_tasks_multi(worker_types)
+                workertype_results = (
+                    self.workertype_fitness_report(a_worker_type, on_result)
+                    for a_worker_type in worker_types
+                )
+
+        # without --stream, rows are rendered a worker type at a time.
+        # padding of worker_id can change between worker types, --table renders
+        # an aligned table once every worker type is done.
+        for wt, res_obj, _e in workertype_results:
+            if not self.args.stream:
                 for item in res_obj:
-                    worker_count += 1
-                    sr_total += item["sr"]
-                    if item.get("state") and "working" in item.get("state"):
-                        working_count += 1
-                    if self.args.only_show_alerting:
-                        if "alerts" in item:
-                            print(
-                                "%s.%s"
-                                % (
-                                    wt,
-                                    self.format_workertype_fitness_report_result(item),
-                                )
-                            )
-                    else:
-                        print(
-                            "%s.%s"
-                            % (wt, self.format_workertype_fitness_report_result(item))
-                        )
-        # if to protect from divide by 0 (happens on request failures)
-        if worker_count:
-            # TODO: show alerting count
+                    renderer.add(wt, item)
+        renderer.finish()
+        if self.history:
+            for line in self.history.format_coverage():
+                print(line)
+        if self.verbosity:
+            print(http_metrics.format_table())
+            print(tc_client.format_stats())
+            print(self.task_run_store.format_stats())
+            print(self.worker_group_index.format_stats())
+            print(self.format_api_calls())
+            if self.history:
+                print(self.history.format_stats())
+            print(renderer.format_stats())
+        if self.run_collector:
+            self.report_analytics()
+        return renderer
+
+    def report_analytics(self):
+        if not self.run_collector.run_count():
+            print("no task runs collected for analytics")
+            return
+        df = self.run_collector.frame()
+        if self.args.analytics:
+            print(fitness_analytics.format_summary(fitness_analytics.summarize(df)))
+        if self.args.export:
+            fitness_analytics.export(df, self.args.export)
+            print("exported %s task runs to %s" % (len(df), self.args.export))
+
+    # fetches reports from fitness_daemon.py, same format as workertype_fitness_report
+    def get_daemon_report(self, provisioner, worker_type, worker_id):
+        if worker_type and worker_id:
+            path = "host/%s/%s" % (worker_type, worker_id)
+        elif worker_type:
+            path = "queue/%s" % worker_type
+        else:
+            path = "provisioner"
+        url = "%s/%s" % (self.args.daemon_url.rstrip("/"), path)
+        try:
+            response = tc_client.get(url)
+        except requests.exceptions.RequestException as e:
+            print("ERROR: fitness daemon at %s: %s" % (url, e))
+            sys.exit(1)
+        if response.status_code != 200:
+            # the daemon's errors are json, e.g. an unknown worker type
+            try:
+                error = fast_json.loads(response.content)["error"]
+            except (fast_json.JSONDecodeError, KeyError, TypeError):
+                error = "HTTP %s" % response.status_code
+            print("ERROR: fitness daemon at %s: %s" % (url, error))
+            sys.exit(1)
+        try:
+            output = fast_json.loads(response.content)
+        except fast_json.JSONDecodeError as e:
+            print("ERROR: fitness daemon at %s: bad json (%s)" % (url, e))
+            sys.exit(1)
+        if not isinstance(output, dict) or "worker_types" not in output:
+            print("ERROR: fitness daemon at %s: not a fitness report" % url)
+            sys.exit(1)
+        if output["provisioner"] != provisioner:
             print(
-                "%s workers queried in %s seconds (%s working), average SR %s%%"
-                % (
-                    worker_count,
-                    round((timer() - start), 2),
-                    working_count,
-                    round((sr_total / worker_count * 100), 2),
-                )
+                "fitness daemon: reports on %s, not %s"
+                % (output["provisioner"], provisioner)
             )
+            sys.exit(1)
+
+        workertype_results = []
+        for wt, reports in output["worker_types"]:
+            results = []
+            for report in reports:
+                # the windows aren't shown by the cli
+                report.pop("windows", None)
+                if report["ls"]:
+                    report["ls"] = tc_time.to_datetime(tc_time.parse(report["ls"]))
+                self.worker_id_maxlen = max(
+                    len(report["worker_id"]), self.worker_id_maxlen
+                )
+                results.append((report.pop("worker_id"), report, None))
+            workertype_results.append((wt, self.sort_worker_results(results), None))
+        return workertype_results
 
     def get_pending_tasks(self, queue):
+        self.count_api_call(queue, "pendingTasks")
         _url, output, exception = self.get_jsonc2(
-            "https://firefox-ci-tc.services.mozilla.com/api/queue/v1/pending/%s/%s"
+            "%s/pending/%s/%s"
             # "https://queue.taskcluster.net/v1/pending/%s/%s"
-            % (self.provisioner, queue)
+            % (tc_client.queue_url(), self.provisioner, queue)
         )
         return queue, output, exception
 
     def get_pending_tasks_multi(self, queues):
-        try:
-            results = ThreadPool(TASK_THREAD_COUNT).imap_unordered(
-                self.get_pending_tasks, queues
-            )
-        except Exception as e:
-            print(e)
-        for queue, result, _error in results:
-            self.queue_counts[queue] = result["pendingTasks"]
+        with phase_profiler.phase("pending tasks"):
+            with ThreadPool(TASK_THREAD_COUNT) as pool:
+                for queue, result, _error in pool.imap_unordered(
+                    self.get_pending_tasks, queues
+                ):
+                    self.set_queue_count(queue, result)
+
+    def set_queue_count(self, queue, result):
+        self.queue_counts[queue] = result["pendingTasks"]
 
     # for provisioner report...
     def get_worker_types(self, provisioner):
         # https://queue.taskcluster.net/v1/provisioners/proj-autophone/worker-types?limit=100
         return utils.get_jsonc(
-            "https://firefox-ci-tc.services.mozilla.com/api/queue/v1/provisioners/%s/worker-types?limit=100"
+            "%s/provisioners/%s/worker-types?limit=100"
             # "https://queue.taskcluster.net/v1/provisioners/%s/worker-types?limit=100"
-            % provisioner,
+            % (tc_client.queue_url(), provisioner),
             self.verbosity,
         )
 
     def simple_worker_report(
         self, worker_type, worker_prefix="packet-", worker_count=60
     ):
-        url = (
-            "https://firefox-ci-tc.services.mozilla.com/api/queue/v1/provisioners/%s/worker-types/%s/workers?limit=100"
-            % (self.provisioner, worker_type)
+        url = "%s/provisioners/%s/worker-types/%s/workers?limit=100" % (
+            tc_client.queue_url(),
+            self.provisioner,
+            worker_type,
         )
         # print(url)
+        seen_workers = []
         try:
-            workers_result = utils.get_jsonc(url, self.verbosity)
+            for item in utils.iter_jsonc(url, "workers", self.verbosity):
+                seen_workers.append(item["workerId"])
         except Exception as e:
-            workers_result = []
             print(e)
-        # print(workers_result)
 
         expected_workers = []
         for i in range(0, worker_count):
             expected_workers.append("%s%s" % (worker_prefix, i))
 
-        seen_workers = []
-        if "workers" in workers_result:
-            for item in workers_result["workers"]:
-                seen_workers.append(item["workerId"])
-        # pprint.pprint(workers_result)
-
         # for item in natsorted(seen_workers):
         #     print(item)
 
@@ -270,47 +367,111 @@ class Fitness:
         print("missing workers (%s): %s" % (m_count, sorted(missing)))
         print("%s workers total" % worker_count)
 
+    # every listWorkers page of the worker type
     def get_workers(self, worker_type):
-        # TODO: improve this (don't explode if missing)
-        with open(os.path.expanduser("~/.tc_token")) as json_file:
-            data = json.load(json_file)
-        creds = {"clientId": data["clientId"], "accessToken": data["accessToken"]}
-        queue = taskcluster.Queue(
-            {
-                "rootUrl": "https://firefox-ci-tc.services.mozilla.com",
-                "credentials": creds,
-            }
-        )
-
-        outcome = queue.listWorkers(self.provisioner, worker_type)
-        return outcome
+        workers = []
+        with phase_profiler.phase("worker listing"):
+            for page in self.quarantine.iter_pages(self.provisioner, worker_type):
+                self.count_api_call(worker_type, "listWorkers")
+                workers.extend(page.get("workers", []))
+        return workers
 
-    def workertype_fitness_report(self, worker_type):
-        # load quarantine data
-        self.quarantine_data[worker_type] = self.quarantine.get_quarantined_workers(
-            self.provisioner, worker_type
-        )
-
-        outcome = self.get_workers(worker_type)
+    # returns the getWorker json, None if the worker isn't in the group
+    def get_worker(self, queue, worker_group, device):
+        self.count_api_call(queue, "getWorker")
+        worker = self.get_worker_jobs(queue, worker_group, device)
+        if "workerId" not in worker:
+            return None
+        return worker
 
+    # returns (worker_type, worker_group, worker_id) tuples. quarantine data
+    # comes from the same listWorkers pass (quarantineUntil).
+    def get_workertype_worker_ids(self, worker_type):
+        now = self.now or tc_time.now()
+        quarantined = set()
         worker_ids = []
-        for worker in outcome["workers"]:
-            worker_id = worker["workerId"]
-            worker_group = worker["workerGroup"]
-            self.worker_id_maxlen = max(len(worker_id), self.worker_id_maxlen)
-            worker_ids.append((worker_type, worker_group, worker_id))
+        workers = self.get_workers(worker_type)
+        self.worker_group_index.update(self.provisioner, worker_type, workers)
+        # from the same listWorkers pass
+        with phase_profiler.phase("quarantine lookup"):
+            for worker in workers:
+                worker_id = worker["workerId"]
+                worker_group = worker["workerGroup"]
+                self.worker_id_maxlen = max(len(worker_id), self.worker_id_maxlen)
+                worker_ids.append((worker_type, worker_group, worker_id))
+                if quarantine.Quarantine.is_quarantined(worker, now):
+                    quarantined.add(worker_id)
+        self.quarantine_data[worker_type] = quarantined
+        # ping the worker type's devices while their tasks are fetched
+        if self.pinger:
+            self.pinger.start(worker_type, [w[2] for w in worker_ids])
 
         if len(worker_ids) == 0:
             print("%s: no workers reporting (could be due to no jobs)" % worker_type)
-            worker_type, None, None
+        return worker_ids
+
+    # a device_fitness_report tuple, None if the worker isn't found. with the
+    # worker's group in the index, the worker is one getWorker request (its
+    # quarantine state comes from the same response).
+    def host_fitness_report(self, worker_type, worker_id):
+        def list_workers(_provisioner, a_worker_type):
+            return self.get_workers(a_worker_type)
+
+        worker = None
+        with phase_profiler.phase("worker group lookup"):
+            worker_group = self.worker_group_index.lookup(
+                self.provisioner, worker_type, worker_id, list_workers
+            )
+        if worker_group:
+            worker = self.get_worker(worker_type, worker_group, worker_id)
+        if worker_group and not worker:
+            # stale entry (the worker moved groups or is gone)
+            worker_group = self.worker_group_index.lookup(
+                self.provisioner, worker_type, worker_id, list_workers, refresh=True
+            )
+            if worker_group:
+                worker = self.get_worker(worker_type, worker_group, worker_id)
+        if not worker:
+            return None
+
+        self.worker_id_maxlen = max(len(worker_id), self.worker_id_maxlen)
+        self.quarantine_data[worker_type] = set()
+        if quarantine.Quarantine.is_quarantined(worker):
+            self.quarantine_data[worker_type].add(worker_id)
+        if self.pinger:
+            self.pinger.start(worker_type, [worker_id])
+        if self.history:
+            return self.history.workertype_history(
+                worker_type, [(worker_type, worker_group, worker_id)]
+            )[0]
+        return self.device_fitness_report(worker_type, worker_group, worker_id, worker)
+
+    # on_result(worker_type, device_fitness_report tuple) is called as each
+    # worker finishes
+    def workertype_fitness_report(self, worker_type, on_result=None):
+        worker_ids = self.get_workertype_worker_ids(worker_type)
 
         results = []
+        if self.history:
+            results = self.history.workertype_history(worker_type, worker_ids)
+            if on_result:
+                for result in results:
+                    on_result(worker_type, result)
+            return worker_type, self.sort_worker_results(results), None
         try:
-            results = ThreadPool(WORKERTYPE_THREAD_COUNT).starmap(
-                self.device_fitness_report, worker_ids
-            )
+            with ThreadPool(WORKERTYPE_THREAD_COUNT) as pool:
+                for result in pool.imap_unordered(
+                    lambda worker: self.device_fitness_report(*worker), worker_ids
+                ):
+                    results.append(result)
+                    if on_result:
+                        on_result(worker_type, result)
         except Exception as e:
             print(e)
+        return worker_type, self.sort_worker_results(results), None
+
+    # takes device_fitness_report tuples, returns sorted result dicts
+    def sort_worker_results(self, results):
         worker_results = []
         for a_tuple in results:
             worker_id = a_tuple[0]
@@ -326,7 +487,7 @@ class Fitness:
             worker_results = natsorted(worker_results, key=lambda i: i["worker_id"])
         else:
             raise Exception("unknown sort_order (%s)" % self.args.sort_order)
-        return worker_type, worker_results, None
+        return worker_results
 
     # basically how print does it but with float padding
     def sr_dict_format(self, sr_dict):
@@ -334,7 +495,7 @@ class Fitness:
             raise Exception("input should be a dict")
         result_string = "{"
         for key, value in sr_dict.items():
-            if key == "state":
+            if key in ("state", "worker_id"):
                 continue
 
             result_string += "%s: " % key
@@ -357,9 +518,7 @@ class Fitness:
             elif isinstance(value, pendulum.DateTime):
                 # result_string += str(value) # .diff_for_humans(pendulum.now())
                 # result_string += value.format('YYYY-MM-DD HH:mm:ss zz')
-                result_string += (
-                    pendulum.now(tz="UTC").diff_for_humans(value, True).rjust(10)
-                )  # .replace('after', 'ago')
+                result_string += tc_time.format_ago(value, self.now).rjust(10)
             else:
                 raise Exception("unknown type (%s)" % type(value))
             result_string += ", "
@@ -368,26 +527,58 @@ class Fitness:
         result_string += "}"
         return result_string
 
-    def device_fitness_report(self, queue, worker_group, device):
-        results = self.get_worker_jobs(queue, worker_group, device)
-        task_successes = 0
-        task_failures = 0
-        task_runnings = 0
-        task_exceptions = 0
-        task_last_started_timestamp = None
-
+    # worker: the getWorker json, if it's already been fetched
+    def get_recent_task_ids(self, queue, worker_group, device, worker=None):
+        results = worker
+        if results is None:
+            self.count_api_call(queue, "getWorker")
+            results = self.get_worker_jobs(queue, worker_group, device)
         task_ids = []
         for task in results["recentTasks"]:
             task_id = task["taskId"]
             task_ids.append(task_id)
+        return task_ids
 
-        try:
-            results = ThreadPool(TASK_THREAD_COUNT).imap_unordered(
-                self.get_task_status, task_ids
-            )
-        except Exception as e:
-            print(e)
-        for task_id, result, error in results:
+    # returns get_task_status tuples for the device's recent tasks
+    def get_device_task_results(self, queue, worker_group, device, worker=None):
+        with phase_profiler.phase("task statuses"):
+            task_ids = self.get_recent_task_ids(queue, worker_group, device, worker)
+            task_results, task_ids_to_fetch = self.get_stored_task_statuses(task_ids)
+            self.count_api_call(queue, "status", len(task_ids_to_fetch))
+
+            fetched = []
+            try:
+                with ThreadPool(TASK_THREAD_COUNT) as pool:
+                    fetched.extend(
+                        pool.imap_unordered(self.get_task_status, task_ids_to_fetch)
+                    )
+            except Exception as e:
+                print(e)
+            self.store_task_statuses(fetched)
+        return task_results + fetched
+
+    def device_fitness_report(self, queue, worker_group, device, worker=None):
+        results = self.get_device_task_results(queue, worker_group, device, worker)
+        return self.calculate_device_fitness(queue, device, results)
+
+    # task_results: (task_id, task status json, error) tuples from get_task_status
+    def calculate_device_fitness(self, queue, device, task_results):
+        with phase_profiler.phase("aggregation"):
+            if self.run_collector:
+                self.run_collector.add(queue, device, task_results)
+            counts = self.count_device_tasks(queue, device, task_results)
+            return self.device_fitness_result(queue, device, counts)
+
+    # returns suc/fail/rng/exc counts and the last started time (ls)
+    def count_device_tasks(self, queue, device, task_results):
+        task_successes = 0
+        task_failures = 0
+        task_runnings = 0
+        task_exceptions = 0
+        # epoch seconds, a DateTime is only made for the result
+        last_started = None
+
+        for task_id, result, error in task_results:
             if error is None:
                 task_state = None
                 # filter out jobs that are gone
@@ -407,12 +598,9 @@ class Fitness:
                 if "runs" in result["status"]:
                     for run in result["status"]["runs"]:
                         if "started" in run:
-                            temp_date = pendulum.parse(run["started"])
-                            if task_last_started_timestamp is None:
-                                task_last_started_timestamp = temp_date
-                            # if temp_date more recent (larger), use it as the oldest date
-                            if temp_date > task_last_started_timestamp:
-                                task_last_started_timestamp = temp_date
+                            started = tc_time.parse(run["started"])
+                            if last_started is None or started > last_started:
+                                last_started = started
 
                 # TODO: gather exception stats
                 if task_state == "running":
@@ -446,6 +634,21 @@ class Fitness:
                 # TODO: should return exception? only getting partial truth...
                 pass
                 # print("error fetching %r: %s" % (task_id, error))
+        return {
+            "suc": task_successes,
+            "fail": task_failures,
+            "rng": task_runnings,
+            "exc": task_exceptions,
+            "ls": tc_time.to_datetime(last_started) if last_started else None,
+        }
+
+    # counts: from count_device_tasks (or fitness_history.WorkerHistory)
+    def device_fitness_result(self, queue, device, counts):
+        task_successes = counts["suc"]
+        task_failures = counts["fail"]
+        task_runnings = counts["rng"]
+        task_exceptions = counts["exc"]
+        task_last_started_timestamp = counts["ls"]
 
         total = task_failures + task_successes
         results_obj = {}
@@ -477,15 +680,22 @@ class Fitness:
 
         # ping alerts
         if self.args.ping:
-            if self.args.ping_host:
+            if self.pinger:
+                # batched with the rest of the worker type (see ping_probe.py)
+                with phase_profiler.phase("ping"):
+                    reachable = self.pinger.reachable(queue, device)
+                if reachable is False:
+                    results_obj.setdefault("alerts", []).append("Not pingable!")
+            elif self.args.ping_host:
                 cmd = [
                     "ssh",
                     self.args.ping_host,
                     "ping -c 1 -i 0.3 -w 1 %s.%s" % (device, self.args.ping_domain),
                 ]
-                res = subprocess.run(
-                    cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
-                )
+                with phase_profiler.phase("ping"):
+                    res = subprocess.run(
+                        cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+                    )
                 if res.returncode != 0:
                     if "alerts" not in results_obj:
                         results_obj["alerts"] = []
@@ -504,10 +714,13 @@ class Fitness:
                 )
 
         # alert if worker hasn't worked in 1 hour
-        dt = pendulum.now()
         # TODO: take minutes as an arg
-        comparison_dt = dt.subtract(minutes=60)
-        if jobs_present and task_last_started_timestamp < comparison_dt:
+        comparison = (self.now or tc_time.now()) - 60 * 60
+        # no last started: no runs in the window (see fitness_history.py)
+        if jobs_present and (
+            task_last_started_timestamp is None
+            or task_last_started_timestamp.timestamp() < comparison
+        ):
             results_obj.setdefault("alerts", []).append("No work started in last hour!")
         else:
             results_obj.setdefault("state", []).append("working")
@@ -532,8 +745,8 @@ class Fitness:
 
     def fetch_url(self, url):
         try:
-            response = urlopen(url)
-            return url, response.read(), None
+            response = tc_client.get(url)
+            return url, response.content, None
         except Exception as e:
             return url, None, e
 
@@ -546,7 +759,7 @@ class Fitness:
         return_string += "["
         for i in range(1, 11):
             if value >= i * 0.1:
-                return_string += u"="
+                return_string += "="
             else:
                 return_string += " "
         return_string += "]"
@@ -560,14 +773,14 @@ class Fitness:
         while retries_left >= 0:
             if self.verbosity > 2:
                 print(an_url)
-            response = requests_retry_session().get(an_url, headers=headers)
-            result = response.text
+            response = tc_client.get(an_url, headers=headers)
             try:
-                output = json.loads(result)
+                output = fast_json.loads(response.content)
                 # will only break on good decode
                 break
-            except json.decoder.JSONDecodeError as e:
-                logger.warning("json decode error. input: %s" % result)
+            except fast_json.JSONDecodeError as e:
+                http_metrics.record_decode_failure(tc_client.endpoint_name(an_url))
+                logger.warning("json decode error. input: %s" % response.text)
                 if retries_left == 0:
                     return an_url, None, e
             print("request failure, manual retry")
@@ -577,17 +790,14 @@ class Fitness:
             payload = {"continuationToken": output["continuationToken"]}
             if self.verbosity > 2:
                 print("%s, %s" % (an_url, output["continuationToken"]))
-            response = requests_retry_session().get(
-                an_url, headers=headers, params=payload
-            )
-            result = response.text
-            output = json.loads(result)
+            response = tc_client.get(an_url, headers=headers, params=payload)
+            output = fast_json.loads(response.content)
         return an_url, output, None
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    # TODO: currently only sorts within worker-group (so sometimes results aren't sorted)... ideally sort all results.
+    # only sorts within worker type, --table sorts all results.
     parser.add_argument(
         "-s",
         "--success_rate",
@@ -653,6 +863,97 @@ if __name__ == "__main__":
         metavar="host",
         help="ssh to this host before pinging",
     )
+    parser.add_argument(
+        "--ping-per-device",
+        default=False,
+        action="store_true",
+        help="with --ping-host, ssh once per device instead of once per worker type",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=False,
+        help="don't use the on-disk task run store (%s) or worker group index (%s)."
+        % (task_run_store.STORE_PATH, worker_group_index.INDEX_PATH),
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        default=False,
+        help="show each worker as soon as it's done (unsorted).",
+    )
+    parser.add_argument(
+        "--table",
+        action="store_true",
+        default=False,
+        help="finish with a table sorted and aligned across all worker types.",
+    )
+    parser.add_argument(
+        "-e",
+        "--engine",
+        choices=["threadpool", "asyncio"],
+        default="threadpool",
+        help="fetch engine for queue and provisioner reports (default is threadpool).",
+    )
+    parser.add_argument(
+        "--daemon-url",
+        default=os.environ.get("FITNESS_DAEMON_URL"),
+        metavar="URL",
+        help="get reports from fitness_daemon.py at URL (e.g. http://127.0.0.1:%s), "
+        "defaults to $FITNESS_DAEMON_URL." % DEFAULT_DAEMON_PORT,
+    )
+    parser.add_argument(
+        "--history",
+        metavar="N",
+        type=int,
+        help="score each worker on its last N runs, from the task groups of "
+        "recent tasks and of recent pushes (recentTasks only has a few).",
+    )
+    parser.add_argument(
+        "--since",
+        metavar="DURATION",
+        help="like --history, but every run started in the last DURATION "
+        "(e.g. 6h, 2d). can be combined with --history.",
+    )
+    parser.add_argument(
+        "--history-projects",
+        default=",".join(fitness_history.DEFAULT_PROJECTS),
+        metavar="PROJECTS",
+        help="comma separated projects whose pushes --history and --since walk "
+        "(default is %s)." % ",".join(fitness_history.DEFAULT_PROJECTS),
+    )
+    parser.add_argument(
+        "--history-max-groups",
+        default=fitness_history.MAX_TASK_GROUPS,
+        type=int,
+        metavar="N",
+        help="walk at most N task groups for --history and --since "
+        "(default is %s)." % fitness_history.MAX_TASK_GROUPS,
+    )
+    parser.add_argument(
+        "--history-max-pages",
+        default=fitness_history.MAX_PAGES,
+        type=int,
+        metavar="N",
+        help="fetch at most N task group pages for --history and --since "
+        "(default is %s)." % fitness_history.MAX_PAGES,
+    )
+    parser.add_argument(
+        "--analytics",
+        action="store_true",
+        default=False,
+        help="show success rate, exception and last started distributions "
+        "per worker type and fleet-wide (needs pandas).",
+    )
+    parser.add_argument(
+        "--export",
+        metavar="PATH",
+        help="save every task run to a .csv, .csv.gz or .parquet file "
+        "(see fitness_analytics.py).",
+    )
+    cassette.add_arguments(parser)
+    tc_client.add_arguments(parser)
+    phase_profiler.add_arguments(parser)
     parser.add_argument(
         "worker_type_id",
         metavar="worker_type[.worker_id]",
@@ -668,6 +969,31 @@ if __name__ == "__main__":
         print("ERROR: --alert-percent must be between 0 and 1.")
         sys.exit(1)
 
+    since_seconds = None
+    if args.since:
+        try:
+            since_seconds = fitness_history.parse_duration(args.since)
+        except ValueError as e:
+            print("ERROR: %s" % e)
+            sys.exit(1)
+    history = args.history or args.since
+    if history and args.daemon_url:
+        print("ERROR: --history and --since can't be used with --daemon-url.")
+        sys.exit(1)
+
+    if args.analytics or args.export:
+        if history:
+            print("ERROR: --analytics and --export only cover recent tasks.")
+            sys.exit(1)
+        if args.daemon_url:
+            print("ERROR: --analytics and --export need task runs, not --daemon-url.")
+            sys.exit(1)
+        try:
+            fitness_analytics.check_available(args.export)
+        except (ImportError, ValueError) as e:
+            print("ERROR: %s" % e)
+            sys.exit(1)
+
     arg_worker_type = None
     arg_worker_id = None
     if args.worker_type_id:
@@ -676,11 +1002,42 @@ if __name__ == "__main__":
         if len(arg_worker_type_id_split) == 2:
             arg_worker_id = arg_worker_type_id_split[1]
 
+    # cached statuses would be missing from recordings
+    recording = cassette.from_args(args)
+    tc_client.use_cassette(recording)
+    try:
+        tc_client.from_args(args)
+    except ValueError as e:
+        print("ERROR: %s" % e)
+        sys.exit(1)
+    tc_client.install_taskcluster_transport()
+    profiler = phase_profiler.from_args(args)
+
     f = Fitness(
         log_level=args.log_level,
         provisioner=args.provisioner,
         alert_percent=args.alert_percent,
+        task_cache=not (args.no_cache or recording),
     )
     # TODO: just pass args?
     f.args = args
+    if args.ping and args.ping_host and not args.ping_per_device:
+        f.pinger = ping_probe.BatchPinger(args.ping_host, args.ping_domain)
+    if args.analytics or args.export:
+        f.run_collector = fitness_analytics.RunCollector()
+    if history:
+        f.history = fitness_history.HistoryWalker(
+            f,
+            limit=args.history,
+            since_seconds=since_seconds,
+            thread_count=WORKERTYPE_THREAD_COUNT,
+            projects=args.history_projects.split(","),
+            max_groups=args.history_max_groups,
+            max_pages=args.history_max_pages,
+        )
+    if profiler:
+        profiler.start()
     f.main(args.provisioner, arg_worker_type, arg_worker_id)
+    if profiler:
+        profiler.stop()
+        print(profiler.format_table())
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+import argparse
+import importlib.util
+import sys
+import threading
+
+# columnar analytics for fitness passes
+#
+# - RunCollector keeps every task run seen by a fitness pass (one row per
+#   run done by the reporting worker) in columns
+# - summarize() computes per worker type and fleet-wide success rate
+#   percentiles, exception rates and last started distributions with pandas
+#   (no per-worker python loops)
+# - runs can be exported to csv or parquet and summarized later without
+#   querying taskcluster again:
+#     ./fitness.py --export /tmp/runs.parquet
+#     ./fitness_analytics.py /tmp/runs.parquet
+#
+# pandas is optional (`pipenv run pip install pandas`, parquet also needs
+# pyarrow). fitness.py only needs it for --analytics and --export.
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+COLUMNS = [
+    "worker_type",
+    "worker_id",
+    "task_id",
+    "run_id",
+    "state",
+    "started",
+    "resolved",
+]
+PERCENTILES = [0.1, 0.5, 0.9]
+EXPORT_FORMATS = (".csv", ".csv.gz", ".parquet")
+
+
+def check_available(export_path=None):
+    if pandas is None:
+        raise ImportError("pandas is needed (pipenv run pip install pandas)")
+    if export_path and not export_path.endswith(EXPORT_FORMATS):
+        raise ValueError(
+            "unknown export format for %s (use %s)"
+            % (export_path, ", ".join(EXPORT_FORMATS))
+        )
+    if export_path and export_path.endswith(".parquet"):
+        if importlib.util.find_spec("pyarrow") is None:
+            raise ImportError("parquet needs pyarrow (pipenv run pip install pyarrow)")
+
+
+class RunCollector:
+    def __init__(self):
+        self.columns = {name: [] for name in COLUMNS}
+        # device reports are calculated from several threads
+        self.lock = threading.Lock()
+
+    # task_results: (task_id, task status json, error) tuples from get_task_status
+    def add(self, worker_type, worker_id, task_results):
+        rows = []
+        for task_id, result, error in task_results:
+            if error or not result or "status" not in result:
+                continue
+            for run in result["status"].get("runs", []):
+                if run.get("workerId") != worker_id:
+                    continue
+                rows.append(
+                    (
+                        worker_type,
+                        worker_id,
+                        task_id,
+                        run["runId"],
+                        run["state"],
+                        run.get("started"),
+                        run.get("resolved"),
+                    )
+                )
+        with self.lock:
+            for row in rows:
+                for name, value in zip(COLUMNS, row):
+                    self.columns[name].append(value)
+
+    def run_count(self):
+        with self.lock:
+            return len(self.columns["task_id"])
+
+    def frame(self):
+        with self.lock:
+            df = pandas.DataFrame({name: list(v) for name, v in self.columns.items()})
+        return prepare(df)
+
+
+# types the columns (exports and fresh collections alike)
+def prepare(df):
+    for column in ("started", "resolved"):
+        df[column] = pandas.to_datetime(df[column], utc=True, format="ISO8601")
+    for column in ("worker_type", "worker_id", "state"):
+        df[column] = df[column].astype("category")
+    return df
+
+
+# one row per worker: suc, fail, exc, runs, sr (NaN without finished runs), ls
+def worker_stats(df):
+    counts = pandas.crosstab([df["worker_type"], df["worker_id"]], df["state"])
+    counts = counts.reindex(
+        columns=["completed", "failed", "exception"], fill_value=0
+    ).astype(int)
+    stats = pandas.DataFrame(
+        {
+            "suc": counts["completed"],
+            "fail": counts["failed"],
+            "exc": counts["exception"],
+        }
+    )
+    stats["runs"] = (
+        df.groupby(["worker_type", "worker_id"], observed=True)
+        .size()
+        .reindex(stats.index, fill_value=0)
+    )
+    finished = stats["suc"] + stats["fail"]
+    stats["sr"] = stats["suc"] / finished.where(finished > 0)
+    stats["ls"] = df.groupby(["worker_type", "worker_id"], observed=True)[
+        "started"
+    ].max()
+    return stats
+
+
+def quantiles(grouped, column, prefix):
+    result = grouped[column].quantile(PERCENTILES).unstack()
+    result.columns = ["%s%d" % (prefix, round(q * 100)) for q in PERCENTILES]
+    return result
+
+
+def summarize_groups(grouped):
+    runs = grouped["runs"].sum()
+    return pandas.concat(
+        [
+            grouped.size().rename("workers"),
+            grouped["sr"].mean().rename("sr_mean"),
+            quantiles(grouped, "sr", "sr_p"),
+            (grouped["exc"].sum() / runs.where(runs > 0)).rename("exc_rate"),
+            quantiles(grouped, "ls_minutes", "ls_min_p"),
+            grouped["ls_minutes"].max().rename("ls_min_max"),
+        ],
+        axis=1,
+    )
+
+
+# per worker type rows plus a "fleet" row
+def summarize(df, now=None):
+    now = now or pandas.Timestamp.now(tz="UTC")
+    stats = worker_stats(df)
+    stats["ls_minutes"] = (now - stats["ls"]).dt.total_seconds() / 60
+    per_queue = summarize_groups(stats.groupby(level="worker_type", observed=True))
+    fleet = summarize_groups(stats.groupby(lambda _index: "fleet"))
+    return pandas.concat([per_queue, fleet])
+
+
+def format_summary(summary):
+    return summary.to_string(
+        float_format=lambda value: "%.2f" % value, na_rep="-", justify="right"
+    )
+
+
+def export(df, path):
+    if path.endswith(".parquet"):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False, date_format="%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def load(path):
+    if path.endswith(".parquet"):
+        df = pandas.read_parquet(path)
+    else:
+        df = pandas.read_csv(path)
+    return prepare(df)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="summarize task runs exported with `fitness.py --export`."
+    )
+    parser.add_argument("path", help="a .csv, .csv.gz or .parquet export.")
+    parser.add_argument(
+        "-w",
+        "--workers",
+        action="store_true",
+        help="also show each worker's counts.",
+    )
+    args = parser.parse_args()
+
+    try:
+        check_available()
+    except ImportError as e:
+        print("ERROR: %s" % e)
+        sys.exit(1)
+
+    df = load(args.path)
+    if args.workers:
+        print(worker_stats(df).to_string(na_rep="-"))
+        print()
+    print(format_summary(summarize(df)))
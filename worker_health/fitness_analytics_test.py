@@ -0,0 +1,76 @@
+import pytest
+
+import fitness_analytics
+
+pandas = pytest.importorskip("pandas")
+
+
+def status(worker_id, states, started="2020-01-01T11:00:00.000Z"):
+    runs = [
+        {"runId": run_id, "workerId": worker_id, "state": state, "started": started}
+        for run_id, state in enumerate(states)
+    ]
+    return {"status": {"state": states[-1], "runs": runs}}
+
+
+def collect():
+    collector = fitness_analytics.RunCollector()
+    collector.add(
+        "wt-a",
+        "w1",
+        [
+            ("t1", status("w1", ["completed"]), None),
+            ("t2", status("w1", ["failed"]), None),
+            # runs by other workers and errors are skipped
+            ("t3", status("w9", ["completed"]), None),
+            ("t4", None, Exception("timeout")),
+        ],
+    )
+    collector.add(
+        "wt-a",
+        "w2",
+        [("t5", status("w2", ["exception"], "2020-01-01T10:00:00.000Z"), None)],
+    )
+    collector.add("wt-b", "w3", [("t6", status("w3", ["completed"]), None)])
+    return collector
+
+
+def test_collector_is_truthy_when_empty():
+    # fitness checks `if self.run_collector:` before collecting
+    assert fitness_analytics.RunCollector()
+
+
+def test_summary_per_worker_type_and_fleet():
+    collector = collect()
+    assert collector.run_count() == 4
+    now = pandas.Timestamp("2020-01-01T12:00:00Z")
+    summary = fitness_analytics.summarize(collector.frame(), now=now)
+
+    assert list(summary.index) == ["wt-a", "wt-b", "fleet"]
+    assert list(summary["workers"]) == [2, 1, 3]
+    # w2 has no finished runs, so no success rate
+    assert summary.loc["wt-a", "sr_mean"] == 0.5
+    assert summary.loc["fleet", "sr_mean"] == 0.75
+    assert summary.loc["wt-a", "exc_rate"] == pytest.approx(1 / 3)
+    assert summary.loc["fleet", "ls_min_max"] == 120
+    assert summary.loc["wt-b", "ls_min_p50"] == 60
+
+
+@pytest.mark.parametrize("name", ["runs.csv", "runs.csv.gz"])
+def test_export_and_load(tmp_path, name):
+    df = collect().frame()
+    path = str(tmp_path / name)
+    fitness_analytics.export(df, path)
+    loaded = fitness_analytics.load(path)
+    assert loaded["started"].equals(df["started"])
+    assert list(loaded["task_id"]) == list(df["task_id"])
+    now = pandas.Timestamp("2020-01-01T12:00:00Z")
+    assert fitness_analytics.summarize(loaded, now=now).equals(
+        fitness_analytics.summarize(df, now=now)
+    )
+
+
+def test_check_available():
+    with pytest.raises(ValueError):
+        fitness_analytics.check_available("runs.json")
+    fitness_analytics.check_available("runs.csv")
@@ -0,0 +1,116 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import phase_profiler
+import tc_client
+
+# asyncio fan-out engine for Fitness queue and provisioner reports
+#
+# the ThreadPool path handles worker types one at a time and creates a new
+# pool per worker type and per device. this engine schedules the pending
+# counts, worker lists, recentTasks and task statuses for every worker type
+# at once, with a single global budget of in-flight requests.
+#
+# requests are still made with the shared (blocking) tc_client session, run
+# in one executor sized to the budget, so connection pooling still applies.
+
+DEFAULT_CONCURRENCY = 24
+
+
+class AsyncFitnessEngine:
+    def __init__(self, fitness, concurrency=DEFAULT_CONCURRENCY, on_result=None):
+        self.fitness = fitness
+        self.concurrency = concurrency
+        # on_result(worker_type, device result) is called as each device finishes
+        self.on_result = on_result
+        self.executor = None
+        self.semaphore = None
+        tc_client.set_pool_size(max(concurrency, tc_client.get_stats()["pool_size"]))
+
+    # runs a blocking call in the executor, counting against the budget
+    async def call(self, func, *args):
+        async with self.semaphore:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+
+    async def pending_counts(self, worker_types):
+        results = await asyncio.gather(
+            *[self.call(self.fitness.get_pending_tasks, wt) for wt in worker_types]
+        )
+        for queue, result, _error in results:
+            self.fitness.set_queue_count(queue, result)
+
+    async def worker_lists(self, worker_types):
+        return await asyncio.gather(
+            *[
+                self.call(self.fitness.get_workertype_worker_ids, wt)
+                for wt in worker_types
+            ]
+        )
+
+    async def device_report(self, queue, worker_group, device):
+        with phase_profiler.phase("task statuses"):
+            task_ids = await self.call(
+                self.fitness.get_recent_task_ids, queue, worker_group, device
+            )
+            task_results, task_ids_to_fetch = self.fitness.get_stored_task_statuses(
+                task_ids
+            )
+            self.fitness.count_api_call(queue, "status", len(task_ids_to_fetch))
+            fetched = await asyncio.gather(
+                *[
+                    self.call(self.fitness.get_task_status, task_id)
+                    for task_id in task_ids_to_fetch
+                ]
+            )
+            await self.call(self.fitness.store_task_statuses, fetched)
+            task_results.extend(fetched)
+        # may ping, so don't run on the event loop
+        loop = asyncio.get_event_loop()
+        result = await loop.run_in_executor(
+            self.executor,
+            self.fitness.calculate_device_fitness,
+            queue,
+            device,
+            task_results,
+        )
+        if self.on_result:
+            self.on_result(queue, result)
+        return result
+
+    async def workertype_report(self, worker_type, worker_ids):
+        results = await asyncio.gather(
+            *[self.device_report(*worker_id) for worker_id in worker_ids],
+            return_exceptions=True,
+        )
+        device_results = []
+        for result in results:
+            if isinstance(result, Exception):
+                print(result)
+                continue
+            device_results.append(result)
+        return worker_type, self.fitness.sort_worker_results(device_results), None
+
+    async def report(self, worker_types):
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        # device reports need the queue counts, so fetch those with the worker lists
+        _counts, worker_lists = await asyncio.gather(
+            self.pending_counts(worker_types), self.worker_lists(worker_types)
+        )
+        return await asyncio.gather(
+            *[
+                self.workertype_report(wt, worker_ids)
+                for wt, worker_ids in zip(worker_types, worker_lists)
+            ]
+        )
+
+    # returns a list of workertype_fitness_report style tuples, in worker_types order
+    def run(self, worker_types):
+        loop = asyncio.new_event_loop()
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                self.executor = executor
+                return loop.run_until_complete(self.report(worker_types))
+        finally:
+            self.executor = None
+            loop.close()
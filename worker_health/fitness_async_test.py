@@ -0,0 +1,86 @@
+import threading
+import time
+
+import fitness_async
+
+
+class FakeFitness:
+    # implements the Fitness methods the engine drives, without network access
+    def __init__(self, workers):
+        self.workers = workers
+        self.queue_counts = {}
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def track(self):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+
+    def get_pending_tasks(self, queue):
+        self.track()
+        return queue, {"pendingTasks": 3}, None
+
+    def set_queue_count(self, queue, result):
+        self.queue_counts[queue] = result["pendingTasks"]
+
+    def get_workertype_worker_ids(self, worker_type):
+        self.track()
+        return [(worker_type, "group", worker) for worker in self.workers[worker_type]]
+
+    def get_recent_task_ids(self, queue, worker_group, device):
+        self.track()
+        return ["%s-task-%s" % (device, i) for i in range(3)]
+
+    def get_stored_task_statuses(self, task_ids):
+        return [], task_ids
+
+    def count_api_call(self, worker_type, endpoint, count=1):
+        pass
+
+    def get_task_status(self, task_id):
+        self.track()
+        return task_id, {"status": {"state": "completed"}}, None
+
+    def store_task_statuses(self, task_results):
+        pass
+
+    def calculate_device_fitness(self, queue, device, task_results):
+        assert queue in self.queue_counts
+        return device, {"tasks": sorted(r[0] for r in task_results)}, None
+
+    def sort_worker_results(self, results):
+        worker_results = []
+        for worker_id, result, _error in results:
+            result["worker_id"] = worker_id
+            worker_results.append(result)
+        return sorted(worker_results, key=lambda i: i["worker_id"])
+
+
+def test_engine_reports_every_worker_type_in_order():
+    fake = FakeFitness({"wt-b": ["w2", "w1"], "wt-a": ["w3"], "wt-c": []})
+    engine = fitness_async.AsyncFitnessEngine(fake, concurrency=4)
+    results = engine.run(["wt-b", "wt-a", "wt-c"])
+
+    assert [r[0] for r in results] == ["wt-b", "wt-a", "wt-c"]
+    assert [item["worker_id"] for item in results[0][1]] == ["w1", "w2"]
+    assert results[1][1] == [
+        {"tasks": ["w3-task-0", "w3-task-1", "w3-task-2"], "worker_id": "w3"}
+    ]
+    assert results[2][1] == []
+    assert fake.queue_counts == {"wt-a": 3, "wt-b": 3, "wt-c": 3}
+    assert 1 < fake.max_in_flight <= 4
+
+
+def test_engine_calls_on_result_for_each_device():
+    fake = FakeFitness({"wt-a": ["w1", "w2"], "wt-b": ["w3"]})
+    seen = []
+    engine = fitness_async.AsyncFitnessEngine(
+        fake, on_result=lambda wt, result: seen.append((wt, result[0]))
+    )
+    engine.run(["wt-a", "wt-b"])
+    assert sorted(seen) == [("wt-a", "w1"), ("wt-a", "w2"), ("wt-b", "w3")]
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+
+import argparse
+import http.server
+import json
+import logging
+import re
+import threading
+from multiprocessing.pool import ThreadPool
+from time import time as timer
+
+from natsort import natsorted
+
+import fitness
+import tc_client
+import tc_time
+from worker_health import logger
+
+# long-running fitness reporter
+#
+# - keeps the Fitness instance (session, queue client, task run store) and
+#   per-worker rolling windows (last N tasks, last 1h/6h/24h) in memory,
+#   until the worker (or its worker type) is no longer listed
+# - a background thread refreshes every worker type of the provisioner
+# - answers host, queue and provisioner queries from memory over a
+#   localhost http/json endpoint:
+#     GET /status
+#     GET /provisioner
+#     GET /queue/<worker_type>
+#     GET /host/<worker_type>/<worker_id>
+# - `fitness.py --daemon-url URL` is a thin client of it
+#
+# usage:
+#   ./fitness_daemon.py -p proj-autophone
+#   ./fitness.py --daemon-url http://127.0.0.1:8765 gecko-t-bitbar-gw-perf-p2
+
+DEFAULT_PORT = fitness.DEFAULT_DAEMON_PORT
+REFRESH_SECONDS = 300
+# the time windows kept for each worker, in seconds
+WINDOWS = {"1h": 60 * 60, "6h": 6 * 60 * 60, "24h": 24 * 60 * 60}
+LAST_N_TASKS = 20
+
+
+def count_runs(runs):
+    counts = {"suc": 0, "fail": 0, "exc": 0, "rng": 0, "sr": None}
+    for state in runs:
+        if state == "completed":
+            counts["suc"] += 1
+        elif state == "failed":
+            counts["fail"] += 1
+        elif state == "exception":
+            counts["exc"] += 1
+        elif state == "running":
+            counts["rng"] += 1
+    if counts["suc"] + counts["fail"]:
+        counts["sr"] = counts["suc"] / (counts["suc"] + counts["fail"])
+    return counts
+
+
+class WorkerWindows:
+    # runs done by one worker, kept across refreshes (recentTasks only has
+    # the last few tasks, the windows can cover more)
+    def __init__(self, worker_id, last_n=LAST_N_TASKS):
+        self.worker_id = worker_id
+        self.last_n = last_n
+        # {(task_id, run_id): (started epoch, state)}
+        self.runs = {}
+
+    # task_results: (task_id, task status json, error) tuples
+    def update(self, task_results):
+        for task_id, result, error in task_results:
+            if error or not result or "status" not in result:
+                continue
+            for run in result["status"].get("runs", []):
+                if run.get("workerId") != self.worker_id or "started" not in run:
+                    continue
+                started = tc_time.parse(run["started"])
+                self.runs[(task_id, run["runId"])] = (started, run["state"])
+
+    # drops runs older than the largest window (keeping the last n)
+    def prune(self, now):
+        oldest = now - max(WINDOWS.values())
+        newest_first = sorted(self.runs.items(), key=lambda i: i[1][0], reverse=True)
+        for key, (started, _state) in newest_first[self.last_n :]:
+            if started < oldest:
+                del self.runs[key]
+
+    def summary(self, now):
+        newest_first = sorted(self.runs.values(), reverse=True)
+        last_n = [state for _started, state in newest_first[: self.last_n]]
+        summary = {"last_%s" % self.last_n: count_runs(last_n)}
+        for name, seconds in WINDOWS.items():
+            summary[name] = count_runs(
+                state for started, state in newest_first if started >= now - seconds
+            )
+        return summary
+
+
+class FitnessDaemon:
+    def __init__(
+        self,
+        provisioner,
+        refresh_seconds=REFRESH_SECONDS,
+        log_level=0,
+        task_cache=True,
+    ):
+        self.provisioner = provisioner
+        self.refresh_seconds = refresh_seconds
+        self.fitness = fitness.Fitness(
+            log_level=log_level, provisioner=provisioner, task_cache=task_cache
+        )
+        # calculate_device_fitness reads these
+        self.fitness.args = argparse.Namespace(ping=False, sort_order="worker_id")
+        self.lock = threading.Lock()
+        # {worker_type: [report, ...]}, reports include worker_id and windows
+        self.reports = {}
+        # {worker_type: epoch of last refresh}
+        self.refreshed = {}
+        # {(worker_type, worker_id): WorkerWindows}
+        self.windows = {}
+        self.last_refresh_seconds = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def get_worker_types(self):
+        result = self.fitness.get_worker_types(self.provisioner)
+        return [item["workerType"] for item in result.get("workerTypes", [])]
+
+    def refresh_worker(self, worker_type, worker_group, worker_id):
+        results = self.fitness.get_device_task_results(
+            worker_type, worker_group, worker_id
+        )
+        _device, report, _e = self.fitness.calculate_device_fitness(
+            worker_type, worker_id, results
+        )
+        key = (worker_type, worker_id)
+        with self.lock:
+            windows = self.windows.setdefault(key, WorkerWindows(worker_id))
+        windows.update(results)
+        now = self.fitness.now or tc_time.now()
+        windows.prune(now)
+        report["worker_id"] = worker_id
+        report["windows"] = windows.summary(now)
+        return report
+
+    def refresh_worker_type(self, worker_type):
+        worker_ids = self.fitness.get_workertype_worker_ids(worker_type)
+        with ThreadPool(fitness.WORKERTYPE_THREAD_COUNT) as pool:
+            reports = pool.starmap(self.refresh_worker, worker_ids)
+        reports = natsorted(reports, key=lambda i: i["worker_id"])
+        current = {(worker_type, worker_id) for _wt, _wg, worker_id in worker_ids}
+        with self.lock:
+            self.reports[worker_type] = reports
+            self.refreshed[worker_type] = timer()
+            # workers that left the worker type (tc sometimes lists no workers
+            # for a moment, keep the windows then)
+            if current:
+                for key in [k for k in self.windows if k[0] == worker_type]:
+                    if key not in current:
+                        del self.windows[key]
+
+    def refresh(self):
+        start = timer()
+        self.fitness.now = tc_time.now()
+        worker_types = self.get_worker_types()
+        self.fitness.get_pending_tasks_multi(worker_types)
+        for worker_type in worker_types:
+            try:
+                self.refresh_worker_type(worker_type)
+            except Exception as e:
+                logger.warning("refreshing %s failed: %s" % (worker_type, e))
+        with self.lock:
+            # worker types that went away
+            current = set(worker_types)
+            for worker_type in set(self.reports) - current:
+                del self.reports[worker_type]
+                del self.refreshed[worker_type]
+            for key in [k for k in self.windows if k[0] not in current]:
+                del self.windows[key]
+            self.last_refresh_seconds = timer() - start
+        logger.info(
+            "refreshed %s worker types in %.1f seconds"
+            % (len(worker_types), self.last_refresh_seconds)
+        )
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("refresh failed: %s" % e)
+            self.stopped.wait(self.refresh_seconds)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    # query results: (http status, json body)
+    def query(self, path):
+        status, body = self.query_reports(path)
+        body["provisioner"] = self.provisioner
+        return status, body
+
+    def query_reports(self, path):
+        with self.lock:
+            if path == "/status":
+                return 200, {
+                    "refreshed": dict(self.refreshed),
+                    "last_refresh_seconds": self.last_refresh_seconds,
+                    "refresh_seconds": self.refresh_seconds,
+                }
+            if not self.refreshed:
+                return 503, {"error": "first refresh hasn't finished yet"}
+            if path == "/provisioner":
+                return 200, {"worker_types": list(self.reports.items())}
+            m = re.match(r"^/queue/([^/]+)$", path)
+            if m:
+                worker_type = m.group(1)
+                if worker_type not in self.reports:
+                    return 404, {"error": "unknown worker type %s" % worker_type}
+                return 200, {"worker_types": [[worker_type, self.reports[worker_type]]]}
+            m = re.match(r"^/host/([^/]+)/([^/]+)$", path)
+            if m:
+                worker_type, worker_id = m.groups()
+                for report in self.reports.get(worker_type, []):
+                    if report["worker_id"] == worker_id:
+                        return 200, {"worker_types": [[worker_type, [report]]]}
+                return 404, {"error": "unknown worker %s.%s" % (worker_type, worker_id)}
+        return 404, {"error": "unknown path %s" % path}
+
+
+class FitnessDaemonHandler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_GET(self):
+        status, body = self.server.fitness_daemon.query(self.path.split("?")[0])
+        # pendulum DateTimes (last started) become iso 8601 strings
+        data = json.dumps(body, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def make_server(fitness_daemon, host="127.0.0.1", port=DEFAULT_PORT):
+    server = http.server.ThreadingHTTPServer((host, port), FitnessDaemonHandler)
+    server.daemon_threads = True
+    server.fitness_daemon = fitness_daemon
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="keep fitness reports in memory and serve them over http/json."
+    )
+    parser.add_argument(
+        "-p",
+        "--provisioner",
+        default=fitness.DEFAULT_PROVISIONER,
+        metavar="provisioner",
+        help="provisioner to track, defaults to %s." % fitness.DEFAULT_PROVISIONER,
+    )
+    parser.add_argument(
+        "--port", default=DEFAULT_PORT, type=int, help="default is %s." % DEFAULT_PORT
+    )
+    parser.add_argument(
+        "-r",
+        "--refresh-seconds",
+        default=REFRESH_SECONDS,
+        type=int,
+        help="seconds between refreshes, defaults to %s." % REFRESH_SECONDS,
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        dest="log_level",
+        default=0,
+        help="specify multiple times for even more verbosity.",
+    )
+    tc_client.add_arguments(parser)
+    args = parser.parse_args()
+    tc_client.from_args(args)
+    tc_client.install_taskcluster_transport()
+
+    if args.log_level > 1:
+        logger.setLevel(logging.DEBUG)
+
+    fd = FitnessDaemon(
+        args.provisioner,
+        refresh_seconds=args.refresh_seconds,
+        log_level=args.log_level,
+    )
+    fd.start()
+    server = make_server(fd, port=args.port)
+    logger.info(
+        "serving %s fitness on http://127.0.0.1:%s" % (args.provisioner, args.port)
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    fd.stop()
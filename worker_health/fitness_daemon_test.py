@@ -0,0 +1,178 @@
+import argparse
+import http.server
+import threading
+
+import pytest
+
+import fake_tc_queue
+import fitness
+import fitness_daemon
+import tc_client
+
+
+def run(task_id, run_id, worker_id, state, started):
+    return (
+        task_id,
+        {
+            "status": {
+                "runs": [
+                    {
+                        "runId": run_id,
+                        "workerId": worker_id,
+                        "state": state,
+                        "started": started,
+                    }
+                ]
+            }
+        },
+        None,
+    )
+
+
+def test_count_runs():
+    counts = fitness_daemon.count_runs(["completed", "failed", "completed", "running"])
+    assert counts == {"suc": 2, "fail": 1, "exc": 0, "rng": 1, "sr": 2 / 3}
+    assert fitness_daemon.count_runs([])["sr"] is None
+
+
+def test_worker_windows():
+    windows = fitness_daemon.WorkerWindows("w1", last_n=2)
+    windows.update(
+        [
+            run("a", 0, "w1", "completed", "2020-01-01T11:30:00Z"),
+            run("b", 0, "w1", "failed", "2020-01-01T09:00:00Z"),
+            run("c", 0, "w1", "completed", "2019-12-30T12:00:00Z"),
+            # other workers' runs and errors are ignored
+            run("d", 0, "w2", "failed", "2020-01-01T11:50:00Z"),
+            ("e", None, "error"),
+        ]
+    )
+    # 2020-01-01T12:00:00Z
+    now = 1577880000
+    summary = windows.summary(now)
+    assert summary["last_2"]["suc"] == 1 and summary["last_2"]["fail"] == 1
+    assert summary["1h"]["suc"] == 1 and summary["1h"]["fail"] == 0
+    assert summary["6h"]["sr"] == 0.5
+    assert summary["24h"]["suc"] == 1
+
+    # c is outside of the last 2 and the 24h window
+    windows.prune(now)
+    assert ("c", 0) not in windows.runs
+    assert len(windows.runs) == 2
+
+
+@pytest.fixture
+def daemon():
+    fleet = fake_tc_queue.FakeFleet(workers=12, worker_types=2)
+    root_url = tc_client.ROOT_URL
+    try:
+        with fake_tc_queue.FakeQueueServer(fleet) as server:
+            tc_client.set_root_url(server.root_url)
+            fd = fitness_daemon.FitnessDaemon(fleet.provisioner, task_cache=False)
+            yield fleet, fd
+    finally:
+        tc_client.set_root_url(root_url)
+
+
+def test_queries_before_and_after_refresh(daemon):
+    fleet, fd = daemon
+    assert fd.query("/provisioner")[0] == 503
+    assert fd.query("/status")[0] == 200
+
+    fd.refresh()
+    status, body = fd.query("/provisioner")
+    assert status == 200
+    assert body["provisioner"] == fleet.provisioner
+    assert [wt for wt, _reports in body["worker_types"]] == fleet.worker_types
+
+    worker_type = fleet.worker_types[0]
+    worker_id = sorted(fleet.workers[worker_type])[0]
+    status, body = fd.query("/host/%s/%s" % (worker_type, worker_id))
+    assert status == 200
+    report = body["worker_types"][0][1][0]
+    assert report["worker_id"] == worker_id
+    assert set(report["windows"]) == {"last_20", "1h", "6h", "24h"}
+
+    assert fd.query("/queue/unknown")[0] == 404
+    assert fd.query("/host/%s/unknown" % worker_type)[0] == 404
+    assert fd.query("/nope")[0] == 404
+
+
+def test_windows_of_removed_workers_are_dropped(daemon):
+    fleet, fd = daemon
+    fd.refresh()
+    worker_type = fleet.worker_types[0]
+    worker_id = sorted(fleet.workers[worker_type])[0]
+    assert (worker_type, worker_id) in fd.windows
+
+    with fleet.lock:
+        del fleet.workers[worker_type][worker_id]
+    fd.refresh()
+    assert (worker_type, worker_id) not in fd.windows
+    assert len(fd.windows) == sum(len(w) for w in fleet.workers.values())
+
+
+def test_fitness_daemon_url_client(daemon):
+    fleet, fd = daemon
+    fd.refresh()
+    server = fitness_daemon.make_server(fd, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        f = fitness.Fitness(provisioner=fleet.provisioner, task_cache=False)
+        f.args = argparse.Namespace(
+            daemon_url="http://127.0.0.1:%s" % server.server_address[1],
+            sort_order="worker_id",
+        )
+        worker_type = fleet.worker_types[1]
+        results = f.get_daemon_report(fleet.provisioner, worker_type, None)
+        assert len(results) == 1
+        wt, worker_results, _e = results[0]
+        assert wt == worker_type
+        assert sorted(r["worker_id"] for r in worker_results) == sorted(
+            fleet.workers[worker_type]
+        )
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class NotADaemonHandler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        status = 404 if self.path.startswith("/queue/") else 200
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html")
+        self.end_headers()
+        self.wfile.write(b"<html>not json</html>")
+
+
+@pytest.mark.parametrize(
+    "path, error",
+    [("/", "bad json"), ("/queue/gecko-t-fake", "HTTP 404"), (None, "ERROR")],
+)
+def test_fitness_daemon_url_errors(path, error, capsys):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), NotADaemonHandler)
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    if path is None:
+        # nothing listening
+        server.shutdown()
+        server.server_close()
+    f = fitness.Fitness(provisioner="proj-autophone", task_cache=False)
+    f.args = argparse.Namespace(daemon_url="http://127.0.0.1:%s" % port)
+    worker_type = None
+    if path and path.startswith("/queue/"):
+        worker_type = "gecko-t-fake"
+    try:
+        with pytest.raises(SystemExit):
+            f.get_daemon_report("proj-autophone", worker_type, None)
+    finally:
+        if path is not None:
+            server.shutdown()
+            server.server_close()
+    out = capsys.readouterr().out
+    assert out.startswith("ERROR: fitness daemon at http://127.0.0.1:%s/" % port)
+    assert error in out
+    assert len(out.splitlines()) == 1
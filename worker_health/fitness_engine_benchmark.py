@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+import argparse
+import contextlib
+import io
+from time import time as timer
+
+import fitness
+import tc_client
+
+# compares the wall time of fitness.py's threadpool and asyncio engines
+# for the same queue or provisioner report
+
+
+def run_report(provisioner, worker_type, engine):
+    # no task-run store: the first engine would fill it for the second
+    f = fitness.Fitness(log_level=0, provisioner=provisioner, task_cache=False)
+    f.args = argparse.Namespace(
+        engine=engine,
+        sort_order="worker_id",
+        only_show_alerting=False,
+        humanize_hashes=False,
+        ping=False,
+        daemon_url=None,
+        stream=False,
+        table=False,
+    )
+    output = io.StringIO()
+    start = timer()
+    with contextlib.redirect_stdout(output):
+        f.main(provisioner, worker_type, None)
+    elapsed = timer() - start
+    # the summary line includes timing, drop it before comparing output
+    lines = [
+        line
+        for line in output.getvalue().splitlines()
+        if "workers queried in" not in line
+    ]
+    return elapsed, lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="time fitness.py's threadpool engine against the asyncio engine."
+    )
+    parser.add_argument(
+        "-p",
+        "--provisioner",
+        default=fitness.DEFAULT_PROVISIONER,
+        metavar="provisioner",
+        help="provisioner to inspect, defaults to %s." % fitness.DEFAULT_PROVISIONER,
+    )
+    parser.add_argument(
+        "-r",
+        "--rounds",
+        default=1,
+        type=int,
+        help="number of times to run each engine (default is 1).",
+    )
+    parser.add_argument(
+        "worker_type",
+        help="only report on this worker_type (default is the whole provisioner).",
+        nargs="?",
+    )
+    args = parser.parse_args()
+    tc_client.install_taskcluster_transport()
+
+    timings = {"threadpool": [], "asyncio": []}
+    outputs = {}
+    for _i in range(args.rounds):
+        for engine in timings:
+            elapsed, lines = run_report(args.provisioner, args.worker_type, engine)
+            timings[engine].append(elapsed)
+            outputs[engine] = lines
+
+    for engine, times in timings.items():
+        print(
+            "%-10s  best %6.2fs  mean %6.2fs  (%s rounds)"
+            % (engine, min(times), sum(times) / len(times), len(times))
+        )
+    speedup = min(timings["threadpool"]) / max(min(timings["asyncio"]), 0.001)
+    print("asyncio speedup: %.2fx" % speedup)
+    # live data can change between runs, so only warn
+    if outputs["threadpool"] != outputs["asyncio"]:
+        print("note: report output differed between engines (live data changes?)")
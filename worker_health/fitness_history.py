@@ -0,0 +1,384 @@
+import datetime
+import heapq
+import re
+import threading
+from multiprocessing.pool import ThreadPool
+
+import phase_profiler
+import tc_client
+import tc_time
+import utils
+
+# deep task history for fitness reports (--history N / --since DURATION)
+#
+# recentTasks only lists a worker's last few tasks. this walks task groups
+# (listTaskGroup) and counts the runs each worker did in them.
+#
+# - the task groups to walk: first the groups of the workers' recent tasks,
+#   then the pushes in the index (PUSH_INDEX_NAMESPACE), newest first. with
+#   --since, pushes back to the start of the window, with only --history,
+#   until every worker has N runs (or HISTORY_MAX_DAYS back).
+# - runs in the window from pushes older than it (retriggers) are only found
+#   if a worker's recent tasks include one of them
+# - each group is walked once per report. the runs of the provisioner's
+#   workers are kept (not the pages) and shared by the worker types.
+# - --history-max-groups and --history-max-pages limit the walk. worker types
+#   whose window (or last N runs) wasn't covered are listed by
+#   format_coverage(), their counts are partial.
+# - per worker, only counters (--since) or the newest N runs (--history, a
+#   bounded heap) are kept
+# - the recent task statuses used to find the task groups come from the task
+#   run store like a normal report does
+
+DURATION_UNITS = {"m": 60, "h": 60 * 60, "d": 24 * 60 * 60, "w": 7 * 24 * 60 * 60}
+GROUP_THREAD_COUNT = 6
+# the pushes of a day, e.g. gecko.v2.autoland.pushdate.2020.01.31. the
+# children are named after the push time (20200131123456).
+PUSH_INDEX_NAMESPACE = "gecko.v2.%s.pushdate.%04d.%02d.%02d"
+# a push's builds are indexed under <push namespace>.<product>, any one of
+# them gives the push's task group
+PUSH_INDEX_PRODUCT = "firefox"
+DEFAULT_PROJECTS = ["autoland", "mozilla-central"]
+# how far back --history (without --since) looks for pushes
+HISTORY_MAX_DAYS = 7
+# per report
+MAX_TASK_GROUPS = 50
+MAX_PAGES = 500
+RUN_STATE_COUNTS = {
+    "completed": "suc",
+    "failed": "fail",
+    "exception": "exc",
+    "running": "rng",
+}
+
+
+# e.g. '90m', '6h', '2d' or '1w' -> seconds
+def parse_duration(value):
+    m = re.match(r"^(\d+)([mhdw])$", value)
+    if not m:
+        raise ValueError("unknown duration '%s' (e.g. 90m, 6h, 2d, 1w)" % value)
+    return int(m.group(1)) * DURATION_UNITS[m.group(2)]
+
+
+# the format of taskcluster timestamps, which sort as strings
+def tc_timestamp(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.") + "%03dZ" % (dt.microsecond // 1000)
+
+
+class WorkerHistory:
+    # limit: keep the newest N runs, since: ignore runs started before (a
+    # taskcluster timestamp)
+    def __init__(self, limit=None, since=None):
+        self.limit = limit
+        self.since = since
+        # (started, task_id, run_id, state), the oldest first
+        self.heap = []
+        self.counts = {"suc": 0, "fail": 0, "rng": 0, "exc": 0}
+        self.last_started = None
+
+    def add(self, task_id, run):
+        started = run.get("started")
+        if not started or run["state"] not in RUN_STATE_COUNTS:
+            return
+        if self.since and started < self.since:
+            return
+        if self.limit:
+            entry = (started, task_id, run["runId"], run["state"])
+            if len(self.heap) < self.limit:
+                heapq.heappush(self.heap, entry)
+            else:
+                heapq.heappushpop(self.heap, entry)
+        else:
+            self.count(run["state"], started)
+
+    # has the newest N runs (more would only replace older ones)
+    def is_full(self):
+        return bool(self.limit) and len(self.heap) >= self.limit
+
+    def count(self, state, started):
+        self.counts[RUN_STATE_COUNTS[state]] += 1
+        if self.last_started is None or started > self.last_started:
+            self.last_started = started
+
+    # the same format as Fitness.count_device_tasks
+    def get_counts(self):
+        if self.limit:
+            self.counts = {"suc": 0, "fail": 0, "rng": 0, "exc": 0}
+            self.last_started = None
+            for started, _task_id, _run_id, state in self.heap:
+                self.count(state, started)
+        counts = dict(self.counts)
+        counts["ls"] = None
+        if self.last_started:
+            counts["ls"] = tc_time.to_datetime(tc_time.parse(self.last_started))
+        return counts
+
+
+class HistoryWalker:
+    def __init__(
+        self,
+        fitness,
+        limit=None,
+        since_seconds=None,
+        thread_count=4,
+        projects=None,
+        max_groups=MAX_TASK_GROUPS,
+        max_pages=MAX_PAGES,
+        now=None,
+    ):
+        self.fitness = fitness
+        self.limit = limit
+        # for fetching the recent task statuses
+        self.thread_count = thread_count
+        self.projects = projects or DEFAULT_PROJECTS
+        self.max_groups = max_groups
+        self.max_pages = max_pages
+        self.now = now or datetime.datetime.now(datetime.timezone.utc)
+        self.since = None
+        self.since_dt = None
+        if since_seconds:
+            self.since_dt = self.now - datetime.timedelta(seconds=since_seconds)
+            self.since = tc_timestamp(self.since_dt)
+        self.lock = threading.Lock()
+        # {task group id: {(worker_type, worker_id): [(task_id, run), ...]}},
+        # the runs of the provisioner's workers in the walked groups
+        self.group_runs = {}
+        # the groups whose walk stopped early (page limit or errors)
+        self.partial_groups = set()
+        # (push datetime, push namespace), newest first. listed once.
+        self.pushes = None
+        # {push namespace: task group id or None}
+        self.push_groups = {}
+        self.errors = []
+        # {worker_type: reason}, see format_coverage()
+        self.incomplete = {}
+        # totals, for -v
+        self.pages = 0
+        self.tasks = 0
+
+    # the task groups of the workers' recent tasks
+    def get_task_group_ids(self, worker_ids):
+        group_ids = set()
+        with ThreadPool(self.thread_count) as pool:
+            for task_results in pool.imap_unordered(
+                lambda worker: self.fitness.get_device_task_results(*worker),
+                worker_ids,
+            ):
+                for _task_id, result, error in task_results:
+                    if error or not result or "status" not in result:
+                        continue
+                    if "taskGroupId" in result["status"]:
+                        group_ids.add(result["status"]["taskGroupId"])
+        return group_ids
+
+    # the days the pushes are listed for, newest first
+    def push_days(self):
+        oldest = self.now - datetime.timedelta(days=HISTORY_MAX_DAYS)
+        if self.since_dt:
+            oldest = self.since_dt
+        day = self.now.date()
+        while day >= oldest.date():
+            yield day
+            day -= datetime.timedelta(days=1)
+
+    def list_pushes(self, worker_type):
+        pushes = []
+        for project in self.projects:
+            for day in self.push_days():
+                namespace = PUSH_INDEX_NAMESPACE % (
+                    project,
+                    day.year,
+                    day.month,
+                    day.day,
+                )
+                url = "%s/namespaces/%s" % (tc_client.index_url(), namespace)
+                token = None
+                while True:
+                    self.fitness.count_api_call(worker_type, "listNamespaces")
+                    page = utils.get_json_page(url, token)
+                    if "namespaces" not in page:
+                        # a day without pushes is an empty list
+                        self.errors.append("couldn't list %s" % namespace)
+                        break
+                    for item in page["namespaces"]:
+                        try:
+                            pushed = datetime.datetime.strptime(
+                                item["name"], "%Y%m%d%H%M%S"
+                            ).replace(tzinfo=datetime.timezone.utc)
+                        except (KeyError, ValueError):
+                            continue
+                        if self.since_dt and pushed < self.since_dt:
+                            continue
+                        pushes.append((pushed, item["namespace"]))
+                    token = page.get("continuationToken")
+                    if not token:
+                        break
+        pushes.sort(reverse=True)
+        return pushes
+
+    def get_push_group_id(self, worker_type, namespace):
+        url = "%s/tasks/%s.%s" % (
+            tc_client.index_url(),
+            namespace,
+            PUSH_INDEX_PRODUCT,
+        )
+        self.fitness.count_api_call(worker_type, "listTasks")
+        tasks = utils.get_json_page(url + "?limit=1").get("tasks")
+        if not tasks:
+            # e.g. a push without builds
+            return None
+        self.fitness.count_api_call(worker_type, "status")
+        status_url = "%s/task/%s/status" % (tc_client.queue_url(), tasks[0]["taskId"])
+        return utils.get_json_page(status_url).get("status", {}).get("taskGroupId")
+
+    # task group ids, in the order they're walked
+    def candidate_group_ids(self, worker_type, worker_ids):
+        yield from sorted(self.get_task_group_ids(worker_ids))
+        if self.pushes is None:
+            with phase_profiler.phase("push listing"):
+                self.pushes = self.list_pushes(worker_type)
+        # the pushes' groups are looked up a batch at a time
+        for i in range(0, len(self.pushes), GROUP_THREAD_COUNT):
+            namespaces = [
+                namespace
+                for _pushed, namespace in self.pushes[i : i + GROUP_THREAD_COUNT]
+                if namespace not in self.push_groups
+            ]
+            if namespaces:
+                with ThreadPool(GROUP_THREAD_COUNT) as pool:
+                    group_ids = pool.map(
+                        lambda namespace: self.get_push_group_id(
+                            worker_type, namespace
+                        ),
+                        namespaces,
+                    )
+                self.push_groups.update(zip(namespaces, group_ids))
+            for _pushed, namespace in self.pushes[i : i + GROUP_THREAD_COUNT]:
+                if self.push_groups[namespace]:
+                    yield self.push_groups[namespace]
+
+    def take_page(self):
+        with self.lock:
+            if self.pages >= self.max_pages:
+                return False
+            self.pages += 1
+            return True
+
+    def walk_task_group(self, worker_type, group_id):
+        url = "%s/task-group/%s/list" % (tc_client.queue_url(), group_id)
+        group_runs = {}
+        token = None
+        with phase_profiler.phase("task group walk"):
+            while True:
+                if not self.take_page():
+                    self.partial_groups.add(group_id)
+                    break
+                self.fitness.count_api_call(worker_type, "listTaskGroup")
+                page = utils.get_json_page(url, token)
+                if "tasks" not in page:
+                    self.partial_groups.add(group_id)
+                    self.errors.append("couldn't list task group %s" % group_id)
+                    break
+                for task in page["tasks"]:
+                    status = task.get("status", {})
+                    if status.get("provisionerId") != self.fitness.provisioner:
+                        continue
+                    for run in status.get("runs", []):
+                        if "workerId" in run:
+                            key = (status.get("workerType"), run["workerId"])
+                            group_runs.setdefault(key, []).append(
+                                (status["taskId"], run)
+                            )
+                with self.lock:
+                    self.tasks += len(page["tasks"])
+                token = page.get("continuationToken")
+                if not token:
+                    break
+        with self.lock:
+            self.group_runs[group_id] = group_runs
+
+    def add_group_runs(self, worker_type, group_id, histories):
+        for (run_worker_type, worker_id), runs in self.group_runs[group_id].items():
+            if run_worker_type == worker_type and worker_id in histories:
+                for task_id, run in runs:
+                    histories[worker_id].add(task_id, run)
+
+    # returns device_fitness_report style tuples for the workers
+    # worker_ids: (worker_type, worker_group, worker_id) tuples
+    def workertype_history(self, worker_type, worker_ids):
+        histories = {
+            worker_id: WorkerHistory(self.limit, self.since)
+            for _wt, _group, worker_id in worker_ids
+        }
+        used = []
+        batch = []
+        out_of_groups = False
+
+        def walk_batch():
+            new = [group_id for group_id in batch if group_id not in self.group_runs]
+            with ThreadPool(GROUP_THREAD_COUNT) as pool:
+                pool.starmap(
+                    self.walk_task_group,
+                    [(worker_type, group_id) for group_id in new],
+                )
+            for group_id in batch:
+                self.add_group_runs(worker_type, group_id, histories)
+            used.extend(batch)
+            batch.clear()
+
+        errors = len(self.errors)
+        for group_id in self.candidate_group_ids(worker_type, worker_ids):
+            if group_id in used or group_id in batch:
+                continue
+            if histories and all(h.is_full() for h in histories.values()):
+                break
+            if group_id not in self.group_runs:
+                if len(self.group_runs) + len(batch) >= self.max_groups:
+                    out_of_groups = True
+                    break
+            batch.append(group_id)
+            if len(batch) == GROUP_THREAD_COUNT:
+                walk_batch()
+        if batch:
+            walk_batch()
+
+        full = histories and all(h.is_full() for h in histories.values())
+        reasons = []
+        if out_of_groups and not full:
+            reasons.append("stopped at %s task groups" % self.max_groups)
+        partial = self.partial_groups.intersection(used)
+        if partial and not full:
+            reasons.append("%s task groups only partly walked" % len(partial))
+        if len(self.errors) > errors and not full:
+            reasons.append("%s listing errors" % (len(self.errors) - errors))
+        if reasons:
+            self.incomplete[worker_type] = reasons
+        return [
+            self.fitness.device_fitness_result(
+                worker_type, worker_id, history.get_counts()
+            )
+            for worker_id, history in histories.items()
+        ]
+
+    # warnings for the worker types whose history wasn't fully covered
+    def format_coverage(self):
+        lines = []
+        for worker_type, reasons in sorted(self.incomplete.items()):
+            lines.append(
+                "WARNING: %s: history is incomplete (%s), counts are partial."
+                % (worker_type, ", ".join(reasons))
+            )
+        if lines:
+            lines.append(
+                "  raise --history-max-groups (%s) or --history-max-pages (%s)."
+                % (self.max_groups, self.max_pages)
+            )
+        return lines
+
+    def format_stats(self):
+        return "history: %s task groups, %s pages, %s tasks walked, %s pushes" % (
+            len(self.group_runs),
+            self.pages,
+            self.tasks,
+            len(self.pushes or []),
+        )
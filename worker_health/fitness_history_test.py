@@ -0,0 +1,171 @@
+import argparse
+import datetime
+
+import pytest
+
+import fake_tc_queue
+import fitness
+import fitness_history
+import tc_client
+
+
+def run(run_id, state, started):
+    return {
+        "runId": run_id,
+        "state": state,
+        "workerId": "w1",
+        "started": "2020-01-01T%s:00.000Z" % started,
+    }
+
+
+def test_parse_duration():
+    assert fitness_history.parse_duration("90m") == 90 * 60
+    assert fitness_history.parse_duration("2d") == 2 * 24 * 60 * 60
+    with pytest.raises(ValueError):
+        fitness_history.parse_duration("3x")
+
+
+def test_worker_history_keeps_the_newest_runs():
+    history = fitness_history.WorkerHistory(limit=2)
+    history.add("t1", run(0, "failed", "10:00"))
+    history.add("t2", run(0, "completed", "12:00"))
+    history.add("t3", run(0, "exception", "11:00"))
+    # pending runs aren't counted
+    history.add("t4", run(0, "pending", "13:00"))
+    assert len(history.heap) == 2
+
+    counts = history.get_counts()
+    assert counts["suc"] == 1
+    assert counts["exc"] == 1
+    assert counts["fail"] == 0
+    assert counts["ls"].hour == 12
+
+
+def test_worker_history_since():
+    history = fitness_history.WorkerHistory(since="2020-01-01T11:00:00.000Z")
+    history.add("t1", run(0, "failed", "10:00"))
+    history.add("t2", run(0, "completed", "11:30"))
+    history.add("t2", run(1, "running", "11:40"))
+    assert history.heap == []
+    counts = history.get_counts()
+    assert (counts["suc"], counts["fail"], counts["rng"]) == (1, 0, 1)
+
+    assert fitness_history.WorkerHistory().get_counts()["ls"] is None
+
+
+def test_history_goes_past_recent_tasks():
+    fleet = fake_tc_queue.FakeFleet(
+        workers=6, worker_types=1, tasks_per_worker=12, recent_task_limit=3
+    )
+    worker_type = fleet.worker_types[0]
+    root_url = tc_client.ROOT_URL
+    try:
+        with fake_tc_queue.FakeQueueServer(fleet, page_size=10) as server:
+            tc_client.set_root_url(server.root_url)
+            f = fitness.Fitness(provisioner=fleet.provisioner, task_cache=False)
+            f.args = argparse.Namespace(ping=False, sort_order="worker_id")
+            f.queue_counts[worker_type] = 1
+            f.history = fitness_history.HistoryWalker(f, limit=8)
+            _wt, results, _error = f.workertype_fitness_report(worker_type)
+    finally:
+        tc_client.set_root_url(root_url)
+
+    assert len(results) == 6
+    for result in results:
+        # recentTasks only has 3, the task group walk finds the rest
+        assert 3 < result["cmp"] + result["exc"] + result["rng"] <= 8
+    assert f.history.tasks == 6 * 12
+    assert f.api_calls[worker_type]["listTaskGroup"] == f.history.pages
+
+
+def push_report(fleet, worker_types, **kwargs):
+    root_url = tc_client.ROOT_URL
+    try:
+        with fake_tc_queue.FakeQueueServer(fleet, page_size=10) as server:
+            tc_client.set_root_url(server.root_url)
+            f = fitness.Fitness(provisioner=fleet.provisioner, task_cache=False)
+            f.args = argparse.Namespace(ping=False, sort_order="worker_id")
+            f.history = fitness_history.HistoryWalker(
+                f, now=fleet.now, projects=[fleet.project], **kwargs
+            )
+            results = {}
+            for worker_type in worker_types:
+                f.queue_counts[worker_type] = 1
+                _wt, rows, _error = f.workertype_fitness_report(worker_type)
+                for row in rows:
+                    results[row["worker_id"]] = row["cmp"] + row["exc"] + row["rng"]
+    finally:
+        tc_client.set_root_url(root_url)
+    return f, results
+
+
+# {worker_id: run start times}
+def fleet_runs(fleet):
+    runs = {}
+    for task in fleet.tasks.values():
+        for run in task["status"]["runs"]:
+            if "started" in run:
+                runs.setdefault(run["workerId"], []).append(run["started"])
+    return runs
+
+
+def push_fleet():
+    return fake_tc_queue.FakeFleet(
+        workers=6,
+        worker_types=2,
+        tasks_per_worker=12,
+        recent_task_limit=3,
+        push_minutes=60,
+        now=datetime.datetime(2020, 1, 2, 3, 0, tzinfo=datetime.timezone.utc),
+    )
+
+
+def test_history_walks_the_pushes_in_the_index():
+    fleet = push_fleet()
+    f, results = push_report(fleet, fleet.worker_types, limit=8)
+
+    runs = fleet_runs(fleet)
+    assert len(results) == 6
+    for worker_id, total in results.items():
+        assert total == min(8, len(runs[worker_id]))
+    assert f.history.incomplete == {}
+    assert f.history.format_coverage() == []
+    # the pushes are listed once, a day at a time
+    listings = sum(counts["listNamespaces"] for counts in f.api_calls.values())
+    assert listings == 1 + fitness_history.HISTORY_MAX_DAYS
+    # the second worker type reuses the walked groups
+    walks = sum(counts["listTaskGroup"] for counts in f.api_calls.values())
+    assert walks == f.history.pages
+    assert len(f.history.group_runs) <= len(fleet.pushes)
+
+
+def test_since_covers_the_window():
+    fleet = push_fleet()
+    f, results = push_report(fleet, fleet.worker_types, since_seconds=3 * 60 * 60)
+
+    since = fleet.now - datetime.timedelta(hours=3)
+    # every push in the window is walked. runs from the push before it are
+    # only found through recent tasks.
+    for worker_id, started in fleet_runs(fleet).items():
+        in_pushes = [
+            s
+            for s in started
+            if s >= fitness_history.tc_timestamp(since + datetime.timedelta(hours=1))
+        ]
+        in_window = [s for s in started if s >= fitness_history.tc_timestamp(since)]
+        assert len(in_pushes) <= results[worker_id] <= len(in_window)
+    assert f.history.incomplete == {}
+
+
+def test_history_limits_are_reported():
+    fleet = push_fleet()
+    worker_type = fleet.worker_types[0]
+    f, _results = push_report(fleet, [worker_type], since_seconds=86400, max_groups=2)
+    assert len(f.history.group_runs) == 2
+    assert f.history.incomplete[worker_type] == ["stopped at 2 task groups"]
+    lines = f.history.format_coverage()
+    assert lines[0].startswith("WARNING: %s: history is incomplete" % worker_type)
+
+    f, _results = push_report(fleet, [worker_type], since_seconds=86400, max_pages=3)
+    assert f.history.pages == 3
+    assert "only partly walked" in f.history.incomplete[worker_type][-1]
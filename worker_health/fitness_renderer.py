@@ -0,0 +1,106 @@
+import threading
+from time import time as timer
+
+from natsort import natsorted
+
+import phase_profiler
+
+# renders fitness.py's worker rows
+#
+# - live rows: printed as results are added. with --stream, results are added
+#   as each worker finishes (unsorted), otherwise a worker type at a time
+#   (sorted within the worker type).
+# - table: with --table, a final pass prints every row sorted across the
+#   whole report and padded to the longest worker type and worker id.
+# - tracks the time until the first row is printed (first_row_seconds)
+
+
+class FitnessRenderer:
+    def __init__(self, fitness, stream=False, table=False, start=None):
+        self.fitness = fitness
+        self.stream = stream
+        self.table = table
+        self.start = start or timer()
+        # rows are only held back when just the table is wanted
+        self.live = stream or not table
+        self.first_row_seconds = None
+        # (worker_type, result dict) in the order they were added
+        self.rows = []
+        self.worker_count = 0
+        self.working_count = 0
+        self.sr_total = 0
+        # results are added from the engines' threads
+        self.lock = threading.Lock()
+
+    def shown(self, result):
+        return not self.fitness.args.only_show_alerting or "alerts" in result
+
+    def print_row(self, line):
+        if self.first_row_seconds is None:
+            self.first_row_seconds = timer() - self.start
+        print(line, flush=self.stream)
+
+    # result: a fitness result dict, including worker_id
+    def add(self, worker_type, result):
+        with phase_profiler.phase("formatting"), self.lock:
+            self.rows.append((worker_type, result))
+            self.worker_count += 1
+            self.sr_total += result["sr"]
+            if result.get("state") and "working" in result.get("state"):
+                self.working_count += 1
+            if self.live and self.shown(result):
+                self.print_row(
+                    "%s.%s"
+                    % (
+                        worker_type,
+                        self.fitness.format_workertype_fitness_report_result(result),
+                    )
+                )
+
+    # callback for the engines, takes device_fitness_report tuples
+    def add_device_result(self, worker_type, device_result):
+        worker_id, result, _error = device_result
+        if result:
+            result["worker_id"] = worker_id
+            self.add(worker_type, result)
+
+    def sorted_rows(self):
+        if self.fitness.args.sort_order == "sr":
+            return natsorted(self.rows, key=lambda i: i[1]["sr"])
+        return natsorted(self.rows, key=lambda i: "%s.%s" % (i[0], i[1]["worker_id"]))
+
+    def print_table(self):
+        rows = [row for row in self.sorted_rows() if self.shown(row[1])]
+        if not rows:
+            return
+        names = [
+            "%s.%s" % (wt, self.fitness.format_worker_id(result["worker_id"]))
+            for wt, result in rows
+        ]
+        width = max(len(name) for name in names) + 2
+        if self.live:
+            print()
+        for name, (_wt, result) in zip(names, rows):
+            self.print_row(name.ljust(width) + self.fitness.sr_dict_format(result))
+
+    def finish(self):
+        if self.table:
+            with phase_profiler.phase("formatting"):
+                self.print_table()
+        # if to protect from divide by 0 (happens on request failures)
+        if self.worker_count:
+            # TODO: show alerting count
+            print(
+                "%s workers queried in %s seconds (%s working), average SR %s%%"
+                % (
+                    self.worker_count,
+                    round((timer() - self.start), 2),
+                    self.working_count,
+                    round((self.sr_total / self.worker_count * 100), 2),
+                )
+            )
+
+    def format_stats(self):
+        if self.first_row_seconds is None:
+            return "first row: none shown"
+        return "first row: %.2f seconds" % self.first_row_seconds
@@ -0,0 +1,78 @@
+import argparse
+
+import fitness
+import fitness_renderer
+
+
+def make_fitness(**kwargs):
+    f = fitness.Fitness(task_cache=False)
+    args = {
+        "sort_order": "worker_id",
+        "only_show_alerting": False,
+        "humanize_hashes": False,
+    }
+    args.update(kwargs)
+    f.args = argparse.Namespace(**args)
+    # set by get_workertype_worker_ids
+    f.worker_id_maxlen = 3
+    return f
+
+
+def result(worker_id, sr, alerts=None):
+    res = {"sr": sr, "suc": 1, "cmp": 1, "state": ["working"], "worker_id": worker_id}
+    if alerts:
+        res["alerts"] = alerts
+    return res
+
+
+def test_stream_shows_rows_as_added(capsys):
+    renderer = fitness_renderer.FitnessRenderer(make_fitness(), stream=True)
+    renderer.add_device_result("wt-b", ("w10", result("w10", 1.0), None))
+    assert "wt-b.w10" in capsys.readouterr().out
+    assert renderer.first_row_seconds is not None
+
+    renderer.add_device_result("wt-a", ("w2", result("w2", 0.5), None))
+    # errors don't have results
+    renderer.add_device_result("wt-a", ("w3", None, Exception("timeout")))
+    renderer.finish()
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith("wt-a.w2")
+    assert lines[1].startswith("2 workers queried in")
+    assert "(2 working), average SR 75.0%" in lines[1]
+
+
+def test_table_is_sorted_and_aligned(capsys):
+    renderer = fitness_renderer.FitnessRenderer(
+        make_fitness(only_show_alerting=True), table=True
+    )
+    renderer.add("wt-long", result("w10", 0.5, ["Low health"]))
+    renderer.add("wt", result("w9", 1.0))
+    renderer.add("wt-long", result("w2", 0.2, ["Low health"]))
+    # only the table is shown
+    assert capsys.readouterr().out == ""
+    assert renderer.first_row_seconds is None
+
+    renderer.finish()
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split()[0] for line in lines[:2]] == ["wt-long.w2", "wt-long.w10"]
+    assert lines[0].index("{") == lines[1].index("{") == len("wt-long.w10") + 2
+    assert lines[2].startswith("3 workers queried in")
+    assert renderer.first_row_seconds is not None
+
+
+def test_table_sorted_by_success_rate(capsys):
+    renderer = fitness_renderer.FitnessRenderer(
+        make_fitness(sort_order="sr"), stream=True, table=True
+    )
+    renderer.add("wt-a", result("w1", 0.9))
+    renderer.add("wt-b", result("w1", 0.1))
+    renderer.finish()
+    lines = capsys.readouterr().out.splitlines()
+    # streamed rows, a blank line, then the table
+    assert [line.split(" ")[0] for line in lines[:5]] == [
+        "wt-a.w1",
+        "wt-b.w1",
+        "",
+        "wt-b.w1",
+        "wt-a.w1",
+    ]
@@ -0,0 +1,78 @@
+import argparse
+
+import fake_tc_queue
+import fitness
+import tc_client
+import worker_group_index
+
+
+def test_worker_ids_and_quarantine_from_one_listworkers_pass():
+    fleet = fake_tc_queue.FakeFleet(workers=40, worker_types=1, quarantined_ratio=0.2)
+    worker_type = fleet.worker_types[0]
+    quarantined = {
+        worker_id
+        for worker_id, worker in fleet.workers[worker_type].items()
+        if "quarantineUntil" in worker
+    }
+    assert quarantined
+    # a lifted quarantine leaves quarantineUntil in the past
+    lifted = sorted(quarantined)[0]
+    fleet.quarantine(worker_type, lifted, "2000-01-01T00:00:00.000Z")
+    quarantined.remove(lifted)
+
+    root_url = tc_client.ROOT_URL
+    try:
+        with fake_tc_queue.FakeQueueServer(fleet, page_size=15) as server:
+            tc_client.set_root_url(server.root_url)
+            f = fitness.Fitness(provisioner=fleet.provisioner, task_cache=False)
+            worker_ids = f.get_workertype_worker_ids(worker_type)
+    finally:
+        tc_client.set_root_url(root_url)
+
+    assert sorted(w[2] for w in worker_ids) == sorted(fleet.workers[worker_type])
+    assert f.quarantine_data[worker_type] == quarantined
+    # 40 workers in pages of 15, no separate quarantined=true listing
+    assert server.requests == 3
+    assert f.api_calls[worker_type] == {"listWorkers": 3}
+    assert "%s: 3 (listWorkers 3)" % worker_type in f.format_api_calls()
+
+
+def test_host_mode_uses_the_worker_group_index(tmp_path):
+    fleet = fake_tc_queue.FakeFleet(workers=20, worker_types=1, worker_groups=3)
+    worker_type = fleet.worker_types[0]
+    worker_id = "fake-4"
+    index_path = str(tmp_path / "groups.sqlite3")
+
+    def host_report():
+        f = fitness.Fitness(provisioner=fleet.provisioner, task_cache=False)
+        f.args = argparse.Namespace(ping=False)
+        f.queue_counts[worker_type] = 1
+        f.worker_group_index = worker_group_index.WorkerGroupIndex(path=index_path)
+        result = f.host_fitness_report(worker_type, worker_id)
+        return f, result
+
+    root_url = tc_client.ROOT_URL
+    try:
+        with fake_tc_queue.FakeQueueServer(fleet, page_size=15) as server:
+            tc_client.set_root_url(server.root_url)
+            f, result = host_report()
+            assert result[0] == worker_id
+            assert f.api_calls[worker_type]["listWorkers"] == 2
+            assert f.api_calls[worker_type]["getWorker"] == 1
+
+            # indexed: one getWorker request
+            f, result = host_report()
+            assert result[0] == worker_id
+            assert f.api_calls[worker_type] == {"getWorker": 1, "status": 10}
+
+            # the worker moved groups, the stale entry is refreshed
+            fleet.workers[worker_type][worker_id]["workerGroup"] = "fake-group-new"
+            f, result = host_report()
+            assert result[0] == worker_id
+            assert f.api_calls[worker_type]["getWorker"] == 2
+            assert (
+                f.worker_group_index.get(fleet.provisioner, worker_type, worker_id)
+                == "fake-group-new"
+            )
+    finally:
+        tc_client.set_root_url(root_url)
@@ -0,0 +1,92 @@
+import types
+
+import tc_time
+
+# an immutable view of the fleet from one WorkerHealth.gather_data()
+#
+# - WorkerHealth.get_snapshot() keeps the latest one for snapshot_ttl seconds.
+#   the reports (show_report(), get_report(), influx_report(), etc) and the
+#   calculations read it instead of gathering the data again.
+# - worker_health_daemon.py shares one WorkerHealth (and so its snapshots)
+#   between the slack and influx jobs
+# - dicts are read-only mappings, lists are tuples
+# - the indexes worker_classifier.py uses are built once, with the snapshot
+
+SNAPSHOT_TTL_SECONDS = 600
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return types.MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+class FleetSnapshot:
+    DATA = (
+        # from devicepool
+        "devicepool_queues_and_workers",
+        "devicepool_project_to_tc_worker_type",
+        "devicepool_offline_workers",
+        # from tc
+        "tc_queue_counts",
+        "tc_current_worker_types",
+        "tc_workers",
+        "tc_current_worker_last_started",
+        "quarantined_workers",
+        # epoch seconds, when gathering started and ended (the tardy checks
+        # use 'now')
+        "started",
+        "now",
+    )
+    __slots__ = DATA + (
+        # indexes
+        "quarantined_set",
+        # the workers with a last started time
+        "known_workers",
+        # the workers listed without one
+        "new_workers",
+        # the last started times as epochs, ascending, and their workers
+        "started_epochs",
+        "started_workers",
+    )
+
+    def __init__(self, started, now, **data):
+        data["started"] = started
+        data["now"] = now
+        for name in self.DATA:
+            object.__setattr__(self, name, _freeze(data[name]))
+
+        last_started = self.tc_current_worker_last_started
+        by_epoch = sorted(
+            (tc_time.parse(timestamp), worker)
+            for worker, timestamp in last_started.items()
+            if timestamp is not None
+        )
+        indexes = {
+            "quarantined_set": frozenset(self.quarantined_workers),
+            "known_workers": frozenset(last_started),
+            "new_workers": frozenset(
+                worker
+                for worker, timestamp in last_started.items()
+                if timestamp is None
+            ),
+            "started_epochs": tuple(epoch for epoch, _worker in by_epoch),
+            "started_workers": tuple(worker for _epoch, worker in by_epoch),
+        }
+        for name, value in indexes.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("FleetSnapshot is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("FleetSnapshot is immutable")
+
+    # seconds since gathering started
+    def age(self, now=None):
+        return (now or tc_time.now()) - self.started
+
+    def is_fresh(self, ttl, now=None):
+        return self.age(now) < ttl
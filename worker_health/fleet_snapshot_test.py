@@ -0,0 +1,56 @@
+import pytest
+
+import fleet_snapshot
+
+
+def make_snapshot(started=1000.0):
+    return fleet_snapshot.FleetSnapshot(
+        started,
+        started + 5,
+        devicepool_queues_and_workers={"queue-a": ["w1", "w2"]},
+        devicepool_project_to_tc_worker_type={"project-a": "queue-a"},
+        devicepool_offline_workers={},
+        tc_queue_counts={"queue-a": 3},
+        tc_current_worker_types=["queue-a"],
+        tc_workers={"queue-a": ["w1"]},
+        tc_current_worker_last_started={"w1": "2020-01-01T00:00:00.000Z"},
+        quarantined_workers=["w2"],
+    )
+
+
+def test_snapshot_is_immutable():
+    snapshot = make_snapshot()
+    assert snapshot.devicepool_queues_and_workers["queue-a"] == ("w1", "w2")
+    assert snapshot.quarantined_workers == ("w2",)
+    with pytest.raises(AttributeError):
+        snapshot.now = 0
+    with pytest.raises(AttributeError):
+        del snapshot.tc_workers
+    with pytest.raises(TypeError):
+        snapshot.tc_queue_counts["queue-a"] = 0
+
+
+def test_snapshot_doesnt_follow_its_source():
+    workers = {"queue-a": ["w1"]}
+    snapshot = fleet_snapshot.FleetSnapshot(
+        0,
+        0,
+        devicepool_queues_and_workers={},
+        devicepool_project_to_tc_worker_type={},
+        devicepool_offline_workers={},
+        tc_queue_counts={},
+        tc_current_worker_types=[],
+        tc_workers=workers,
+        tc_current_worker_last_started={},
+        quarantined_workers=[],
+    )
+    workers["queue-a"].append("w2")
+    workers["queue-b"] = []
+    assert dict(snapshot.tc_workers) == {"queue-a": ("w1",)}
+
+
+def test_snapshot_age():
+    snapshot = make_snapshot(started=1000.0)
+    assert snapshot.age(now=1060.0) == 60.0
+    assert snapshot.is_fresh(600, now=1060.0)
+    assert not snapshot.is_fresh(600, now=1600.0)
@@ -2,6 +2,7 @@
 
 import argparse
 import quarantine
+import tc_client
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -9,5 +10,6 @@ if __name__ == "__main__":
 
     # TODO: add args
 
+    tc_client.install_taskcluster_transport()
     q = quarantine.Quarantine()
     q.main_get_quarantined()
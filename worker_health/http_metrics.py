@@ -0,0 +1,144 @@
+import threading
+
+# per-endpoint http metrics, recorded by the shared tc_client session
+#
+# endpoints are tc_client.endpoint_name() values (queue api method names).
+# latency is recorded into a fixed bucket histogram, so percentiles are
+# reported as the upper bound of the bucket they fall in.
+
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf")]
+INFLUX_MEASUREMENT = "worker_health_http"
+
+_lock = threading.Lock()
+_endpoints = {}
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.decode_failures = 0
+        self.bytes_received = 0
+        self.latency_total = 0.0
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+
+    def record(self, latency, bytes_received, retries, error):
+        self.calls += 1
+        self.bytes_received += bytes_received
+        self.retries += retries
+        self.latency_total += latency
+        if error:
+            self.errors += 1
+        for i, upper_bound in enumerate(LATENCY_BUCKETS):
+            if latency <= upper_bound:
+                self.latency_buckets[i] += 1
+                break
+
+    def latency_percentile(self, percentile):
+        if not self.calls:
+            return 0
+        target = self.calls * percentile / 100
+        seen = 0
+        for i, count in enumerate(self.latency_buckets):
+            seen += count
+            if seen >= target:
+                return LATENCY_BUCKETS[i]
+        return LATENCY_BUCKETS[-1]
+
+    def latency_mean(self):
+        if not self.calls:
+            return 0
+        return self.latency_total / self.calls
+
+
+def _get(endpoint):
+    # caller holds _lock
+    if endpoint not in _endpoints:
+        _endpoints[endpoint] = EndpointMetrics()
+    return _endpoints[endpoint]
+
+
+def record_request(endpoint, latency, bytes_received=0, retries=0, error=False):
+    with _lock:
+        _get(endpoint).record(latency, bytes_received, retries, error)
+
+
+def record_decode_failure(endpoint):
+    with _lock:
+        _get(endpoint).decode_failures += 1
+
+
+def reset():
+    with _lock:
+        _endpoints.clear()
+
+
+def snapshot():
+    with _lock:
+        return dict(_endpoints)
+
+
+def format_latency(seconds):
+    if seconds == float("inf"):
+        return ">%ss" % LATENCY_BUCKETS[-2]
+    return "%.2fs" % seconds
+
+
+def format_table():
+    endpoints = snapshot()
+    if not endpoints:
+        return "http: no requests made"
+    header = "%-16s %6s %7s %7s %7s %7s %10s %7s %6s %6s" % (
+        "endpoint",
+        "calls",
+        "mean",
+        "p50",
+        "p90",
+        "p99",
+        "KiB",
+        "retries",
+        "errors",
+        "decode",
+    )
+    lines = [header]
+    for endpoint in sorted(endpoints):
+        m = endpoints[endpoint]
+        lines.append(
+            "%-16s %6s %7s %7s %7s %7s %10.1f %7s %6s %6s"
+            % (
+                endpoint,
+                m.calls,
+                format_latency(m.latency_mean()),
+                format_latency(m.latency_percentile(50)),
+                format_latency(m.latency_percentile(90)),
+                format_latency(m.latency_percentile(99)),
+                m.bytes_received / 1024,
+                m.retries,
+                m.errors,
+                m.decode_failures,
+            )
+        )
+    return "\n".join(lines)
+
+
+def gen_influx_lines(source):
+    lines = []
+    for endpoint, m in sorted(snapshot().items()):
+        lines.append(
+            "%s,source=%s,endpoint=%s calls=%s,errors=%s,retries=%s,decode_failures=%s,bytes=%s,latency_mean=%s,latency_p90=%s"
+            % (
+                INFLUX_MEASUREMENT,
+                source,
+                endpoint,
+                m.calls,
+                m.errors,
+                m.retries,
+                m.decode_failures,
+                m.bytes_received,
+                round(m.latency_mean(), 4),
+                # inf isn't valid line protocol
+                min(m.latency_percentile(90), LATENCY_BUCKETS[-2]),
+            )
+        )
+    return lines
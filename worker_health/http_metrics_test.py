@@ -0,0 +1,42 @@
+import pytest
+
+import http_metrics
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    http_metrics.reset()
+    yield
+    http_metrics.reset()
+
+
+def test_record_request():
+    for latency in [0.01, 0.02, 0.03, 0.2, 3]:
+        http_metrics.record_request("status", latency, bytes_received=100)
+    http_metrics.record_request("status", 0.04, retries=2, error=True)
+    http_metrics.record_decode_failure("status")
+
+    m = http_metrics.snapshot()["status"]
+    assert m.calls == 6
+    assert m.errors == 1
+    assert m.retries == 2
+    assert m.decode_failures == 1
+    assert m.bytes_received == 500
+    assert m.latency_percentile(50) == 0.05
+    assert m.latency_percentile(90) == 5
+    assert round(m.latency_mean(), 2) == 0.55
+
+
+def test_format_table():
+    assert http_metrics.format_table() == "http: no requests made"
+    http_metrics.record_request("listWorkers", 0.3)
+    table = http_metrics.format_table().splitlines()
+    assert table[0].startswith("endpoint")
+    assert table[1].startswith("listWorkers")
+
+
+def test_gen_influx_lines():
+    http_metrics.record_request("pendingTasks", 20, bytes_received=10)
+    assert http_metrics.gen_influx_lines("test") == [
+        "worker_health_http,source=test,endpoint=pendingTasks calls=1,errors=0,retries=0,decode_failures=0,bytes=10,latency_mean=20.0,latency_p90=10"
+    ]
@@ -3,10 +3,16 @@
 import argparse
 import os
 import pprint
+import queue
 import sys
+import threading
 import time
 
 from worker_health import WorkerHealth, logger
+import cassette
+import http_metrics
+import phase_profiler
+import tc_client
 import utils
 
 try:
@@ -17,10 +23,32 @@ except ImportError:
     print("Missing dependencies. Please run `pipenv install; pipenv shell` and retry!")
     sys.exit(1)
 
+# journal lines waiting for the writer thread, newer ones are dropped
+JOURNAL_QUEUE_SIZE = 1000
+
 
 class InfluxLogger:
-    def __init__(self, log_level, time_limit, testing_mode):
+    def __init__(
+        self,
+        log_level,
+        time_limit,
+        testing_mode,
+        recording=None,
+        profiler=None,
+        worker_health=None,
+    ):
         self.time_limit = time_limit
+        # a WorkerHealth shared with other jobs (worker_health_daemon.py), its
+        # fleet snapshot is reused while fresh. otherwise each cycle gathers.
+        self.worker_health = worker_health
+        # a cassette.Cassette for --record/--replay
+        self.recording = recording
+        # a phase_profiler.Profiler for --profile, each cycle is profiled
+        self.profiler = profiler
+        # lines for the journal writer thread (started on first use), so
+        # influx writes don't hold up the journal follower
+        self.journal_queue = queue.Queue(JOURNAL_QUEUE_SIZE)
+        self.journal_writer = None
         self.logging_enabled = False
         self.testing_mode = testing_mode
         self.log_level = log_level
@@ -91,40 +119,93 @@ verify_ssl = false
 
     # writes lists of strings to influx in line format
     def write_multiline_influx_data(self, wh_instance):
-        if self.logging_enabled:
-            self.influx_client.write(
-                wh_instance.influx_log_lines_to_send,
-                {"db": self.influx_db},
-                204,
-                "line",
-            )
+        self.write_influx_lines(wh_instance.influx_log_lines_to_send)
+        # zero out lines to send
+        wh_instance.influx_log_lines_to_send = []
+
+    def write_influx_lines(self, lines):
+        if self.recording and self.recording.replaying:
             logger.info(
-                "wrote %s line(s) to influx" % len(wh_instance.influx_log_lines_to_send)
+                "replay mode: would have written: \n%s" % self.pp.pformat(lines)
             )
+        elif self.logging_enabled:
+            self.influx_client.write(lines, {"db": self.influx_db}, 204, "line")
+            logger.info("wrote %s line(s) to influx" % len(lines))
             if self.log_level:
-                logger.info(
-                    "lines written: \n%s"
-                    % self.pp.pformat(wh_instance.influx_log_lines_to_send)
-                )
+                logger.info("lines written: \n%s" % self.pp.pformat(lines))
         else:
-            logger.info(
-                "test mode: would have written: \n%s"
-                % self.pp.pformat(wh_instance.influx_log_lines_to_send)
+            logger.info("test mode: would have written: \n%s" % self.pp.pformat(lines))
+
+    # subscriber for a journal_reader.JournalFollower (worker_health_daemon.py
+    # --follow-journal), writes devicepool's changes as they happen
+    def on_journal_event(self, event):
+        if event.kind == "offline":
+            line = "bitbar_devicepool,project=%s offline=%s" % (
+                event.project,
+                len(event.hosts),
             )
-        # zero out lines to send
-        wh_instance.influx_log_lines_to_send = []
+        else:
+            line = "bitbar_test_runs,event=%s count=1" % event.kind
+        # influx wants nanoseconds
+        line = "%s %s" % (line, int(event.timestamp * 1e9))
+        if not self.journal_writer:
+            self.journal_writer = threading.Thread(
+                target=self.write_journal_lines, daemon=True
+            )
+            self.journal_writer.start()
+        try:
+            self.journal_queue.put_nowait(line)
+        except queue.Full:
+            logger.warning("influx line queue full, dropping: '%s'" % line)
+
+    # the journal writer thread, lines queued while a write is in flight are
+    # written together
+    def write_journal_lines(self):
+        while True:
+            lines = [self.journal_queue.get()]
+            while True:
+                try:
+                    lines.append(self.journal_queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.write_influx_lines(lines)
+            except Exception:
+                logger.exception("writing journal lines to influx failed")
 
     # logs both problem and configured data
     def do_worker_influx_logging(self):
         logger.info("gathering data and generating influx log lines...")
-        wh = WorkerHealth(self.log_level)
+        tc_client.reset_stats()
+        http_metrics.reset()
+        if self.profiler:
+            self.profiler.start()
+        wh = self.worker_health
+        if not wh:
+            # cached statuses would be missing from recordings
+            wh = WorkerHealth(self.log_level, task_cache=not self.recording)
         pw = wh.influx_report(time_limit=self.time_limit, verbosity=self.log_level)
+        if self.profiler:
+            self.profiler.stop()
+            logger.info("profile: \n%s" % self.profiler.format_table())
+            wh.influx_log_lines_to_send.extend(
+                self.profiler.gen_influx_lines(source="influx_logger")
+            )
 
         if self.log_level:
             print("problem workers (includes quarantined): \n%s" % self.pp.pformat(pw))
 
+        logger.info("generating influx log lines for http metrics...")
+        logger.info("http metrics: \n%s" % http_metrics.format_table())
+        wh.influx_log_lines_to_send.extend(
+            http_metrics.gen_influx_lines(source="influx_logger")
+        )
+
         logger.info("writing log lines to influx...")
         self.write_multiline_influx_data(wh)
+        logger.info(tc_client.format_stats())
+        if self.recording and not self.recording.replaying:
+            self.recording.save()
 
     def main(self):
         if self.logging_enabled:
@@ -196,8 +277,22 @@ if __name__ == "__main__":
         default=False,
         help="enable testing mode (special schedule).",
     )
+    cassette.add_arguments(parser)
+    tc_client.add_arguments(parser)
+    phase_profiler.add_arguments(parser)
     args = parser.parse_args()
 
+    recording = cassette.from_args(args)
+    tc_client.use_cassette(recording)
+    tc_client.from_args(args)
+    profiler = phase_profiler.from_args(args)
+
     # TODO: just pass args?
-    sa = InfluxLogger(args.log_level, args.time_limit, args.testing_mode)
-    sa.main()
+    sa = InfluxLogger(
+        args.log_level, args.time_limit, args.testing_mode, recording, profiler
+    )
+    if args.replay:
+        # one cycle over the recorded responses, nothing is written to influx
+        sa.do_worker_influx_logging()
+    else:
+        sa.main()
@@ -0,0 +1,61 @@
+import threading
+import time
+
+import pytest
+
+import influx_logger
+import journal_reader
+
+
+class BlockingInfluxLogger(influx_logger.InfluxLogger):
+    # records lines instead of writing them, writes block until released
+    def __init__(self):
+        super().__init__(0, 95, False)
+        self.written = []
+        self.release = threading.Event()
+
+    def write_influx_lines(self, lines):
+        self.release.wait()
+        self.written.append(lines)
+
+
+@pytest.fixture
+def influx(tmp_path, monkeypatch):
+    # the config file is written to ~
+    monkeypatch.setenv("HOME", str(tmp_path))
+    return BlockingInfluxLogger()
+
+
+def started(test_run):
+    return journal_reader.JournalEvent("started", 1000, test_run=test_run)
+
+
+def test_journal_events_dont_wait_for_influx(influx):
+    start = time.time()
+    for i in range(3):
+        influx.on_journal_event(started(i))
+    assert time.time() - start < 1
+    assert influx.written == []
+
+    influx.release.set()
+    deadline = time.time() + 5
+    while sum(len(lines) for lines in influx.written) < 3:
+        assert time.time() < deadline
+        time.sleep(0.01)
+    assert influx.written[0][0] == "bitbar_test_runs,event=started count=1 %s" % (
+        1000 * 10**9
+    )
+
+
+def test_full_queue_drops_events(influx, monkeypatch, caplog):
+    monkeypatch.setattr(influx, "journal_queue", influx_logger.queue.Queue(1))
+    # the writer takes the first line and blocks, the second fills the queue
+    influx.on_journal_event(started(1))
+    deadline = time.time() + 5
+    while not influx.journal_queue.empty():
+        assert time.time() < deadline
+        time.sleep(0.01)
+    influx.on_journal_event(started(2))
+    influx.on_journal_event(started(3))
+    assert "influx line queue full" in caplog.text
+    influx.release.set()
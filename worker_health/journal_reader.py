@@ -0,0 +1,248 @@
+import csv
+import json
+import logging
+import re
+import subprocess
+import tempfile
+import threading
+
+# incremental reader for the devicepool (bitbar service) journal
+#
+# - the first read covers the last window_minutes, later reads only return
+#   the entries after the last one seen (journalctl --after-cursor), so an
+#   unchanged journal costs one empty journalctl run
+# - journalctl's json output is streamed and parsed an entry at a time,
+#   nothing but the cursor is kept between reads
+# - OfflineWorkers keeps the offline hosts of each devicepool project from
+#   its newest 'OFFLINE' line
+# - JournalFollower tails the journal (journalctl --follow) in a thread and
+#   publishes JournalEvents to its subscribers as the lines arrive
+
+UNIT = "bitbar"
+WINDOW_MINUTES = 5
+# e.g. 'gecko-t-bitbar-gw-perf-p2 WARNING pixel2-perf DISABLED 0 OFFLINE 2 pixel2-21, pixel2-22'
+# (the text after the 'bitbar[pid]: ' prefix of journalctl's default output)
+OFFLINE_PATTERN = re.compile(r"(.*) WARNING (.*) DISABLED (\d+) OFFLINE (\d+) (.*)")
+TEST_RUN_PATTERN = re.compile(r"test run (\d+) (started|finished)")
+# how long JournalFollower waits before restarting journalctl if it exits
+FOLLOW_RESTART_SECONDS = 5
+
+logger = logging.getLogger(__name__)
+
+
+def csv_string_to_list(csv_string):
+    return list(csv.reader([csv_string], skipinitialspace=True))[0]
+
+
+class JournalReader:
+    def __init__(self, unit=UNIT, window_minutes=WINDOW_MINUTES):
+        self.unit = unit
+        self.window_minutes = window_minutes
+        # the last entry read, journalctl's opaque position
+        self.cursor = None
+        self.entries_read = 0
+        self.process = None
+        # set by stop(), journalctl's exit status isn't an error then
+        self.stopped = False
+
+    def command(self, follow=False):
+        cmd = [
+            "journalctl",
+            "-u",
+            self.unit,
+            "--no-pager",
+            "-o",
+            "json",
+            # __CURSOR and __REALTIME_TIMESTAMP are always included
+            "--output-fields=MESSAGE",
+        ]
+        if follow:
+            cmd.append("--follow")
+        if self.cursor:
+            cmd.extend(["--after-cursor", self.cursor])
+        else:
+            cmd.extend(["--since", "%s minutes ago" % self.window_minutes])
+        return cmd
+
+    def open(self, cmd, stderr):
+        # NOTE: user running needs to be in adm group to not need sudo
+        return subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr)
+
+    # yields (epoch seconds, message) for each entry since the last read. with
+    # follow, keeps yielding new entries as they arrive (until stop()).
+    def read(self, follow=False):
+        cmd = self.command(follow)
+        # a file, not a pipe: nothing reads journalctl's errors until it exits
+        stderr = tempfile.TemporaryFile()
+        process = self.open(cmd, stderr)
+        self.process = process
+        try:
+            for line in process.stdout:
+                try:
+                    entry = json.loads(line)
+                    cursor = entry["__CURSOR"]
+                    timestamp = int(entry["__REALTIME_TIMESTAMP"]) / 1000000
+                except (ValueError, KeyError, TypeError) as e:
+                    # the cursor stays at the last good entry
+                    logger.warning(
+                        "skipping unreadable journal entry (%r): %r" % (e, line)
+                    )
+                    continue
+                self.cursor = cursor
+                self.entries_read += 1
+                message = entry.get("MESSAGE")
+                if message is None:
+                    continue
+                if isinstance(message, list):
+                    # messages that aren't valid utf-8 are arrays of bytes
+                    message = bytes(message).decode("utf-8", "replace")
+                yield timestamp, message
+        finally:
+            process.stdout.close()
+            returncode = process.wait()
+            stderr.seek(0)
+            errors = stderr.read().decode("utf-8", "replace").strip()
+            stderr.close()
+        if returncode and not self.stopped:
+            raise subprocess.CalledProcessError(returncode, cmd, stderr=errors)
+
+    # ends a read(follow=True) from another thread
+    def stop(self):
+        self.stopped = True
+        process = self.process
+        if process and process.poll() is None:
+            process.terminate()
+
+
+class OfflineWorkers:
+    def __init__(self, window_minutes=WINDOW_MINUTES):
+        self.window_seconds = window_minutes * 60
+        # {devicepool project: (epoch seconds, offline hosts csv)}
+        self.projects = {}
+        # JournalFollower adds from its thread
+        self.lock = threading.Lock()
+
+    # returns the line's project if its offline hosts changed
+    def add(self, timestamp, message):
+        # cheaper than the regex for the lines that can't match
+        if " OFFLINE " not in message:
+            return None
+        m = OFFLINE_PATTERN.match(message)
+        if not m:
+            return None
+        project = m.group(1).strip()
+        hosts = m.group(5)
+        with self.lock:
+            previous = self.projects.get(project)
+            self.projects[project] = (timestamp, hosts)
+        if previous and previous[1] == hosts:
+            return None
+        return project
+
+    def hosts(self, project):
+        with self.lock:
+            return csv_string_to_list(self.projects[project][1])
+
+    # returns {devicepool project: offline hosts csv} for the projects with a
+    # line in the window, oldest line first
+    def get(self, now):
+        since = now - self.window_seconds
+        with self.lock:
+            current = sorted(
+                (timestamp, project, hosts)
+                for project, (timestamp, hosts) in self.projects.items()
+                if timestamp >= since
+            )
+        return {project: hosts for _timestamp, project, hosts in current}
+
+
+class JournalEvent:
+    # kind is 'offline' (a project's offline hosts changed, see hosts) or
+    # 'started'/'finished' (see test_run)
+    def __init__(self, kind, timestamp, project=None, hosts=None, test_run=None):
+        self.kind = kind
+        self.timestamp = timestamp
+        self.project = project
+        self.hosts = hosts
+        self.test_run = test_run
+
+    def __repr__(self):
+        return "JournalEvent(%s, %s, project=%s, hosts=%s, test_run=%s)" % (
+            self.kind,
+            self.timestamp,
+            self.project,
+            self.hosts,
+            self.test_run,
+        )
+
+
+class JournalFollower:
+    def __init__(self, reader=None, offline_workers=None):
+        self.reader = reader or JournalReader()
+        # kept up to date as the lines arrive (WorkerHealth reads it)
+        self.offline_workers = offline_workers or OfflineWorkers()
+        # callables taking a JournalEvent, called from the follower's thread
+        self.subscribers = []
+        self.events_published = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def start(self):
+        self.stop_event.clear()
+        self.reader.stopped = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.reader.stop()
+        self.thread.join()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                for timestamp, message in self.reader.read(follow=True):
+                    self.handle(timestamp, message)
+            except subprocess.CalledProcessError as e:
+                logger.warning(
+                    "journalctl exited with %s (%s), restarting in %ss"
+                    % (e.returncode, e.stderr, FOLLOW_RESTART_SECONDS)
+                )
+            except Exception:
+                # e.g. journalctl couldn't be started. the thread has to
+                # survive, WorkerHealth stops reading the journal itself while
+                # it's alive.
+                logger.exception(
+                    "following the journal failed, restarting in %ss"
+                    % FOLLOW_RESTART_SECONDS
+                )
+            # the cursor is kept, nothing is missed
+            if self.stop_event.wait(FOLLOW_RESTART_SECONDS):
+                break
+
+    def handle(self, timestamp, message):
+        project = self.offline_workers.add(timestamp, message)
+        if project:
+            self.publish(
+                JournalEvent(
+                    "offline",
+                    timestamp,
+                    project=project,
+                    hosts=self.offline_workers.hosts(project),
+                )
+            )
+        m = TEST_RUN_PATTERN.search(message)
+        if m:
+            self.publish(JournalEvent(m.group(2), timestamp, test_run=m.group(1)))
+
+    def publish(self, event):
+        self.events_published += 1
+        for callback in self.subscribers:
+            try:
+                callback(event)
+            except Exception:
+                # one failing subscriber shouldn't stop the others (or the follower)
+                logger.exception("journal subscriber %s failed" % callback)
@@ -0,0 +1,179 @@
+import json
+import os
+import queue
+import subprocess
+import time
+
+import pytest
+
+import journal_reader
+
+
+def entry(cursor, timestamp, message):
+    return {
+        "__CURSOR": cursor,
+        "__REALTIME_TIMESTAMP": str(int(timestamp * 1000000)),
+        "MESSAGE": message,
+    }
+
+
+class FakeJournal(journal_reader.JournalReader):
+    # serves the entries after the cursor with cat, like journalctl would
+    def __init__(self, tmp_path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = tmp_path / "journal.json"
+        self.entries = []
+        self.commands = []
+
+    def open(self, cmd, stderr):
+        self.commands.append(cmd)
+        cursors = [e["__CURSOR"] for e in self.entries]
+        start = 0
+        if "--after-cursor" in cmd:
+            start = cursors.index(cmd[cmd.index("--after-cursor") + 1]) + 1
+        with open(self.path, "w") as f:
+            for e in self.entries[start:]:
+                f.write(json.dumps(e) + "\n")
+        return subprocess.Popen(["cat", str(self.path)], stdout=subprocess.PIPE)
+
+
+def test_reads_only_new_entries(tmp_path):
+    journal = FakeJournal(tmp_path)
+    journal.entries = [entry("c1", 100, "one"), entry("c2", 101, [104, 105])]
+    assert list(journal.read()) == [(100, "one"), (101, "hi")]
+    assert "--since" in journal.commands[0]
+    assert journal.cursor == "c2"
+
+    assert list(journal.read()) == []
+    journal.entries.append(entry("c3", 102, "three"))
+    assert list(journal.read()) == [(102, "three")]
+    assert journal.commands[-1][-2:] == ["--after-cursor", "c2"]
+    assert journal.entries_read == 3
+
+
+def test_unreadable_entries_are_skipped(tmp_path):
+    path = tmp_path / "journal.json"
+    lines = [
+        json.dumps(entry("c1", 100, "one")),
+        "{truncated",
+        json.dumps({"__REALTIME_TIMESTAMP": "101000000"}),
+        json.dumps(entry("c4", 102, "four")),
+    ]
+    path.write_text("\n".join(lines) + "\n")
+    journal = journal_reader.JournalReader()
+    journal.open = lambda cmd, stderr: subprocess.Popen(
+        ["cat", str(path)], stdout=subprocess.PIPE
+    )
+    assert list(journal.read()) == [(100, "one"), (102, "four")]
+    assert journal.cursor == "c4"
+
+
+def test_failed_journalctl_raises():
+    journal = journal_reader.JournalReader()
+    journal.open = lambda cmd, stderr: subprocess.Popen(
+        ["sh", "-c", "echo 'No journal files were found.' >&2; exit 1"],
+        stdout=subprocess.PIPE,
+        stderr=stderr,
+    )
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        list(journal.read())
+    # in the follower's warning
+    assert e.value.stderr == "No journal files were found."
+
+
+def test_offline_workers_keeps_newest_line_in_window():
+    offline = journal_reader.OfflineWorkers(window_minutes=5)
+    line = "%s WARNING pool DISABLED 0 OFFLINE %s %s"
+    offline.add(100, line % ("project-a", 2, "a-1, a-2"))
+    offline.add(200, "project-a INFO something else")
+    offline.add(250, line % ("project-b", 1, "b-1"))
+    offline.add(300, line % ("project-a", 1, "a-3"))
+    assert offline.get(now=310) == {"project-b": "b-1", "project-a": "a-3"}
+    # project-b's only line is older than 5 minutes
+    assert offline.get(now=560) == {"project-a": "a-3"}
+    assert offline.get(now=1000) == {}
+
+
+class FifoJournal(journal_reader.JournalReader):
+    # a live journal: cat follows the fifo the test writes entries to
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.commands = []
+
+    def open(self, cmd, stderr):
+        self.commands.append(cmd)
+        return subprocess.Popen(["cat", self.path], stdout=subprocess.PIPE)
+
+
+def test_follower_publishes_as_lines_arrive(tmp_path):
+    fifo = str(tmp_path / "journal.fifo")
+    os.mkfifo(fifo)
+    reader = FifoJournal(fifo)
+    follower = journal_reader.JournalFollower(reader)
+    events = queue.Queue()
+    follower.subscribe(lambda event: events.put((time.time(), event)))
+    follower.subscribe(lambda event: 1 / 0)
+    follower.start()
+    offline_line = "project-a WARNING pool DISABLED 0 OFFLINE %s %s"
+    with open(fifo, "w") as f:
+        for i, message in enumerate(
+            [
+                offline_line % (2, "a-1, a-2"),
+                "started test run 7 started",
+                # unchanged hosts aren't an event
+                offline_line % (2, "a-1, a-2"),
+                offline_line % (1, "a-2"),
+            ]
+        ):
+            written = time.time()
+            f.write(json.dumps(entry("c%s" % i, written, message)) + "\n")
+            f.flush()
+            if i == 2:
+                continue
+            received, event = events.get(timeout=5)
+            assert received - written < 1
+            if i == 0:
+                assert (event.kind, event.project, event.hosts) == (
+                    "offline",
+                    "project-a",
+                    ["a-1", "a-2"],
+                )
+            elif i == 1:
+                assert (event.kind, event.test_run) == ("started", "7")
+            else:
+                assert event.hosts == ["a-2"]
+        follower.stop()
+    assert events.empty()
+    assert follower.events_published == 3
+    assert reader.cursor == "c3"
+    assert "--follow" in reader.commands[0]
+    assert follower.offline_workers.get(now=time.time()) == {"project-a": "a-2"}
+
+
+class BrokenJournal(journal_reader.JournalReader):
+    # journalctl can't be started, then serves one entry
+    def __init__(self, tmp_path):
+        super().__init__()
+        self.path = tmp_path / "journal.json"
+        self.path.write_text(json.dumps(entry("c1", time.time(), "one")) + "\n")
+        self.opens = 0
+
+    def open(self, cmd, stderr):
+        self.opens += 1
+        if self.opens == 1:
+            raise OSError("journalctl not found")
+        return subprocess.Popen(["cat", str(self.path)], stdout=subprocess.PIPE)
+
+
+def test_follower_survives_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal_reader, "FOLLOW_RESTART_SECONDS", 0.01)
+    reader = BrokenJournal(tmp_path)
+    follower = journal_reader.JournalFollower(reader)
+    follower.start()
+    deadline = time.time() + 5
+    while reader.cursor is None and time.time() < deadline:
+        time.sleep(0.01)
+    assert follower.thread.is_alive()
+    assert reader.cursor == "c1"
+    follower.stop()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import random
+import string
+import timeit
+import tracemalloc
+
+import fast_json
+
+# measures decode time and peak memory for the json backends on large
+# responses. uses recorded payloads if given, otherwise generates a
+# treeherder jobs list page (2000 rows) and a listWorkers page (50 workers).
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def random_string(length):
+    return "".join(random.choice(string.ascii_letters) for _i in range(length))
+
+
+def treeherder_list_page(rows=2000):
+    # return_type=list pages have a row of 31 values per job
+    property_names = ["field_%s" % i for i in range(31)]
+    results = []
+    for i in range(rows):
+        row = []
+        for j in range(31):
+            if j % 3 == 0:
+                row.append(random.randint(0, 10**9))
+            elif j % 3 == 1:
+                row.append(random_string(random.randint(5, 40)))
+            else:
+                row.append(None if j % 2 else "pending")
+        results.append(row)
+    return {"results": results, "job_property_names": property_names, "meta": {}}
+
+
+def list_workers_page(workers=50):
+    page = {"workers": []}
+    for i in range(workers):
+        page["workers"].append(
+            {
+                "workerGroup": "bitbar",
+                "workerId": "pixel2-%s" % i,
+                "firstClaim": "2021-01-01T00:00:00.000Z",
+                "latestTask": {"taskId": random_string(22), "runId": 0},
+                "quarantineUntil": "2021-02-01T00:00:00.000Z",
+                "recentTasks": [
+                    {"taskId": random_string(22), "runId": 0} for _j in range(20)
+                ],
+            }
+        )
+    return page
+
+
+def decoders():
+    result = {
+        "json (text)": lambda data: json.loads(data.decode("utf-8")),
+        "json (bytes)": json.loads,
+    }
+    if orjson:
+        result["orjson (bytes)"] = orjson.loads
+    return result
+
+
+def measure(decoder, data, number):
+    seconds = min(timeit.repeat(lambda: decoder(data), number=number, repeat=3))
+    tracemalloc.start()
+    decoder(data)
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds / number, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="compare json decode time and peak memory on large responses."
+    )
+    parser.add_argument(
+        "-n",
+        "--number",
+        default=20,
+        type=int,
+        help="decodes per timing round (default is 20).",
+    )
+    parser.add_argument(
+        "payloads",
+        metavar="payload.json",
+        nargs="*",
+        help="recorded response bodies to decode (default is generated payloads).",
+    )
+    args = parser.parse_args()
+
+    random.seed(0)
+    payloads = {}
+    for path in args.payloads:
+        with open(path, "rb") as f:
+            payloads[path] = f.read()
+    if not payloads:
+        payloads["treeherder jobs list (2000 rows)"] = json.dumps(
+            treeherder_list_page()
+        ).encode()
+        payloads["listWorkers (50 workers)"] = json.dumps(list_workers_page()).encode()
+
+    print("fast_json backend: %s" % fast_json.BACKEND)
+    if not orjson:
+        print("orjson not installed, only measuring the stdlib (pip install orjson)")
+    for name, data in payloads.items():
+        print("%s, %.1f KiB" % (name, len(data) / 1024))
+        for decoder_name, decoder in decoders().items():
+            seconds, peak = measure(decoder, data, args.number)
+            print(
+                "  %-16s %8.2f ms  peak %8.1f KiB"
+                % (decoder_name, seconds * 1000, peak / 1024)
+            )
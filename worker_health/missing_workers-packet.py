@@ -4,6 +4,7 @@ import argparse
 
 import fitness
 import quarantine
+import tc_client
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -12,6 +13,7 @@ if __name__ == "__main__":
     PROVISIONER = "terraform-packet"
     WORKER_TYPE = "gecko-t-linux"
 
+    tc_client.install_taskcluster_transport()
     f = fitness.Fitness(log_level=0, provisioner=PROVISIONER, alert_percent=85)
     q = quarantine.Quarantine()
 
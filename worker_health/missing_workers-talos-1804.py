@@ -5,6 +5,7 @@ import sys
 
 import fitness
 import quarantine
+import tc_client
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -16,6 +17,7 @@ if __name__ == "__main__":
     print("not implemented yet")
     sys.exit(0)
 
+    tc_client.install_taskcluster_transport()
     f = fitness.Fitness(log_level=0, provisioner=PROVISIONER, alert_percent=85)
     q = quarantine.Quarantine()
 
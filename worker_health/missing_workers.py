@@ -2,6 +2,11 @@
 
 import argparse
 
+import cassette
+import http_metrics
+import phase_profiler
+import task_status_cache
+import tc_client
 import worker_health
 
 
@@ -40,17 +45,43 @@ def main():
         default=95,
         help="for tc, devices are missing if not reporting for longer than this many minutes. defaults to 95.",
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        default=False,
+        help="don't use the on-disk task status cache (%s)."
+        % task_status_cache.CACHE_PATH,
+    )
+    cassette.add_arguments(parser)
+    tc_client.add_arguments(parser)
+    phase_profiler.add_arguments(parser)
     args = parser.parse_args()
-    wh = worker_health.WorkerHealth(args.log_level)
+    # cached statuses would be missing from recordings
+    recording = cassette.from_args(args)
+    tc_client.use_cassette(recording)
+    tc_client.from_args(args)
+    profiler = phase_profiler.from_args(args)
+    wh = worker_health.WorkerHealth(
+        args.log_level, task_cache=not (args.no_cache or recording)
+    )
 
     # TESTING
     # output = wh.get_jsonc("https://queue.taskcluster.net/v1/provisioners/proj-autophone/worker-types/gecko-t-ap-unit-p2/workers?limit=50")
     # wh.pp.pprint(output)
     # sys.exit(0)
 
+    if profiler:
+        profiler.start()
     wh.show_report(
         show_all=args.all, time_limit=args.time_limit, verbosity=args.log_level
     )
+    if profiler:
+        profiler.stop()
+        print(profiler.format_table())
+    if args.log_level:
+        print(http_metrics.format_table())
+        print(tc_client.format_stats())
+        print(wh.task_status_cache.format_stats())
 
 
 if __name__ == "__main__":
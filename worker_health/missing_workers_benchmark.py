@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime
+import random
+import timeit
+
+import fleet_snapshot
+import tc_time
+import worker_classifier
+
+# compares the per-worker loop calculate_missing_workers_from_tc() used to
+# run with worker_classifier.py, on synthetic fleets (no network)
+#
+# each fleet has WORKERS_PER_QUEUE workers per queue, some quarantined,
+# missing (no last started time), new (listed, nothing started) and tardy.
+# "snapshot" is the one-off cost of building the snapshot and its indexes
+# (when it's gathered). the engines are timed with both exclude_quarantined
+# settings.
+
+WORKERS_PER_QUEUE = 50
+LIMIT = 95
+
+
+def tc_timestamp(epoch):
+    dt = datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc)
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.") + "%03dZ" % (dt.microsecond // 1000)
+
+
+def fleet_data(workers, workers_per_queue=WORKERS_PER_QUEUE, seed=0):
+    rng = random.Random(seed)
+    now = tc_time.now()
+    queues = {}
+    queue_counts = {}
+    last_started = {}
+    quarantined = []
+    for i in range(workers):
+        queue = "gecko-t-fake-%s" % (i // workers_per_queue)
+        worker = "fake-%s" % i
+        queues.setdefault(queue, []).append(worker)
+        roll = rng.random()
+        if roll < 0.05:
+            # missing
+            pass
+        elif roll < 0.07:
+            last_started[worker] = None
+        else:
+            # about a third of these are tardy
+            last_started[worker] = tc_timestamp(now - rng.uniform(0, 150 * 60))
+        if rng.random() < 0.05:
+            quarantined.append(worker)
+    for queue, queue_workers in queues.items():
+        # some queues are empty or have fewer jobs than workers
+        queue_counts[queue] = rng.choice([0, len(queue_workers) // 2] + [500] * 4)
+    return {
+        "devicepool_queues_and_workers": queues,
+        "devicepool_project_to_tc_worker_type": {},
+        "devicepool_offline_workers": {},
+        "tc_queue_counts": queue_counts,
+        "tc_current_worker_types": list(queues),
+        "tc_workers": {},
+        "tc_current_worker_last_started": last_started,
+        "quarantined_workers": quarantined,
+    }
+
+
+def make_snapshot(workers, workers_per_queue=WORKERS_PER_QUEUE, seed=0):
+    now = tc_time.now()
+    return fleet_snapshot.FleetSnapshot(
+        now, now, **fleet_data(workers, workers_per_queue, seed)
+    )
+
+
+# calculate_missing_workers_from_tc() before worker_classifier.py
+def loop_calculate(snapshot, limit, exclude_quarantined=False):
+    mw2 = {}
+    for queue in snapshot.devicepool_queues_and_workers:
+        mw2[queue] = []
+        queue_empty = False
+        if snapshot.tc_queue_counts[queue] == 0:
+            queue_empty = True
+        more_workers_than_jobs = False
+        if snapshot.tc_queue_counts[queue] < len(
+            snapshot.devicepool_queues_and_workers[queue]
+        ):
+            more_workers_than_jobs = True
+
+        for worker in snapshot.devicepool_queues_and_workers[queue]:
+            if not exclude_quarantined and worker in snapshot.quarantined_workers:
+                mw2[queue].append(worker)
+                continue
+
+            if worker in snapshot.tc_current_worker_last_started:
+                if snapshot.tc_current_worker_last_started[worker] is None:
+                    continue
+                if queue_empty:
+                    continue
+                if more_workers_than_jobs:
+                    continue
+                difference = tc_time.minutes_between(
+                    snapshot.now,
+                    tc_time.parse(snapshot.tc_current_worker_last_started[worker]),
+                )
+                if difference >= limit:
+                    if exclude_quarantined and worker in snapshot.quarantined_workers:
+                        continue
+                    mw2[queue].append(worker)
+            else:
+                if queue_empty:
+                    continue
+                if more_workers_than_jobs:
+                    continue
+                mw2[queue].append(worker)
+    return mw2
+
+
+def classifier_calculate(snapshot, limit, exclude_quarantined=False):
+    return {
+        queue: classes.problem_workers(exclude_quarantined)
+        for queue, classes in worker_classifier.classify(snapshot, limit).items()
+    }
+
+
+def both(func, snapshot):
+    func(snapshot, LIMIT, False)
+    func(snapshot, LIMIT, True)
+
+
+def measure(func, number):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="compare the missing worker loop with worker_classifier.py "
+        "on synthetic fleets."
+    )
+    parser.add_argument(
+        "-s",
+        "--sizes",
+        default="100,1000,5000,10000",
+        help="comma separated fleet sizes (default is 100,1000,5000,10000).",
+    )
+    parser.add_argument(
+        "-q",
+        "--workers-per-queue",
+        default=WORKERS_PER_QUEUE,
+        type=int,
+        help="workers in each queue (default is %s)." % WORKERS_PER_QUEUE,
+    )
+    parser.add_argument(
+        "-n",
+        "--number",
+        default=3,
+        type=int,
+        help="runs per timing round (default is 3).",
+    )
+    args = parser.parse_args()
+
+    print(
+        "%8s %7s %12s %12s %12s %8s"
+        % ("workers", "queues", "loop", "snapshot", "classifier", "speedup")
+    )
+    for size in [int(s) for s in args.sizes.split(",")]:
+        data = fleet_data(size, args.workers_per_queue)
+        now = tc_time.now()
+        snapshot = fleet_snapshot.FleetSnapshot(now, now, **data)
+        for exclude in (False, True):
+            assert loop_calculate(snapshot, LIMIT, exclude) == classifier_calculate(
+                snapshot, LIMIT, exclude
+            )
+        loop_seconds = measure(lambda: both(loop_calculate, snapshot), args.number)
+        snapshot_seconds = measure(
+            lambda: fleet_snapshot.FleetSnapshot(now, now, **data), args.number
+        )
+        classifier_seconds = measure(
+            lambda: both(classifier_calculate, snapshot), args.number
+        )
+        print(
+            "%8s %7s %9.2f ms %9.2f ms %9.2f ms %7.1fx"
+            % (
+                size,
+                len(data["devicepool_queues_and_workers"]),
+                loop_seconds * 1000,
+                snapshot_seconds * 1000,
+                classifier_seconds * 1000,
+                loop_seconds / classifier_seconds,
+            )
+        )
@@ -0,0 +1,218 @@
+import collections
+import contextlib
+import cProfile
+import os
+import sys
+import threading
+from time import perf_counter as timer
+
+# wall time per phase for --profile (fitness.py, missing_workers.py,
+# influx_logger.py and slack_alert.py)
+#
+# - code marks its phases with `with phase_profiler.phase("name"):`, which
+#   does nothing unless a profiler is active (see from_args())
+# - a phase's total is the time it was open summed over its calls. phases
+#   entered from thread pools (e.g. fitness' task statuses) overlap, so their
+#   total can be more than the run's wall time. span is the time from the
+#   phase's first start to its last end.
+# - --profile-dump PATH also writes a cProfile dump of the main thread
+#   (`python -m pstats PATH`)
+# - --profile-sample PATH samples every thread's stack instead (most of the
+#   work happens in thread pools) and writes folded stacks, for flamegraph.pl
+#   or speedscope. waiting threads are sampled too, so it shows wall time.
+#
+# the daemons (influx_logger.py, slack_alert.py) profile each cycle, dumps
+# are overwritten with the latest one.
+
+SAMPLE_INTERVAL = 0.005
+INFLUX_MEASUREMENT = "worker_health_phases"
+
+_profiler = None
+
+
+class PhaseStats:
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.first_start = None
+        self.last_end = None
+
+    def record(self, start, end):
+        self.calls += 1
+        self.total += end - start
+        if self.first_start is None or start < self.first_start:
+            self.first_start = start
+        if self.last_end is None or end > self.last_end:
+            self.last_end = end
+
+    def span(self):
+        return self.last_end - self.first_start
+
+
+class StackSampler:
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        # {folded stack: samples}
+        self.stacks = collections.Counter()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def run(self):
+        own_id = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame:
+                    code = frame.f_code
+                    stack.append(
+                        "%s (%s:%s)"
+                        % (
+                            code.co_name,
+                            os.path.basename(code.co_filename),
+                            code.co_firstlineno,
+                        )
+                    )
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, "w") as f:
+            for stack, samples in sorted(self.stacks.items()):
+                f.write("%s %s\n" % (stack, samples))
+
+
+class Profiler:
+    def __init__(self, dump_path=None, sample_path=None):
+        self.dump_path = dump_path
+        self.sample_path = sample_path
+        self.lock = threading.Lock()
+        # {phase: PhaseStats}, in the order the phases were first entered
+        self.phases = {}
+        self.started = None
+        self.wall = None
+        self.cprofile = None
+        self.sampler = None
+
+    # starts a profiled run (clears the last one's phases)
+    def start(self):
+        with self.lock:
+            self.phases = {}
+        self.wall = None
+        if self.dump_path:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        if self.sample_path:
+            self.sampler = StackSampler()
+            self.sampler.start()
+        self.started = timer()
+
+    # ends the run and writes the dumps
+    def stop(self):
+        self.wall = timer() - self.started
+        if self.cprofile:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.dump_path)
+            self.cprofile = None
+        if self.sampler:
+            self.sampler.stop()
+            self.sampler.write(self.sample_path)
+            self.sampler = None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = timer()
+        try:
+            yield
+        finally:
+            end = timer()
+            with self.lock:
+                self.phases.setdefault(name, PhaseStats()).record(start, end)
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.phases)
+
+    def format_table(self):
+        phases = self.snapshot()
+        if not phases:
+            return "profile: no phases recorded"
+        lines = ["%-24s %6s %9s %9s" % ("phase", "calls", "total", "span")]
+        for name, stats in phases.items():
+            lines.append(
+                "%-24s %6s %8.2fs %8.2fs"
+                % (name, stats.calls, stats.total, stats.span())
+            )
+        if self.wall is not None:
+            lines.append("%-24s %6s %9s %8.2fs" % ("wall", "", "", self.wall))
+        for path in (self.dump_path, self.sample_path):
+            if path:
+                lines.append("profile written to %s" % path)
+        return "\n".join(lines)
+
+    def gen_influx_lines(self, source):
+        lines = []
+        for name, stats in self.snapshot().items():
+            lines.append(
+                "%s,source=%s,phase=%s calls=%s,total=%s,span=%s"
+                % (
+                    INFLUX_MEASUREMENT,
+                    source,
+                    name.replace(" ", "\\ "),
+                    stats.calls,
+                    round(stats.total, 4),
+                    round(stats.span(), 4),
+                )
+            )
+        return lines
+
+
+def phase(name):
+    if _profiler is None:
+        return contextlib.nullcontext()
+    return _profiler.phase(name)
+
+
+def use_profiler(profiler):
+    global _profiler
+    _profiler = profiler
+
+
+def add_arguments(parser):
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        default=False,
+        help="show the wall time spent in each phase.",
+    )
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--profile-dump",
+        metavar="PATH",
+        help="also write a cProfile dump of the main thread (implies --profile).",
+    )
+    group.add_argument(
+        "--profile-sample",
+        metavar="PATH",
+        help="also sample every thread's stack and write them folded, for "
+        "flamegraph.pl or speedscope (implies --profile).",
+    )
+
+
+# returns the active Profiler for --profile (None if it wasn't passed)
+def from_args(args):
+    if not (args.profile or args.profile_dump or args.profile_sample):
+        return None
+    profiler = Profiler(dump_path=args.profile_dump, sample_path=args.profile_sample)
+    use_profiler(profiler)
+    return profiler
@@ -0,0 +1,106 @@
+import argparse
+import pstats
+import threading
+import time
+
+import pytest
+
+import fake_tc_queue
+import phase_profiler
+import tc_client
+import worker_health
+
+
+@pytest.fixture
+def profiler():
+    yield
+    phase_profiler.use_profiler(None)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser()
+    phase_profiler.add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def test_phases_do_nothing_without_a_profiler(profiler):
+    assert phase_profiler.from_args(parse_args([])) is None
+    with phase_profiler.phase("anything"):
+        pass
+
+
+def test_phases_from_threads_add_up(profiler):
+    p = phase_profiler.from_args(parse_args(["--profile"]))
+    p.start()
+    with phase_profiler.phase("listing"):
+        time.sleep(0.01)
+
+    def fetch():
+        with phase_profiler.phase("fetch"):
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=fetch) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    p.stop()
+
+    phases = p.snapshot()
+    assert list(phases) == ["listing", "fetch"]
+    assert phases["fetch"].calls == 4
+    # the threads overlap: 4 calls' worth of time in about one call's span
+    assert phases["fetch"].total >= 0.2
+    assert phases["fetch"].span() < phases["fetch"].total
+    assert p.wall >= phases["fetch"].span()
+    table = p.format_table()
+    assert table.splitlines()[0].split() == ["phase", "calls", "total", "span"]
+    assert "wall" in table
+
+    line = p.gen_influx_lines(source="test")[0]
+    assert line.startswith("worker_health_phases,source=test,phase=listing calls=1,")
+
+
+def test_dumps(profiler, tmp_path):
+    dump_path = str(tmp_path / "run.pstats")
+    p = phase_profiler.from_args(parse_args(["--profile-dump", dump_path]))
+    p.start()
+    sum(range(1000))
+    p.stop()
+    assert pstats.Stats(dump_path).total_calls
+
+    sample_path = tmp_path / "run.folded"
+    p = phase_profiler.from_args(parse_args(["--profile-sample", str(sample_path)]))
+    p.start()
+    time.sleep(0.05)
+    p.stop()
+    stacks = dict(line.rsplit(" ", 1) for line in sample_path.read_text().splitlines())
+    # the main thread, sleeping in the test
+    assert any("test_dumps (phase_profiler_test.py" in stack for stack in stacks)
+    assert all(int(samples) > 0 for samples in stacks.values())
+
+
+def test_worker_health_phases(profiler, tmp_path):
+    fleet = fake_tc_queue.FakeFleet(workers=10, worker_types=2)
+    config_path = str(tmp_path / "config.yml")
+    fleet.write_devicepool_config(config_path)
+    p = phase_profiler.Profiler()
+    phase_profiler.use_profiler(p)
+    root_url = tc_client.ROOT_URL
+    try:
+        with fake_tc_queue.FakeQueueServer(fleet) as server:
+            tc_client.set_root_url(server.root_url)
+            p.start()
+            wh = worker_health.WorkerHealth(
+                task_cache=False, devicepool_config_path=config_path
+            )
+            wh.gather_data()
+            p.stop()
+    finally:
+        tc_client.set_root_url(root_url)
+    assert list(p.snapshot()) == [
+        "devicepool config",
+        "queue counts",
+        "worker types",
+        "workers and latest tasks",
+    ]
@@ -0,0 +1,106 @@
+import logging
+import shlex
+import subprocess
+import threading
+
+logger = logging.getLogger(__name__)
+
+# batched reachability probes for `fitness.py --ping --ping-host`
+#
+# - one ssh session to the ping host per worker type (instead of one per
+#   device). the session is a ControlMaster that stays up for a minute, so
+#   the other worker types' batches reuse its connection.
+# - the remote side pings every device in parallel, with fping if it's
+#   installed or with backgrounded pings otherwise, and prints the ones
+#   that answered
+# - batches run in the background, device reports wait for their batch
+
+SSH_OPTIONS = [
+    "-o",
+    "BatchMode=yes",
+    "-o",
+    "ControlMaster=auto",
+    "-o",
+    "ControlPath=~/.ssh/worker_health-%r@%h:%p",
+    "-o",
+    "ControlPersist=60",
+]
+# seconds, for the whole batch
+SSH_TIMEOUT = 60
+
+# prints the hosts that answer, $@ is the hosts to ping
+REMOTE_SCRIPT = """
+if command -v fping >/dev/null 2>&1; then
+  fping -a -r 1 -t 1000 "$@" 2>/dev/null
+else
+  for host in "$@"; do
+    (ping -c 1 -i 0.3 -w 1 "$host" >/dev/null 2>&1 && echo "$host") &
+  done
+  wait
+fi
+"""
+
+
+def build_command(ping_host, hosts):
+    remote = "sh -c %s ping_probe %s" % (
+        shlex.quote(REMOTE_SCRIPT),
+        " ".join(shlex.quote(host) for host in hosts),
+    )
+    return ["ssh"] + SSH_OPTIONS + [ping_host, remote]
+
+
+class BatchPinger:
+    def __init__(self, ping_host, ping_domain=None):
+        self.ping_host = ping_host
+        self.ping_domain = ping_domain
+        self.lock = threading.Lock()
+        # {batch name: (thread, {device: reachable})}
+        self.batches = {}
+
+    def hostname(self, device):
+        if self.ping_domain:
+            return "%s.%s" % (device, self.ping_domain)
+        return device
+
+    # pings the devices in the background, see reachable()
+    def start(self, name, devices):
+        results = {}
+        thread = threading.Thread(
+            target=self.probe, args=(devices, results), daemon=True
+        )
+        with self.lock:
+            self.batches[name] = (thread, results)
+        thread.start()
+
+    def probe(self, devices, results):
+        if not devices:
+            return
+        hosts = {self.hostname(device): device for device in devices}
+        try:
+            res = subprocess.run(
+                build_command(self.ping_host, list(hosts)),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                universal_newlines=True,
+                timeout=SSH_TIMEOUT,
+            )
+        except subprocess.TimeoutExpired:
+            logger.warning("pinging via %s timed out" % self.ping_host)
+            return
+        # fping exits 1 when some hosts don't answer, ssh uses 255 for its errors
+        if res.returncode == 255:
+            logger.warning("ssh to %s failed: %s" % (self.ping_host, res.stderr))
+            return
+        alive = set(res.stdout.split())
+        for host, device in hosts.items():
+            results[device] = host in alive
+
+    # True/False, None if the device wasn't probed (or the probe failed)
+    def reachable(self, name, device):
+        with self.lock:
+            batch = self.batches.get(name)
+        if not batch:
+            return None
+        thread, results = batch
+        thread.join()
+        return results.get(device)
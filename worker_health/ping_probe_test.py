@@ -0,0 +1,52 @@
+import os
+import subprocess
+
+import ping_probe
+
+
+def test_remote_command_uses_fping(tmp_path, monkeypatch):
+    # a fake fping that answers for hosts starting with "up"
+    fping = tmp_path / "fping"
+    fping.write_text(
+        '#!/bin/sh\nfor h in "$@"; do case "$h" in up*) echo "$h";; esac; done\n'
+    )
+    fping.chmod(0o755)
+    monkeypatch.setenv("PATH", "%s:%s" % (tmp_path, os.environ["PATH"]))
+
+    cmd = ping_probe.build_command("ping-host", ["up-1.corp", "down-1.corp", "up 2"])
+    assert cmd[0] == "ssh" and "ControlMaster=auto" in cmd
+    assert cmd[-2] == "ping-host"
+    # run what the ping host would run
+    res = subprocess.run(
+        ["sh", "-c", cmd[-1]], stdout=subprocess.PIPE, universal_newlines=True
+    )
+    assert res.stdout.splitlines() == ["up-1.corp", "up 2"]
+
+
+def test_batch_results(monkeypatch):
+    commands = []
+
+    def fake_run(cmd, **kwargs):
+        commands.append(cmd)
+        return subprocess.CompletedProcess(cmd, 1, "pixel2-01.corp\n", "")
+
+    monkeypatch.setattr(ping_probe.subprocess, "run", fake_run)
+    pinger = ping_probe.BatchPinger("ping-host", "corp")
+    pinger.start("wt", ["pixel2-01", "pixel2-02"])
+    assert pinger.reachable("wt", "pixel2-01") is True
+    assert pinger.reachable("wt", "pixel2-02") is False
+    assert pinger.reachable("wt", "pixel2-03") is None
+    assert pinger.reachable("other-wt", "pixel2-01") is None
+    # one ssh session for the whole batch
+    assert len(commands) == 1
+
+
+def test_ssh_failure_is_not_a_ping_failure(monkeypatch):
+    monkeypatch.setattr(
+        ping_probe.subprocess,
+        "run",
+        lambda cmd, **kwargs: subprocess.CompletedProcess(cmd, 255, "", "denied"),
+    )
+    pinger = ping_probe.BatchPinger("ping-host")
+    pinger.start("wt", ["pixel2-01"])
+    assert pinger.reachable("wt", "pixel2-01") is None
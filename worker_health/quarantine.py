@@ -1,26 +1,26 @@
 #!/usr/bin/env python
 
-import taskcluster
-import json
-import os
 import argparse
 
 import pprint
 
+import taskcluster
+
+import tc_client
+import tc_time
+import utils
+import worker_group_index
+
 
 class Quarantine:
 
     tc_queue = None
-    root_url = "https://firefox-ci-tc.services.mozilla.com"
+    # opened on first use
+    worker_group_index = None
 
     def __init__(self):
-        with open(os.path.expanduser("~/.tc_token")) as json_file:
-            data = json.load(json_file)
-        creds = {"clientId": data["clientId"], "accessToken": data["accessToken"]}
-
-        self.tc_queue = taskcluster.Queue(
-            {"rootUrl": self.root_url, "credentials": creds}
-        )
+        self.root_url = tc_client.ROOT_URL
+        self.tc_queue = tc_client.queue_client()
 
     def main_get_quarantined(self):
         parser = argparse.ArgumentParser()
@@ -60,32 +60,71 @@ class Quarantine:
         # import ipdb
         # ipdb.set_trace()
 
-        i = 0
-        outcome = self.tc_queue.listWorkers(
-            provisioner, worker_type, query={"quarantined": "true"}
-        )
-        while outcome.get("continuationToken"):
-            # print('more...')
-            if outcome.get("continuationToken"):
-                outcome = self.tc_queue.listWorkers(
-                    provisioner,
-                    worker_type,
-                    query={
-                        "quarantined": "true",
-                        "continuationToken": outcome.get("continuationToken"),
-                    },
-                )
-            i += 1
-            # tasks += len(outcome.get('tasks', []))
-
         quarantined_workers = []
-        for item in outcome["workers"]:
+        for item in self.iter_workers(provisioner, worker_type, quarantined=True):
             hostname = item["workerId"]
             # print(hostname)
             # pprint.pprint(item)
             quarantined_workers.append(hostname)
         return quarantined_workers
 
+    # yields workers from every listWorkers page
+    def iter_workers(self, provisioner, worker_type, quarantined=False):
+        for page in self.iter_pages(provisioner, worker_type, quarantined):
+            for item in page.get("workers", []):
+                yield item
+
+    # yields listWorkers pages
+    def iter_pages(self, provisioner, worker_type, quarantined=False):
+        def fetch_page(continuation_token):
+            query = {}
+            if quarantined:
+                query["quarantined"] = "true"
+            if continuation_token:
+                query["continuationToken"] = continuation_token
+            return self.tc_queue.listWorkers(provisioner, worker_type, query=query)
+
+        return utils.paginate(fetch_page)
+
+    # listWorkers records include quarantineUntil (it's left in the past
+    # when a quarantine is lifted). now: epoch seconds.
+    @staticmethod
+    def is_quarantined(worker, now=None):
+        if "quarantineUntil" not in worker:
+            return False
+        return tc_time.parse(worker["quarantineUntil"]) > (now or tc_time.now())
+
+    # the worker's group (getWorker and quarantineWorker need it), from the
+    # worker group index. a miss (or refresh) is one listWorkers pass.
+    def get_worker_group(self, provisioner, worker_type, worker_id, refresh=False):
+        if self.worker_group_index is None:
+            self.worker_group_index = worker_group_index.WorkerGroupIndex()
+        return self.worker_group_index.lookup(
+            provisioner, worker_type, worker_id, self.iter_workers, refresh=refresh
+        )
+
+    # quarantine_until: a taskcluster timestamp (one in the past lifts it)
+    def quarantine_worker(self, provisioner, worker_type, worker_id, quarantine_until):
+        for refresh in (False, True):
+            worker_group = self.get_worker_group(
+                provisioner, worker_type, worker_id, refresh=refresh
+            )
+            if not worker_group:
+                break
+            try:
+                return self.tc_queue.quarantineWorker(
+                    provisioner,
+                    worker_type,
+                    worker_group,
+                    worker_id,
+                    {"quarantineUntil": quarantine_until},
+                )
+            except taskcluster.exceptions.TaskclusterRestFailure as e:
+                # a stale index entry (the worker moved groups)
+                if e.status_code != 404 or refresh:
+                    raise
+        raise ValueError("%s.%s not found" % (worker_type, worker_id))
+
     def print_quarantined_workers(self, provisioner, worker_type):
         output = self.get_quarantined_workers(provisioner, worker_type)
         count = len(output)
@@ -93,5 +132,6 @@ class Quarantine:
 
 
 if __name__ == "__main__":
+    tc_client.install_taskcluster_transport()
     q = Quarantine()
     q.main_get_quarantined()
@@ -0,0 +1,34 @@
+import pytest
+
+import fake_tc_queue
+import quarantine
+import tc_client
+import worker_group_index
+
+
+def test_quarantine_worker_finds_the_worker_group(tmp_path):
+    fleet = fake_tc_queue.FakeFleet(workers=6, worker_types=1, worker_groups=2)
+    worker_type = fleet.worker_types[0]
+    root_url = tc_client.ROOT_URL
+    try:
+        with fake_tc_queue.FakeQueueServer(fleet) as server:
+            tc_client.set_root_url(server.root_url)
+            q = quarantine.Quarantine()
+            q.worker_group_index = worker_group_index.WorkerGroupIndex(
+                path=str(tmp_path / "groups.sqlite3")
+            )
+            until = "2100-01-01T00:00:00.000Z"
+            q.quarantine_worker(fleet.provisioner, worker_type, "fake-3", until)
+            assert q.get_quarantined_workers(fleet.provisioner, worker_type) == [
+                "fake-3"
+            ]
+
+            # a stale entry is refreshed
+            fleet.workers[worker_type]["fake-3"]["workerGroup"] = "fake-group-new"
+            q.quarantine_worker(fleet.provisioner, worker_type, "fake-3", until)
+            assert (q.worker_group_index.hits, q.worker_group_index.misses) == (1, 2)
+
+            with pytest.raises(ValueError):
+                q.quarantine_worker(fleet.provisioner, worker_type, "nope", until)
+    finally:
+        tc_client.set_root_url(root_url)
@@ -0,0 +1,107 @@
+import email.utils
+import threading
+import time
+
+# token buckets for keeping request rates under the taskcluster api's limits
+#
+# - each bucket refills at 'rate' tokens per second, up to 'burst' tokens
+# - acquire() blocks until a token is available
+# - pause() stops handing out tokens until the server says we can retry
+
+
+class TokenBucket:
+    def __init__(self, rate, burst, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.clock = clock
+        self.sleep = sleep
+        self.last = clock()
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    # returns seconds to wait before a token is available (0 if one was taken)
+    def _try_acquire(self):
+        with self.lock:
+            now = self.clock()
+            if now < self.paused_until:
+                return self.paused_until - now
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    # returns the number of seconds spent waiting
+    def acquire(self):
+        waited = 0
+        while True:
+            delay = self._try_acquire()
+            if not delay:
+                return waited
+            self.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, self.clock() + seconds)
+            self.tokens = 0
+
+
+class RateLimiter:
+    # limits: {endpoint: (rate, burst)}, 'default' is used for other endpoints
+    # (without one they're only limited by the process-wide bucket). every
+    # request takes a token from the process-wide bucket.
+    def __init__(self, limits, process_limit, clock=time.monotonic, sleep=time.sleep):
+        self.limits = limits
+        self.clock = clock
+        self.sleep = sleep
+        self.process_bucket = TokenBucket(*process_limit, clock=clock, sleep=sleep)
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    # None if the endpoint isn't limited
+    def bucket(self, endpoint):
+        if endpoint not in self.limits:
+            endpoint = "default"
+            if endpoint not in self.limits:
+                return None
+        with self.lock:
+            if endpoint not in self.buckets:
+                self.buckets[endpoint] = TokenBucket(
+                    *self.limits[endpoint], clock=self.clock, sleep=self.sleep
+                )
+            return self.buckets[endpoint]
+
+    def acquire(self, endpoint):
+        waited = 0
+        bucket = self.bucket(endpoint)
+        if bucket:
+            waited = bucket.acquire()
+        return waited + self.process_bucket.acquire()
+
+    # the api limits the client (not the endpoint), so back off everything
+    def pause(self, seconds):
+        self.process_bucket.pause(seconds)
+
+
+# parses a Retry-After header (seconds or an http date), None if missing/invalid
+def retry_after_seconds(header_value, now=None):
+    if not header_value:
+        return None
+    try:
+        return max(float(header_value), 0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(header_value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    now = now or time.time()
+    return max(retry_at.timestamp() - now, 0)
@@ -0,0 +1,68 @@
+import email.utils
+
+import rate_limit
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_bucket_allows_burst_then_limits_rate():
+    clock = FakeClock()
+    bucket = rate_limit.TokenBucket(rate=10, burst=5, clock=clock, sleep=clock.sleep)
+    for _i in range(5):
+        assert bucket.acquire() == 0
+    # the sixth token takes 1/rate seconds to refill
+    assert round(bucket.acquire(), 3) == 0.1
+    assert round(clock.now, 3) == 0.1
+
+
+def test_bucket_pause():
+    clock = FakeClock()
+    bucket = rate_limit.TokenBucket(rate=10, burst=5, clock=clock, sleep=clock.sleep)
+    bucket.pause(3)
+    bucket.acquire()
+    assert clock.now >= 3
+
+
+def test_limiter_uses_default_bucket():
+    clock = FakeClock()
+    limiter = rate_limit.RateLimiter(
+        {"status": (1, 1), "default": (2, 2)},
+        (100, 100),
+        clock=clock,
+        sleep=clock.sleep,
+    )
+    assert limiter.bucket("listWorkers") is limiter.bucket("default")
+    assert limiter.bucket("status") is not limiter.bucket("default")
+    limiter.acquire("status")
+    limiter.acquire("status")
+    assert clock.now == 1
+
+
+def test_endpoints_without_a_limit_only_use_the_process_bucket():
+    clock = FakeClock()
+    limiter = rate_limit.RateLimiter(
+        {"status": (1, 1)}, (2, 2), clock=clock, sleep=clock.sleep
+    )
+    assert limiter.bucket("listWorkers") is None
+    limiter.acquire("listWorkers")
+    limiter.acquire("listWorkers")
+    assert clock.now == 0
+    limiter.acquire("listWorkers")
+    assert clock.now == 0.5
+
+
+def test_retry_after_seconds():
+    assert rate_limit.retry_after_seconds("7") == 7
+    assert rate_limit.retry_after_seconds(None) is None
+    assert rate_limit.retry_after_seconds("soon") is None
+    http_date = email.utils.formatdate(1000 + 30, usegmt=True)
+    assert rate_limit.retry_after_seconds(http_date, now=1000) == 30
@@ -2,7 +2,9 @@
 
 import argparse
 import os
+import queue
 import random
+import threading
 import time
 
 # TODO: wrap import with try/except?
@@ -11,13 +13,48 @@ import requests
 import schedule
 import toml
 
+import http_metrics
+import phase_profiler
+import tc_client
 import utils
 from worker_health import WorkerHealth, logger
 
+# a host reported offline by the journal is mentioned at most once per this
+# many seconds (hosts flap)
+JOURNAL_HOST_ALERT_SECONDS = 60 * 60
+# journal messages waiting for the sender thread, newer ones are dropped
+JOURNAL_QUEUE_SIZE = 100
+SLACK_TIMEOUT_SECONDS = 10
+
 
 class SlackAlert:
-    def __init__(self, log_level, time_limit, testing_mode_enabled):
+    def __init__(
+        self,
+        log_level,
+        time_limit,
+        testing_mode_enabled,
+        profiler=None,
+        worker_health=None,
+    ):
         self.time_limit = time_limit
+        # a phase_profiler.Profiler for --profile, each alert run is profiled
+        self.profiler = profiler
+        # a WorkerHealth shared with other jobs (worker_health_daemon.py), its
+        # fleet snapshot is reused while fresh. otherwise each run gathers.
+        self.worker_health = worker_health
+        # {devicepool project: offline hosts}, from on_journal_event()
+        self.journal_offline = {}
+        # journal events from before this are only recorded (the follower
+        # starts with the last few minutes of the journal)
+        self.journal_since = time.time()
+        # {host: epoch it was last mentioned}, see on_journal_event()
+        self.journal_alerted = {}
+        # the problem workers of the last periodic alert (while alerting)
+        self.alerted_workers = set()
+        # messages for the journal sender thread (started on first use), so
+        # slack posts don't hold up the journal follower
+        self.journal_queue = queue.Queue(JOURNAL_QUEUE_SIZE)
+        self.journal_sender = None
         self.log_level = log_level
         self.alerting_enabled = False
         self.testing_mode = testing_mode_enabled
@@ -61,16 +98,29 @@ currently_alerting = false
             self.write_toml(return_dict)
             return return_dict
 
+    def get_worker_health(self):
+        if self.worker_health:
+            return self.worker_health
+        return WorkerHealth(self.log_level)
+
     def slack_alert(self):
-        wh = WorkerHealth(self.log_level)
+        tc_client.reset_stats()
+        http_metrics.reset()
+        if self.profiler:
+            self.profiler.start()
+        wh = self.get_worker_health()
         # for slack alerts, don't mention tc quarantined hosts
         # - will still appear if offline in devicepool
         report_data = wh.get_report(
             show_all=False, time_limit=self.time_limit, verbosity=self.log_level
         )
+        if self.profiler:
+            self.profiler.stop()
+            logger.info("profile: \n%s" % self.profiler.format_table())
         if len(report_data["union"]) > 0:
             # update state indicating we're alerting
             self.set_toml_value("currently_alerting", True)
+            self.alerted_workers = set(report_data["union"])
 
             # bold workers with high confidence (devicepool showing as bad)
             worker_string = "["
@@ -111,6 +161,9 @@ currently_alerting = false
                     logger.info("would have sent message: '%s'" % message)
             logger.info("no problem workers")
             self.set_toml_value("currently_alerting", False)
+            self.alerted_workers = set()
+        logger.info("http metrics: \n%s" % http_metrics.format_table())
+        logger.info(tc_client.format_stats())
 
     # only fires if it's 8AM-6PM M-F in bitbar TZ
     def slack_alert_m_thru_f(self):
@@ -123,7 +176,7 @@ currently_alerting = false
         logger.info("now.hour %s, now.day_of_week %s" % (now.hour, now.day_of_week))
         if (7 <= now.hour <= 18) and (1 <= now.day_of_week <= 5):
             logger.info("inside run window")
-            wh = WorkerHealth(self.log_level)
+            wh = self.get_worker_health()
             # for slack alerts, don't mention tc quarantined hosts
             # - will still appear if offline in devicepool
             pw = wh.get_problem_workers(
@@ -142,6 +195,65 @@ currently_alerting = false
         else:
             logger.info("outside run window")
 
+    # subscriber for a journal_reader.JournalFollower (worker_health_daemon.py
+    # --follow-journal), mentions workers as soon as devicepool reports them
+    # offline. runs on the follower's thread, so the message is only queued.
+    #
+    # a host isn't mentioned again for JOURNAL_HOST_ALERT_SECONDS, or while
+    # the periodic alert is alerting about it (currently_alerting)
+    def on_journal_event(self, event):
+        if event.kind != "offline":
+            return
+        previous = self.journal_offline.get(event.project, [])
+        self.journal_offline[event.project] = event.hosts
+        if event.timestamp < self.journal_since:
+            return
+        now = time.time()
+        alerted = set()
+        if self.get_toml_value("currently_alerting"):
+            alerted = self.alerted_workers
+        new_hosts = []
+        for host in event.hosts:
+            if host in previous or host in alerted:
+                continue
+            if now - self.journal_alerted.get(host, 0) < JOURNAL_HOST_ALERT_SECONDS:
+                continue
+            self.journal_alerted[host] = now
+            new_hosts.append(host)
+        if not new_hosts:
+            return
+        message = "devicepool reports new offline workers in %s: %s" % (
+            event.project,
+            new_hosts,
+        )
+        if not self.alerting_enabled:
+            logger.info("would have sent message: '%s'" % message)
+            return
+        if not self.journal_sender:
+            self.journal_sender = threading.Thread(
+                target=self.send_journal_messages, daemon=True
+            )
+            self.journal_sender.start()
+        try:
+            self.journal_queue.put_nowait(message)
+        except queue.Full:
+            logger.warning("slack message queue full, dropping: '%s'" % message)
+
+    # the journal sender thread, messages queued while a post is in flight
+    # are sent together
+    def send_journal_messages(self):
+        while True:
+            messages = [self.journal_queue.get()]
+            while True:
+                try:
+                    messages.append(self.journal_queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.send_slack_message("\n".join(messages))
+            except Exception:
+                logger.exception("sending journal messages to slack failed")
+
     # TODO: if alerting is not enabled, just mention we'd send a message
     def send_slack_message(self, message):
         # cli example:
@@ -149,7 +261,9 @@ currently_alerting = false
         data = {"text": message}
         retries = 2
         while retries >= 0:
-            r = requests.post(url=self.webhook_url, json=data)
+            r = requests.post(
+                url=self.webhook_url, json=data, timeout=SLACK_TIMEOUT_SECONDS
+            )
             if r.status_code == 200:
                 break
             logger.info("got a non-200 status code, retrying...")
@@ -223,7 +337,15 @@ if __name__ == "__main__":
     parser.add_argument(
         "--testing-mode", action="store_true", default=False, help="enable testing mode"
     )
+    tc_client.add_arguments(parser)
+    phase_profiler.add_arguments(parser)
     args = parser.parse_args()
+    tc_client.from_args(args)
 
-    sa = SlackAlert(args.log_level, args.time_limit, args.testing_mode)
+    sa = SlackAlert(
+        args.log_level,
+        args.time_limit,
+        args.testing_mode,
+        profiler=phase_profiler.from_args(args),
+    )
     sa.main(args)
@@ -0,0 +1,77 @@
+import threading
+import time
+
+import pytest
+
+import journal_reader
+import slack_alert
+
+
+class BlockingSlackAlert(slack_alert.SlackAlert):
+    # records messages instead of posting them, posts block until released
+    def __init__(self):
+        super().__init__(0, 95, False)
+        self.alerting_enabled = True
+        self.sent = []
+        self.release = threading.Event()
+
+    def send_slack_message(self, message):
+        self.release.wait()
+        self.sent.append(message)
+
+
+@pytest.fixture
+def alert(tmp_path, monkeypatch):
+    # the config file is written to ~
+    monkeypatch.setenv("HOME", str(tmp_path))
+    return BlockingSlackAlert()
+
+
+def offline(hosts, project="gecko-t-bitbar-gw-perf-p2"):
+    return journal_reader.JournalEvent(
+        "offline", time.time(), project=project, hosts=hosts
+    )
+
+
+def wait_for_sent(alert, count):
+    deadline = time.time() + 5
+    while len(alert.sent) < count and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_journal_events_dont_wait_for_slack(alert):
+    start = time.time()
+    alert.on_journal_event(offline(["pixel2-21"]))
+    alert.on_journal_event(offline(["pixel2-21", "pixel2-22"]))
+    # the first post is still blocked
+    assert time.time() - start < 1
+    assert alert.sent == []
+
+    alert.release.set()
+    wait_for_sent(alert, 1)
+    # one post, or the first and then the queued one
+    assert "pixel2-21" in alert.sent[0]
+    assert "pixel2-22" in "\n".join(alert.sent)
+
+
+def test_flapping_hosts_are_mentioned_once(alert):
+    alert.release.set()
+    alert.on_journal_event(offline(["pixel2-21"]))
+    wait_for_sent(alert, 1)
+    for _i in range(5):
+        alert.on_journal_event(offline([]))
+        alert.on_journal_event(offline(["pixel2-21"]))
+    time.sleep(0.1)
+    assert len(alert.sent) == 1
+
+
+def test_hosts_in_the_current_alert_are_skipped(alert):
+    alert.release.set()
+    alert.set_toml_value("currently_alerting", True)
+    alert.alerted_workers = {"pixel2-21"}
+    alert.on_journal_event(offline(["pixel2-21", "pixel2-22"]))
+    wait_for_sent(alert, 1)
+    time.sleep(0.1)
+    assert len(alert.sent) == 1
+    assert "pixel2-21" not in alert.sent[0]
+    assert "pixel2-22" in alert.sent[0]
@@ -0,0 +1,198 @@
+import os
+import sqlite3
+import threading
+import time
+
+import task_status_cache
+
+# persistent store of task runs for incremental fitness reports
+#
+# - one row per (taskId, runId, workerId) with the run's state and times,
+#   plus one row per task with its state, retriesLeft and whether it's resolved
+# - once a task and all of its runs are resolved it isn't fetched again,
+#   its status is rebuilt from the stored rows
+# - tasks that aren't resolved yet are refetched every run
+# - rows age out after MAX_AGE_SECONDS (recentTasks only covers recent work)
+# - fetched statuses are written a device at a time (put_many(), one
+#   transaction), the database is in WAL mode
+
+STORE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "worker_health", "task_runs.sqlite3"
+)
+MAX_AGE_SECONDS = 30 * 24 * 60 * 60
+# sqlite's default limit on host parameters is 999
+QUERY_BATCH_SIZE = 500
+
+
+class TaskRunStore:
+    def __init__(self, path=STORE_PATH, max_age=MAX_AGE_SECONDS, enabled=True):
+        self.path = path
+        self.max_age = max_age
+        self.enabled = enabled
+        # tasks served from the store vs fetched from taskcluster
+        self.stored = 0
+        self.fetched = 0
+        self.lock = threading.Lock()
+        self.connection = None
+        if self.enabled:
+            self.open()
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # shared by the fitness thread pools, access is serialized by self.lock
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        # commits append to the log instead of rewriting the database, and
+        # only checkpoints sync (still durable across application crashes)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                "task_id TEXT PRIMARY KEY, state TEXT NOT NULL, "
+                "retries_left INTEGER, resolved INTEGER NOT NULL, "
+                "updated REAL NOT NULL, task_group_id TEXT)"
+            )
+            # stores created before task_group_id was added
+            columns = [
+                row[1] for row in self.connection.execute("PRAGMA table_info(tasks)")
+            ]
+            if "task_group_id" not in columns:
+                self.connection.execute(
+                    "ALTER TABLE tasks ADD COLUMN task_group_id TEXT"
+                )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS task_runs ("
+                "task_id TEXT NOT NULL, run_id INTEGER NOT NULL, "
+                "worker_id TEXT NOT NULL, state TEXT NOT NULL, "
+                "started TEXT, resolved TEXT, "
+                "PRIMARY KEY (task_id, run_id, worker_id))"
+            )
+        self.prune()
+
+    def prune(self, now=None):
+        now = now or time.time()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM task_runs WHERE task_id IN "
+                "(SELECT task_id FROM tasks WHERE updated < ?)",
+                (now - self.max_age,),
+            )
+            self.connection.execute(
+                "DELETE FROM tasks WHERE updated < ?", (now - self.max_age,)
+            )
+
+    # returns {task_id: status json} for the given tasks that have resolved
+    def get_resolved(self, task_ids):
+        if not self.enabled or not task_ids:
+            return {}
+        statuses = {}
+        with self.lock:
+            for i in range(0, len(task_ids), QUERY_BATCH_SIZE):
+                batch = task_ids[i : i + QUERY_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                for task_id, state, retries_left, group_id in self.connection.execute(
+                    "SELECT task_id, state, retries_left, task_group_id FROM tasks "
+                    "WHERE resolved = 1 AND task_id IN (%s)" % placeholders,
+                    batch,
+                ):
+                    statuses[task_id] = {
+                        "status": {
+                            "taskId": task_id,
+                            "state": state,
+                            "retriesLeft": retries_left,
+                            "runs": [],
+                        }
+                    }
+                    if group_id:
+                        statuses[task_id]["status"]["taskGroupId"] = group_id
+                for row in self.connection.execute(
+                    "SELECT task_id, run_id, worker_id, state, started, resolved "
+                    "FROM task_runs WHERE task_id IN (%s) "
+                    "ORDER BY task_id, run_id" % placeholders,
+                    batch,
+                ):
+                    task_id, run_id, worker_id, state, started, resolved = row
+                    if task_id not in statuses:
+                        continue
+                    run = {"runId": run_id, "state": state}
+                    if worker_id:
+                        run["workerId"] = worker_id
+                    if started:
+                        run["started"] = started
+                    if resolved:
+                        run["resolved"] = resolved
+                    statuses[task_id]["status"]["runs"].append(run)
+            self.stored += len(statuses)
+        return statuses
+
+    def put(self, task_id, status_json, now=None):
+        self.put_many([(task_id, status_json)], now)
+
+    # statuses: (task_id, status json) pairs, written in one transaction
+    def put_many(self, statuses, now=None):
+        if not self.enabled:
+            return
+        now = now or time.time()
+        task_ids = []
+        tasks = []
+        runs = []
+        fetched = 0
+        for task_id, status_json in statuses:
+            fetched += 1
+            if not status_json or "status" not in status_json:
+                continue
+            status = status_json["status"]
+            task_ids.append((task_id,))
+            tasks.append(
+                (
+                    task_id,
+                    status["state"],
+                    status.get("retriesLeft"),
+                    task_status_cache.is_immutable(status_json),
+                    now,
+                    status.get("taskGroupId"),
+                )
+            )
+            runs.extend(
+                (
+                    task_id,
+                    run["runId"],
+                    run.get("workerId", ""),
+                    run["state"],
+                    run.get("started"),
+                    run.get("resolved"),
+                )
+                for run in status.get("runs", [])
+            )
+        with self.lock:
+            self.fetched += fetched
+            if not tasks:
+                return
+            with self.connection:
+                # runs can change worker (e.g. pending -> claimed), replace them all
+                self.connection.executemany(
+                    "DELETE FROM task_runs WHERE task_id = ?", task_ids
+                )
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?, ?)", tasks
+                )
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO task_runs VALUES (?, ?, ?, ?, ?, ?)",
+                    runs,
+                )
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+    def format_stats(self):
+        total = self.stored + self.fetched
+        stored_rate = 0
+        if total:
+            stored_rate = self.stored / total * 100
+        return "task run store: %s tasks from the store, %s fetched (%.1f%% stored)" % (
+            self.stored,
+            self.fetched,
+            stored_rate,
+        )
@@ -0,0 +1,109 @@
+import pytest
+
+import task_run_store
+
+
+def status(state, runs, retries_left=5):
+    return {
+        "status": {
+            "taskId": "ignored",
+            "state": state,
+            "retriesLeft": retries_left,
+            "runs": [
+                dict(
+                    {"runId": i, "state": s, "workerId": w},
+                    **({"started": "2020-01-01T00:0%s:00.000Z" % i} if w else {}),
+                )
+                for i, (s, w) in enumerate(runs)
+            ],
+        }
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = task_run_store.TaskRunStore(path=str(tmp_path / "runs.sqlite3"), max_age=3600)
+    yield s
+    s.close()
+
+
+def test_resolved_tasks_are_rebuilt_from_runs(store):
+    store.put(
+        "t1",
+        status("completed", [("exception", "w1"), ("completed", "w2")], retries_left=4),
+    )
+    resolved = store.get_resolved(["t1"])["t1"]["status"]
+    assert resolved["state"] == "completed"
+    assert resolved["retriesLeft"] == 4
+    assert [(r["runId"], r["state"], r["workerId"]) for r in resolved["runs"]] == [
+        (0, "exception", "w1"),
+        (1, "completed", "w2"),
+    ]
+    assert resolved["runs"][1]["started"] == "2020-01-01T00:01:00.000Z"
+
+
+def test_unresolved_tasks_are_fetched_again(store):
+    store.put("t1", status("running", [("running", "w1")]))
+    store.put("t2", status("pending", [("pending", "")]))
+    assert store.get_resolved(["t1", "t2", "unknown"]) == {}
+
+    # the run was claimed and resolved since
+    store.put("t2", status("failed", [("failed", "w2")]))
+    runs = store.get_resolved(["t1", "t2"])["t2"]["status"]["runs"]
+    assert [(r["state"], r["workerId"]) for r in runs] == [("failed", "w2")]
+    assert store.stored == 1
+    assert store.fetched == 3
+
+
+def test_errors_are_not_stored(store):
+    store.put("gone", {"code": "ResourceNotFound"})
+    assert store.get_resolved(["gone"]) == {}
+
+
+def test_prune(store):
+    store.put("old", status("completed", [("completed", "w1")]), now=1000)
+    store.put("new", status("completed", [("completed", "w1")]), now=4000)
+    store.prune(now=4700)
+    assert list(store.get_resolved(["old", "new"])) == ["new"]
+
+
+def test_disabled_store(tmp_path):
+    s = task_run_store.TaskRunStore(path=str(tmp_path / "runs.sqlite3"), enabled=False)
+    s.put("t1", status("completed", [("completed", "w1")]))
+    assert s.get_resolved(["t1"]) == {}
+
+
+def test_task_group_id_is_kept_and_old_stores_are_migrated(tmp_path):
+    path = str(tmp_path / "runs.sqlite3")
+    s = task_run_store.TaskRunStore(path=path)
+    # the tasks table as created before task_group_id
+    s.connection.execute("DROP TABLE tasks")
+    s.connection.execute(
+        "CREATE TABLE tasks (task_id TEXT PRIMARY KEY, state TEXT NOT NULL, "
+        "retries_left INTEGER, resolved INTEGER NOT NULL, updated REAL NOT NULL)"
+    )
+    s.connection.execute("INSERT INTO tasks VALUES ('old', 'completed', 5, 1, 1e10)")
+    s.connection.commit()
+    s.close()
+
+    s = task_run_store.TaskRunStore(path=path)
+    task = status("completed", [("completed", "w1")])
+    task["status"]["taskGroupId"] = "group1"
+    s.put("new", task)
+    resolved = s.get_resolved(["old", "new"])
+    assert "taskGroupId" not in resolved["old"]["status"]
+    assert resolved["new"]["status"]["taskGroupId"] == "group1"
+    s.close()
+
+
+def test_put_many(store):
+    store.put_many(
+        [
+            ("t1", status("completed", [("completed", "w1")])),
+            ("t2", status("running", [("running", "w1")])),
+            ("gone", {"code": "ResourceNotFound"}),
+        ]
+    )
+    assert list(store.get_resolved(["t1", "t2", "gone"])) == ["t1"]
+    assert store.fetched == 3
+    assert store.connection.execute("PRAGMA journal_mode").fetchone() == ("wal",)
@@ -0,0 +1,135 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# on-disk cache for taskcluster /task/<id>/status responses
+#
+# - once a task and all of its runs are resolved the status can't change,
+#   so it's kept until it ages out (IMMUTABLE_MAX_AGE_SECONDS)
+# - pending and running tasks are only kept for MUTABLE_TTL_SECONDS
+# - error responses (ResourceNotFound, etc) aren't cached
+# - put_many() writes a batch in one transaction, the database is in WAL mode
+
+CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "worker_health", "task_status.sqlite3"
+)
+MUTABLE_TTL_SECONDS = 60
+# recentTasks only covers the last few hours of work, no need to keep much more
+IMMUTABLE_MAX_AGE_SECONDS = 30 * 24 * 60 * 60
+TERMINAL_STATES = ("completed", "failed", "exception")
+
+
+def is_immutable(status_json):
+    try:
+        status = status_json["status"]
+        if status["state"] not in TERMINAL_STATES:
+            return False
+        for run in status.get("runs", []):
+            if run["state"] not in TERMINAL_STATES:
+                return False
+    except (KeyError, TypeError):
+        return False
+    return True
+
+
+class TaskStatusCache:
+    def __init__(
+        self,
+        path=CACHE_PATH,
+        mutable_ttl=MUTABLE_TTL_SECONDS,
+        immutable_max_age=IMMUTABLE_MAX_AGE_SECONDS,
+        enabled=True,
+    ):
+        self.path = path
+        self.mutable_ttl = mutable_ttl
+        self.immutable_max_age = immutable_max_age
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connection = None
+        if self.enabled:
+            self.open()
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # shared by the fitness thread pools, access is serialized by self.lock
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        # commits append to the log instead of rewriting the database, and
+        # only checkpoints sync (still durable across application crashes)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS task_status ("
+            "task_id TEXT PRIMARY KEY, status TEXT NOT NULL, "
+            "stored REAL NOT NULL, expires REAL)"
+        )
+        self.prune()
+
+    def prune(self, now=None):
+        now = now or time.time()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM task_status WHERE expires < ? "
+                "OR (expires IS NULL AND stored < ?)",
+                (now, now - self.immutable_max_age),
+            )
+
+    def get(self, task_id, now=None):
+        if not self.enabled:
+            return None
+        now = now or time.time()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT status, expires FROM task_status WHERE task_id = ?",
+                (task_id,),
+            ).fetchone()
+            if row and (row[1] is None or row[1] > now):
+                self.hits += 1
+                return json.loads(row[0])
+            self.misses += 1
+        return None
+
+    def put(self, task_id, status_json, now=None):
+        self.put_many([(task_id, status_json)], now)
+
+    # statuses: (task_id, status json) pairs, written in one transaction
+    def put_many(self, statuses, now=None):
+        if not self.enabled:
+            return
+        now = now or time.time()
+        rows = []
+        for task_id, status_json in statuses:
+            if not status_json or "status" not in status_json:
+                continue
+            expires = None
+            if not is_immutable(status_json):
+                expires = now + self.mutable_ttl
+            rows.append((task_id, json.dumps(status_json), now, expires))
+        if not rows:
+            return
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO task_status VALUES (?, ?, ?, ?)", rows
+            )
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+    def format_stats(self):
+        total = self.hits + self.misses
+        hit_rate = 0
+        if total:
+            hit_rate = self.hits / total * 100
+        return "task status cache: %s hits, %s misses (%.1f%% hit rate)" % (
+            self.hits,
+            self.misses,
+            hit_rate,
+        )
@@ -0,0 +1,80 @@
+import pytest
+
+import task_status_cache
+
+
+def status(state, run_states):
+    return {
+        "status": {
+            "state": state,
+            "runs": [{"runId": i, "state": s} for i, s in enumerate(run_states)],
+        }
+    }
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = task_status_cache.TaskStatusCache(
+        path=str(tmp_path / "cache.sqlite3"), mutable_ttl=60, immutable_max_age=3600
+    )
+    yield c
+    c.close()
+
+
+def test_is_immutable():
+    assert task_status_cache.is_immutable(status("completed", ["completed"]))
+    assert task_status_cache.is_immutable(status("failed", ["exception", "failed"]))
+    assert not task_status_cache.is_immutable(status("running", ["running"]))
+    assert not task_status_cache.is_immutable(status("pending", ["exception"]))
+    assert not task_status_cache.is_immutable({"code": "ResourceNotFound"})
+
+
+def test_resolved_tasks_are_kept(cache):
+    cache.put("resolved", status("completed", ["completed"]), now=1000)
+    assert cache.get("resolved", now=1000 + 3000) == status("completed", ["completed"])
+
+
+def test_running_tasks_expire(cache):
+    cache.put("running", status("running", ["running"]), now=1000)
+    assert cache.get("running", now=1030) == status("running", ["running"])
+    assert cache.get("running", now=1061) is None
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+def test_errors_are_not_cached(cache):
+    cache.put("gone", {"code": "ResourceNotFound"})
+    assert cache.get("gone") is None
+
+
+def test_prune(cache):
+    cache.put("old", status("completed", ["completed"]), now=1000)
+    cache.put("running", status("running", ["running"]), now=1000)
+    cache.prune(now=1000 + 4000)
+    assert cache.connection.execute("SELECT COUNT(*) FROM task_status").fetchone() == (
+        0,
+    )
+
+
+def test_disabled_cache(tmp_path):
+    c = task_status_cache.TaskStatusCache(
+        path=str(tmp_path / "cache.sqlite3"), enabled=False
+    )
+    c.put("resolved", status("completed", ["completed"]))
+    assert c.get("resolved") is None
+    assert not (tmp_path / "cache.sqlite3").exists()
+
+
+def test_put_many(cache):
+    cache.put_many(
+        [
+            ("resolved", status("completed", ["completed"])),
+            ("running", status("running", ["running"])),
+            ("gone", {"code": "ResourceNotFound"}),
+        ],
+        now=1000,
+    )
+    assert cache.get("resolved", now=1100) == status("completed", ["completed"])
+    assert cache.get("running", now=1100) is None
+    assert cache.get("gone", now=1000) is None
+    assert cache.connection.execute("PRAGMA journal_mode").fetchone() == ("wal",)
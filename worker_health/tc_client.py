@@ -0,0 +1,428 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+import taskcluster
+import taskcluster.utils
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# from requests.packages.urllib3.util.retry import Retry
+from urllib3.util import Retry
+
+import cassette as cassette_module
+import http_metrics
+import rate_limit
+
+logger = logging.getLogger(__name__)
+
+# process-wide pooled http client shared by all worker_health tools
+#
+# - one requests.Session (and one HTTPAdapter) per process, so tls
+#   connections are kept alive and reused across threads and calls
+# - the pool size should match the largest fan-out of the caller
+#   (fitness uses WORKERTYPE_THREAD_COUNT * TASK_THREAD_COUNT)
+# - concurrent gets of the same url (and params) are coalesced into one
+#   request, the response is shared by every caller waiting on it
+# - client-side rate limiting is off unless configured (--rate-limit or
+#   TC_RATE_LIMIT, see parse_rate_limits()). then every request takes a token
+#   from a process-wide bucket and, if the endpoint has a limit, its bucket.
+# - a 429 is retried after its Retry-After (pausing all requests when rate
+#   limiting is on)
+# - taskcluster client calls only go through the session after
+#   install_taskcluster_transport() (the entry points call it)
+# - latency, bytes and retries of every request are recorded per endpoint
+#   in http_metrics
+# - with a cassette (see cassette.py), responses are recorded or replayed
+
+# TC_ROOT_URL can point the tools at another deployment (or fake_tc_queue.py)
+ROOT_URL = os.environ.get("TC_ROOT_URL", "https://firefox-ci-tc.services.mozilla.com")
+CREDENTIALS_FILE = os.path.join(os.path.expanduser("~"), ".tc_token")
+
+DEFAULT_POOL_SIZE = 10
+
+# e.g. '60' or '60,status=50,listWorkers=10' (see parse_rate_limits())
+RATE_LIMIT_ENV = "TC_RATE_LIMIT"
+# 429 handling: retries, and the backoff used when there's no Retry-After
+RATE_LIMITED_RETRIES = 5
+RATE_LIMITED_BACKOFF_FACTOR = 0.5
+
+ENDPOINT_PATTERNS = [
+    (re.compile(r"/task/[^/]+/status$"), "status"),
+    (re.compile(r"/task/[^/]+$"), "task"),
+    (re.compile(r"/worker-types/[^/]+/workers/[^/]+/[^/]+$"), "getWorker"),
+    (re.compile(r"/worker-types/[^/]+/workers$"), "listWorkers"),
+    (re.compile(r"/provisioners/[^/]+/worker-types/?$"), "listWorkerTypes"),
+    (re.compile(r"/pending/[^/]+/[^/]+$"), "pendingTasks"),
+    (re.compile(r"/task-group/[^/]+/list$"), "listTaskGroup"),
+    (re.compile(r"/api/index/v1/namespaces/[^/]+$"), "listNamespaces"),
+    (re.compile(r"/api/index/v1/tasks/[^/]+$"), "listTasks"),
+]
+
+_session = None
+_pool_size = DEFAULT_POOL_SIZE
+_lock = threading.Lock()
+_stats = {"requests": 0, "connections_created": 0, "coalesced": 0, "rate_limited": 0}
+# None unless rate limits are configured
+_rate_limiter = None
+_cassette = None
+# loaded once per process, see get_credentials() and queue_client()
+_credentials = None
+_queue_clients = {}
+
+
+def set_root_url(root_url):
+    global ROOT_URL
+    ROOT_URL = root_url.rstrip("/")
+
+
+def queue_url():
+    return "%s/api/queue/v1" % ROOT_URL
+
+
+def index_url():
+    return "%s/api/index/v1" % ROOT_URL
+
+
+# process_limit: (requests per second, burst), None turns rate limiting off.
+# endpoint_limits: {endpoint: (rate, burst)}, endpoints are named after the
+# taskcluster queue api methods (see endpoint_name()).
+def set_rate_limits(endpoint_limits, process_limit):
+    global _rate_limiter
+    if process_limit is None:
+        _rate_limiter = None
+        return
+    _rate_limiter = rate_limit.RateLimiter(endpoint_limits, process_limit)
+
+
+# parses 'RATE[,ENDPOINT=RATE,...]' (requests per second, the burst is the
+# same) into set_rate_limits() arguments. '' or '0' is no rate limiting.
+def parse_rate_limits(spec):
+    items = [item.strip() for item in spec.split(",") if item.strip()]
+    if not items or items[0] == "0":
+        return {}, None
+    try:
+        rate = float(items[0])
+        endpoint_limits = {}
+        for item in items[1:]:
+            endpoint, endpoint_rate = item.split("=")
+            endpoint_limits[endpoint.strip()] = (float(endpoint_rate),) * 2
+    except ValueError:
+        raise ValueError("invalid rate limit '%s'" % spec)
+    return endpoint_limits, (rate, rate)
+
+
+def add_arguments(parser):
+    parser.add_argument(
+        "--rate-limit",
+        metavar="RATE[,ENDPOINT=RATE,...]",
+        help="limit requests per second (process-wide, and optionally per "
+        "endpoint, e.g. '60,status=50'). off by default, also read from $%s."
+        % RATE_LIMIT_ENV,
+    )
+
+
+# applies --rate-limit (or $TC_RATE_LIMIT)
+def from_args(args):
+    spec = args.rate_limit
+    if spec is None:
+        spec = os.environ.get(RATE_LIMIT_ENV, "")
+    set_rate_limits(*parse_rate_limits(spec))
+
+
+# records or replays every request made through the session (None disables)
+def use_cassette(cassette):
+    global _session, _cassette
+    # the next get_session() mounts (or drops) the cassette adapter
+    with _lock:
+        _cassette = cassette
+        old_session = _session
+        _session = None
+    if old_session:
+        old_session.close()
+
+
+# returns taskcluster credentials from CREDENTIALS_FILE, empty if not present.
+# the file is only read once per process.
+def get_credentials():
+    global _credentials
+    if _credentials is None:
+        _credentials = _read_credentials()
+    return _credentials
+
+
+def _read_credentials():
+    if not os.path.exists(CREDENTIALS_FILE):
+        logger.debug("%s not found, making unauthenticated requests" % CREDENTIALS_FILE)
+        return {}
+    with open(CREDENTIALS_FILE) as json_file:
+        data = json.load(json_file)
+    return {"clientId": data["clientId"], "accessToken": data["accessToken"]}
+
+
+def _taskcluster_request(method, url, payload, headers, session=None):
+    return get_session().request(
+        method.upper(), url, data=payload, headers=headers, allow_redirects=False
+    )
+
+
+# the taskcluster client doesn't pass its session option on to requests
+# (makeSingleHttpRequest is called without it). this routes every taskcluster
+# client request in the process through the shared session (pooling, rate
+# limits, metrics, cassettes), so only entry points should call it.
+def install_taskcluster_transport():
+    taskcluster.utils.makeSingleHttpRequest = _taskcluster_request
+
+
+# a taskcluster queue client (see install_taskcluster_transport()). one
+# client per root url is kept for the life of the process.
+def queue_client():
+    root_url = ROOT_URL
+    client = _queue_clients.get(root_url)
+    if client is None:
+        client = taskcluster.Queue(
+            {"rootUrl": root_url, "credentials": get_credentials()},
+            session=get_session(),
+        )
+        # another thread may have beaten us to it, keep the first
+        client = _queue_clients.setdefault(root_url, client)
+    return client
+
+
+# e.g. '.../api/queue/v1/task/<taskId>/status' -> 'status'
+def endpoint_name(url):
+    path = urlsplit(url).path
+    for pattern, template in ENDPOINT_PATTERNS:
+        if pattern.search(path):
+            return template
+    return "other"
+
+
+def _increment(key, amount=1):
+    with _lock:
+        _stats[key] += amount
+
+
+class CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        _increment("connections_created")
+        return super()._new_conn()
+
+
+class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        _increment("connections_created")
+        return super()._new_conn()
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    # counts new connections so we can tell how many requests reused one
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CountingHTTPConnectionPool,
+            "https": CountingHTTPSConnectionPool,
+        }
+
+
+class RateLimitedSession(requests.Session):
+    def request(self, method, url, *args, **kwargs):
+        endpoint = endpoint_name(url)
+        attempt = 0
+        # time spent waiting on the rate limiter isn't counted
+        latency = 0
+        while True:
+            rate_limiter = _rate_limiter
+            # replayed responses don't touch the network
+            if rate_limiter and not (_cassette and _cassette.replaying):
+                rate_limiter.acquire(endpoint)
+            start = time.monotonic()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except requests.exceptions.RequestException:
+                latency += time.monotonic() - start
+                http_metrics.record_request(
+                    endpoint, latency, retries=attempt, error=True
+                )
+                raise
+            latency += time.monotonic() - start
+            if response.status_code != 429 or attempt >= RATE_LIMITED_RETRIES:
+                self.record_response(endpoint, response, latency, attempt, kwargs)
+                return response
+            _increment("rate_limited")
+            delay = rate_limit.retry_after_seconds(response.headers.get("Retry-After"))
+            if delay is None:
+                delay = RATE_LIMITED_BACKOFF_FACTOR * (2**attempt)
+            if rate_limiter:
+                logger.warning(
+                    "rate limited on %s, pausing requests for %.1fs" % (endpoint, delay)
+                )
+                rate_limiter.pause(delay)
+            else:
+                logger.warning(
+                    "rate limited on %s, retrying in %.1fs" % (endpoint, delay)
+                )
+                time.sleep(delay)
+            attempt += 1
+
+    def record_response(self, endpoint, response, latency, attempts, kwargs):
+        bytes_received = 0
+        # don't consume streamed bodies
+        if not kwargs.get("stream"):
+            bytes_received = len(response.content)
+        # retries done by urllib3 (5xx, connection errors)
+        urllib3_retries = getattr(response.raw, "retries", None)
+        if urllib3_retries:
+            attempts += len(urllib3_retries.history)
+        http_metrics.record_request(
+            endpoint,
+            latency,
+            bytes_received=bytes_received,
+            retries=attempts,
+            error=response.status_code >= 400,
+        )
+
+
+# https://www.peterbe.com/plog/best-practice-with-retries-with-requests
+def create_session(
+    pool_size=DEFAULT_POOL_SIZE,
+    retries=3,
+    backoff_factor=0.3,
+    status_forcelist=(500, 502, 504),
+):
+    session = RateLimitedSession()
+    retry = Retry(
+        total=retries,
+        read=retries,
+        connect=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=status_forcelist,
+        # 429s are retried by RateLimitedSession, so every thread backs off
+        respect_retry_after_header=False,
+    )
+    adapter = PooledHTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    if _cassette:
+        adapter = cassette_module.CassetteAdapter(_cassette, adapter)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.hooks["response"].append(_count_request)
+    return session
+
+
+def _count_request(response, *args, **kwargs):
+    _increment("requests")
+
+
+def set_pool_size(pool_size):
+    # replaces the session if the size changes (existing connections are dropped)
+    global _session, _pool_size
+    with _lock:
+        if pool_size == _pool_size and _session:
+            return
+        _pool_size = pool_size
+        old_session = _session
+        _session = None
+    if old_session:
+        old_session.close()
+
+
+def get_session():
+    global _session
+    with _lock:
+        if not _session:
+            _session = create_session(pool_size=_pool_size)
+        return _session
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    # runs func once per key at a time, concurrent callers wait for that result
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, func):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self.calls[key] = call
+        if not leader:
+            _increment("coalesced")
+            call.done.wait()
+            if call.error:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result
+
+
+_single_flight = SingleFlight()
+
+
+def _request_key(url, params):
+    if params:
+        return (url, tuple(sorted(params.items())))
+    return (url, None)
+
+
+# responses may be shared between threads, callers shouldn't modify them
+def get(url, params=None, **kwargs):
+    return _single_flight.do(
+        _request_key(url, params),
+        lambda: get_session().get(url, params=params, **kwargs),
+    )
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+    stats["connections_reused"] = max(
+        stats["requests"] - stats["connections_created"], 0
+    )
+    stats["pool_size"] = _pool_size
+    return stats
+
+
+def reset_stats():
+    with _lock:
+        for key in _stats:
+            _stats[key] = 0
+
+
+def format_stats():
+    stats = get_stats()
+    return (
+        "http: %s requests, %s connections created, %s reused (pool size %s), %s coalesced, %s rate limited"
+        % (
+            stats["requests"],
+            stats["connections_created"],
+            stats["connections_reused"],
+            stats["pool_size"],
+            stats["coalesced"],
+            stats["rate_limited"],
+        )
+    )
@@ -0,0 +1,224 @@
+import argparse
+import http.server
+import json
+import threading
+import time
+
+import pytest
+import taskcluster.utils
+
+import http_metrics
+import tc_client
+
+
+class JSONHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = json.dumps({"path": self.path}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def local_server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), JSONHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:%s" % server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def fresh_client():
+    tc_client.set_pool_size(tc_client.DEFAULT_POOL_SIZE + 1)
+    tc_client.reset_stats()
+    yield tc_client
+    tc_client.set_pool_size(tc_client.DEFAULT_POOL_SIZE)
+    tc_client.reset_stats()
+
+
+def test_session_is_shared(fresh_client):
+    assert fresh_client.get_session() is fresh_client.get_session()
+
+
+def test_connections_are_reused(fresh_client, local_server):
+    for i in range(5):
+        response = fresh_client.get("%s/task/%s/status" % (local_server, i))
+        assert response.json() == {"path": "/task/%s/status" % i}
+    stats = fresh_client.get_stats()
+    assert stats["requests"] == 5
+    assert stats["connections_created"] == 1
+    assert stats["connections_reused"] == 4
+
+
+def test_set_pool_size_replaces_session(fresh_client):
+    session = fresh_client.get_session()
+    fresh_client.set_pool_size(42)
+    assert fresh_client.get_session() is not session
+    assert fresh_client.get_stats()["pool_size"] == 42
+
+
+def test_single_flight_coalesces_concurrent_calls(fresh_client):
+    single_flight = tc_client.SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow_fetch():
+        calls.append(1)
+        release.wait(timeout=5)
+        return {"pendingTasks": 7}
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(single_flight.do("key", slow_fetch))
+        )
+        for _i in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    # wait for the followers to queue up behind the leader
+    while fresh_client.get_stats()["coalesced"] < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{"pendingTasks": 7}] * 4
+
+
+def test_single_flight_shares_errors(fresh_client):
+    single_flight = tc_client.SingleFlight()
+
+    def failing_fetch():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        single_flight.do("key", failing_fetch)
+    # the failed call isn't remembered
+    assert single_flight.do("key", lambda: "ok") == "ok"
+
+
+def test_endpoint_name():
+    root = "https://firefox-ci-tc.services.mozilla.com/api/queue/v1"
+    assert tc_client.endpoint_name("%s/task/abc/status" % root) == "status"
+    assert (
+        tc_client.endpoint_name(
+            "%s/provisioners/proj-autophone/worker-types/gecko-t-bitbar-gw-perf-p2/workers?limit=5"
+            % root
+        )
+        == "listWorkers"
+    )
+    assert (
+        tc_client.endpoint_name(
+            "%s/provisioners/p/worker-types/wt/workers/bitbar/pixel2-05" % root
+        )
+        == "getWorker"
+    )
+    assert tc_client.endpoint_name("%s/pending/p/wt" % root) == "pendingTasks"
+    assert tc_client.endpoint_name("https://hooks.slack.com/services/x") == "other"
+
+
+class RateLimitedHandler(JSONHandler):
+    requests_seen = 0
+
+    def do_GET(self):
+        RateLimitedHandler.requests_seen += 1
+        if RateLimitedHandler.requests_seen == 1:
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        super().do_GET()
+
+
+def test_rate_limited_requests_are_retried(fresh_client):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RateLimitedHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = "http://127.0.0.1:%s/pending/p/wt" % server.server_address[1]
+        response = fresh_client.get(url)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert response.status_code == 200
+    assert fresh_client.get_stats()["rate_limited"] == 1
+
+
+def test_requests_are_recorded_per_endpoint(fresh_client, local_server):
+    http_metrics.reset()
+    fresh_client.get("%s/task/abc/status" % local_server)
+    fresh_client.get("%s/task/def/status" % local_server)
+    m = http_metrics.snapshot()["status"]
+    assert m.calls == 2
+    assert m.bytes_received > 0
+    assert m.errors == 0
+    http_metrics.reset()
+
+
+def test_credentials_and_queue_client_are_loaded_once(tmp_path, monkeypatch):
+    token = tmp_path / "tc_token"
+    token.write_text(json.dumps({"clientId": "me", "accessToken": "secret"}))
+    monkeypatch.setattr(tc_client, "CREDENTIALS_FILE", str(token))
+    monkeypatch.setattr(tc_client, "_credentials", None)
+    monkeypatch.setattr(tc_client, "_queue_clients", {})
+
+    assert tc_client.get_credentials() == {"clientId": "me", "accessToken": "secret"}
+    token.unlink()
+    # not read again
+    assert tc_client.get_credentials()["clientId"] == "me"
+    assert tc_client.queue_client() is tc_client.queue_client()
+
+
+def test_parse_rate_limits():
+    assert tc_client.parse_rate_limits("") == ({}, None)
+    assert tc_client.parse_rate_limits("0") == ({}, None)
+    assert tc_client.parse_rate_limits("60") == ({}, (60, 60))
+    assert tc_client.parse_rate_limits("60, status=50,listWorkers=10") == (
+        {"status": (50, 50), "listWorkers": (10, 10)},
+        (60, 60),
+    )
+    with pytest.raises(ValueError):
+        tc_client.parse_rate_limits("fast")
+    with pytest.raises(ValueError):
+        tc_client.parse_rate_limits("60,status")
+
+
+def test_rate_limits_are_off_unless_configured(monkeypatch):
+    monkeypatch.setattr(tc_client, "_rate_limiter", None)
+    monkeypatch.delenv(tc_client.RATE_LIMIT_ENV, raising=False)
+    parser = argparse.ArgumentParser()
+    tc_client.add_arguments(parser)
+
+    tc_client.from_args(parser.parse_args([]))
+    assert tc_client._rate_limiter is None
+    monkeypatch.setenv(tc_client.RATE_LIMIT_ENV, "60")
+    tc_client.from_args(parser.parse_args([]))
+    assert tc_client._rate_limiter.process_bucket.rate == 60
+    # the argument wins over the environment
+    tc_client.from_args(parser.parse_args(["--rate-limit", "5,status=2"]))
+    assert tc_client._rate_limiter.process_bucket.rate == 5
+    assert tc_client._rate_limiter.bucket("status").rate == 2
+    assert tc_client._rate_limiter.bucket("listWorkers") is None
+    tc_client.from_args(parser.parse_args(["--rate-limit", "0"]))
+    assert tc_client._rate_limiter is None
+
+
+def test_taskcluster_transport_is_installed_explicitly(monkeypatch):
+    original = taskcluster.utils.makeSingleHttpRequest
+    monkeypatch.setattr(taskcluster.utils, "makeSingleHttpRequest", original)
+    tc_client.queue_client()
+    assert taskcluster.utils.makeSingleHttpRequest is original
+    tc_client.install_taskcluster_transport()
+    assert taskcluster.utils.makeSingleHttpRequest is tc_client._taskcluster_request
@@ -0,0 +1,68 @@
+import datetime
+import functools
+import time
+
+import pendulum
+
+# taskcluster timestamps in the fitness and worker health hot loops
+#
+# - parse() reads taskcluster's iso 8601 timestamps ('2020-01-01T12:34:56.789Z')
+#   into epoch seconds with datetime.fromisoformat (about 20x faster than
+#   pendulum.parse). other formats fall back to pendulum.
+# - loops compare epoch seconds against one now() taken per cycle
+# - pendulum is only used for display (to_datetime() and format_ago())
+
+# format_ago() caches pendulum's wording up to this age (past it, the wording
+# depends on the calendar). under a minute the wording changes by the second,
+# after that by the minute, so the cache holds at most 60 + 28 * 1440 entries.
+FORMAT_AGO_CACHE_SECONDS = 28 * 24 * 60 * 60
+_EPOCH = datetime.datetime(1970, 1, 1)
+_FORMAT_AGO_BASE = pendulum.datetime(2000, 1, 1, tz="UTC")
+
+
+def now():
+    return time.time()
+
+
+# returns epoch seconds
+def parse(timestamp):
+    try:
+        if timestamp.endswith("Z"):
+            # fromisoformat only accepts 'Z' from python 3.11. naive utc
+            # arithmetic is cheaper than .timestamp().
+            dt = datetime.datetime.fromisoformat(timestamp[:-1])
+            return (dt - _EPOCH).total_seconds()
+        dt = datetime.datetime.fromisoformat(timestamp)
+        if dt.tzinfo is None:
+            return (dt - _EPOCH).total_seconds()
+        return dt.timestamp()
+    except (TypeError, ValueError):
+        # e.g. no 'T' separator before python 3.11, or an offset and a 'Z'
+        return pendulum.parse(timestamp).timestamp()
+
+
+# whole minutes between two epochs, like pendulum's diff().in_minutes()
+def minutes_between(a, b):
+    return int(abs(a - b) // 60)
+
+
+# for display (fitness results carry pendulum DateTimes)
+def to_datetime(epoch):
+    # cheaper than pendulum.from_timestamp()
+    return pendulum.DateTime.fromtimestamp(epoch, pendulum.UTC)
+
+
+@functools.lru_cache(maxsize=None)
+def _format_seconds_ago(seconds):
+    return _FORMAT_AGO_BASE.add(seconds=seconds).diff_for_humans(_FORMAT_AGO_BASE, True)
+
+
+# e.g. '14 minutes', the same as pendulum's absolute diff_for_humans()
+# then: a datetime, now: epoch seconds (default is the current time)
+def format_ago(then, now=None):
+    seconds = int(abs((now or time.time()) - then.timestamp()))
+    if seconds <= FORMAT_AGO_CACHE_SECONDS:
+        if seconds >= 60:
+            seconds -= seconds % 60
+        return _format_seconds_ago(seconds)
+    return pendulum.from_timestamp(now or time.time()).diff_for_humans(then, True)
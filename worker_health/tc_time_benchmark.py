@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime
+import random
+import timeit
+
+import pendulum
+
+import tc_time
+
+# compares pendulum with tc_time in the timestamp hot loops, per fleet size:
+#   - last started: parse every run's 'started' and keep the newest
+#     (fitness count_device_tasks, 10 tasks per worker)
+#   - tardy check: minutes since each worker's last started
+#     (worker_health calculate_missing_workers_from_tc)
+#   - formatting: the 'ls' column of every row (fitness sr_dict_format)
+
+
+def tc_timestamp(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.") + "%03dZ" % (dt.microsecond // 1000)
+
+
+def make_fleet(workers, tasks_per_worker=10):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    fleet = []
+    for _i in range(workers):
+        started = [
+            tc_timestamp(now - datetime.timedelta(seconds=random.randint(0, 86400)))
+            for _j in range(tasks_per_worker)
+        ]
+        fleet.append(started)
+    return fleet
+
+
+def last_started_pendulum(fleet):
+    for started in fleet:
+        last = None
+        for timestamp in started:
+            dt = pendulum.parse(timestamp)
+            if last is None or dt > last:
+                last = dt
+
+
+def last_started_tc_time(fleet):
+    for started in fleet:
+        last = None
+        for timestamp in started:
+            epoch = tc_time.parse(timestamp)
+            if last is None or epoch > last:
+                last = epoch
+        tc_time.to_datetime(last)
+
+
+def tardy_pendulum(fleet):
+    for started in fleet:
+        now_dt = pendulum.now(tz="UTC")
+        now_dt.diff(pendulum.parse(started[-1])).in_minutes()
+
+
+def tardy_tc_time(fleet):
+    now = tc_time.now()
+    for started in fleet:
+        tc_time.minutes_between(now, tc_time.parse(started[-1]))
+
+
+def format_pendulum(last_started):
+    for dt in last_started:
+        pendulum.now(tz="UTC").diff_for_humans(dt, True)
+
+
+def format_tc_time(last_started):
+    now = tc_time.now()
+    for dt in last_started:
+        tc_time.format_ago(dt, now)
+
+
+def measure(func, data, number):
+    return min(timeit.repeat(lambda: func(data), number=number, repeat=3)) / number
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="compare pendulum and tc_time in the timestamp hot loops."
+    )
+    parser.add_argument(
+        "-s",
+        "--sizes",
+        default="50,500,2000,10000",
+        help="comma separated fleet sizes (default is 50,500,2000,10000).",
+    )
+    parser.add_argument(
+        "-n",
+        "--number",
+        default=3,
+        type=int,
+        help="runs per timing round (default is 3).",
+    )
+    args = parser.parse_args()
+
+    random.seed(0)
+    print(
+        "%8s  %-14s %12s %12s %8s"
+        % ("workers", "loop", "pendulum", "tc_time", "speedup")
+    )
+    for size in [int(s) for s in args.sizes.split(",")]:
+        fleet = make_fleet(size)
+        last_started = [pendulum.parse(max(started)) for started in fleet]
+        loops = [
+            ("last started", last_started_pendulum, last_started_tc_time, fleet),
+            ("tardy check", tardy_pendulum, tardy_tc_time, fleet),
+            ("formatting", format_pendulum, format_tc_time, last_started),
+        ]
+        for name, before, after, data in loops:
+            before_seconds = measure(before, data, args.number)
+            after_seconds = measure(after, data, args.number)
+            print(
+                "%8s  %-14s %10.2f ms %10.2f ms %7.1fx"
+                % (
+                    size,
+                    name,
+                    before_seconds * 1000,
+                    after_seconds * 1000,
+                    before_seconds / after_seconds,
+                )
+            )
@@ -0,0 +1,48 @@
+import random
+
+import pendulum
+import pytest
+
+import tc_time
+
+
+@pytest.mark.parametrize(
+    "timestamp",
+    [
+        "2020-01-01T12:34:56.789Z",
+        "2020-01-01T12:34:56Z",
+        "2020-01-01T12:34:56.789000+00:00",
+        "2020-01-01T13:34:56.789+01:00",
+        # str() of a datetime (fitness_daemon.py's json)
+        "2020-01-01 12:34:56.789000+00:00",
+    ],
+)
+def test_parse_matches_pendulum(timestamp):
+    assert tc_time.parse(timestamp) == pytest.approx(
+        pendulum.parse(timestamp).timestamp()
+    )
+
+
+def test_minutes_between():
+    started = tc_time.parse("2020-01-01T12:00:30.000Z")
+    assert tc_time.minutes_between(started + 95 * 60 + 29, started) == 95
+    assert tc_time.minutes_between(started, started + 61) == 1
+
+
+def test_to_datetime():
+    dt = tc_time.to_datetime(tc_time.parse("2020-01-01T12:34:56.789Z"))
+    assert isinstance(dt, pendulum.DateTime)
+    assert dt == pendulum.parse("2020-01-01T12:34:56.789Z")
+
+
+def test_format_ago_matches_pendulum():
+    rng = random.Random(0)
+    now = pendulum.now(tz="UTC")
+    for _i in range(500):
+        seconds = rng.choice(
+            [rng.uniform(0, 120), rng.uniform(0, 86400), rng.uniform(0, 60 * 86400)]
+        )
+        then = now.subtract(seconds=seconds)
+        assert tc_time.format_ago(then, now.timestamp()) == now.diff_for_humans(
+            then, True
+        )
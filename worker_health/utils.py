@@ -1,9 +1,11 @@
-import json
 import logging
 import pprint
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
+import fast_json
+import http_metrics
+import tc_client
 
 logger = logging.getLogger(__name__)
 
@@ -36,25 +38,31 @@ def list_intersection(lst1, lst2):
     return list(set(lst1) & set(lst2))
 
 
-# handles continuationToken
-def get_jsonc(an_url, verbosity=0):
-    output_dict = {}
+# fetches one page, retrying on json decode errors. returns {} on failure.
+def get_json_page(an_url, continuation_token=None, verbosity=0):
     headers = {"User-Agent": USER_AGENT_STRING}
+    payload = None
+    if continuation_token:
+        payload = {"continuationToken": continuation_token}
     retries_allowed = 2
     retries_left = retries_allowed
 
     while retries_left >= 0:
         if verbosity > 2:
-            print(an_url)
-        response = requests.get(an_url, headers=headers)
-        result = response.text
+            if continuation_token:
+                print("CONT %s, %s" % (an_url, continuation_token))
+            else:
+                print(an_url)
+        response = tc_client.get(an_url, headers=headers, params=payload)
         try:
-            output = json.loads(result)
+            output = fast_json.loads(response.content)
             # will only break on good decode
             break
-        except json.decoder.JSONDecodeError as e:
+        except fast_json.JSONDecodeError as e:
+            http_metrics.record_decode_failure(tc_client.endpoint_name(an_url))
             logger.warning(
-                "get_jsonc: '%s': json decode error. input: %s" % (an_url, result)
+                "get_jsonc: '%s': json decode error. input: %s"
+                % (an_url, response.text)
             )
             logger.warning(e)
             if retries_left == 0:
@@ -62,26 +70,54 @@ def get_jsonc(an_url, verbosity=0):
                     "get_jsonc: '%s': failed %s times, returning empty"
                     % (an_url, retries_allowed + 1)
                 )
-                return output_dict
+                return {}
         retries_left -= 1
-    output_dict = output
 
     if verbosity > 2:
-        pprint.pprint(output_dict)
+        pprint.pprint(output)
+    return output
 
-    while "continuationToken" in output:
-        payload = {"continuationToken": output["continuationToken"]}
-        if verbosity > 2:
-            print("CONT %s, %s" % (an_url, output["continuationToken"]))
-        response = requests.get(an_url, headers=headers, params=payload)
-        result = response.text
-        # TODO: handle exceptions here also
-        output = json.loads(result)
-        # tc messes with us and sends back and empty workers array
-        if "workers" in output and len(output["workers"]):
-            # THIS IS SQUASHING STUFF
-            output_dict.update(output)
 
-    if verbosity > 2:
-        pprint.pprint(output_dict)
+# yields each page of a continuationToken endpoint
+# - fetch_page(continuation_token) returns a page (token is None for the first)
+# - the next page is fetched in the background while the caller works on
+#   the current one, and only two pages are held at a time
+def paginate(fetch_page):
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        page = fetch_page(None)
+        while page:
+            next_page = None
+            if page.get("continuationToken"):
+                next_page = executor.submit(fetch_page, page["continuationToken"])
+            yield page
+            page = next_page.result() if next_page else None
+
+
+# yields the items in each page's list_key (e.g. 'workers') as pages arrive
+def iter_jsonc(an_url, list_key, verbosity=0):
+    pages = paginate(lambda token: get_json_page(an_url, token, verbosity))
+    for page in pages:
+        # tc messes with us and sometimes sends back an empty workers array
+        for item in page.get(list_key, []):
+            yield item
+
+
+# combines pages into one dict, lists (e.g. 'workers') are concatenated
+def merge_pages(pages):
+    output_dict = {}
+    for page in pages:
+        for key, value in page.items():
+            if isinstance(value, list) and isinstance(output_dict.get(key), list):
+                output_dict[key].extend(value)
+            elif isinstance(value, list):
+                # copy, so extending it doesn't modify the page
+                output_dict[key] = list(value)
+            else:
+                output_dict[key] = value
+    output_dict.pop("continuationToken", None)
     return output_dict
+
+
+# handles continuationToken
+def get_jsonc(an_url, verbosity=0):
+    return merge_pages(paginate(lambda token: get_json_page(an_url, token, verbosity)))
@@ -0,0 +1,58 @@
+import threading
+
+import utils
+
+PAGES = {
+    None: {
+        "workers": [{"workerId": "w1"}, {"workerId": "w2"}],
+        "continuationToken": "a",
+    },
+    "a": {"workers": [], "continuationToken": "b"},
+    "b": {"workers": [{"workerId": "w3"}]},
+}
+
+
+def test_paginate_follows_continuation_tokens():
+    tokens = []
+
+    def fetch_page(token):
+        tokens.append(token)
+        return PAGES[token]
+
+    pages = list(utils.paginate(fetch_page))
+    assert pages == [PAGES[None], PAGES["a"], PAGES["b"]]
+    assert tokens == [None, "a", "b"]
+
+
+def test_paginate_prefetches_next_page():
+    second_page_requested = threading.Event()
+
+    def fetch_page(token):
+        if token == "a":
+            second_page_requested.set()
+        return PAGES[token]
+
+    pages = utils.paginate(fetch_page)
+    next(pages)
+    # the second page is requested while the caller holds the first
+    assert second_page_requested.wait(timeout=5)
+    pages.close()
+
+
+def test_paginate_stops_on_failed_page():
+    assert list(utils.paginate(lambda token: {})) == []
+
+
+def test_merge_pages_keeps_every_page():
+    merged = utils.merge_pages([PAGES[None], PAGES["a"], PAGES["b"]])
+    assert merged == {
+        "workers": [{"workerId": "w1"}, {"workerId": "w2"}, {"workerId": "w3"}]
+    }
+
+
+def test_iter_jsonc(monkeypatch):
+    monkeypatch.setattr(
+        utils, "get_json_page", lambda an_url, token, verbosity: PAGES[token]
+    )
+    worker_ids = [w["workerId"] for w in utils.iter_jsonc("url", "workers")]
+    assert worker_ids == ["w1", "w2", "w3"]
@@ -0,0 +1,77 @@
+import bisect
+import math
+
+# classifies a FleetSnapshot's configured workers in one pass, for
+# WorkerHealth.calculate_missing_workers_from_tc()
+#
+# - uses the snapshot's indexes (quarantined and known workers as sets, last
+#   started times parsed once and sorted)
+# - the tardy workers of the whole fleet are two bisects of the sorted last
+#   started times, the rest is set operations per queue
+# - a worker can be in more than one class (e.g. quarantined and tardy)
+#
+# classes:
+#   missing: configured, but without a last started time from taskcluster
+#   tardy: its latest task started at least limit minutes ago
+#   quarantined: quarantined in taskcluster
+#   new: listed by taskcluster, but without a started task yet
+
+
+class QueueClasses:
+    def __init__(self, workers, reliable, missing, tardy, quarantined, new):
+        # the configured workers, in devicepool's order
+        self.workers = workers
+        # missing and tardy only mean something if the queue has more jobs
+        # than workers
+        self.reliable = reliable
+        self.missing = missing
+        self.tardy = tardy
+        self.quarantined = quarantined
+        self.new = new
+
+    # the queue's entry of calculate_missing_workers_from_tc() (a quarantined
+    # worker is a problem even in an unreliable queue, unless excluded)
+    def problem_workers(self, exclude_quarantined=False):
+        if self.reliable:
+            if exclude_quarantined:
+                problems = self.missing | (self.tardy - self.quarantined)
+            else:
+                problems = self.missing | self.tardy | self.quarantined
+        elif exclude_quarantined:
+            return []
+        else:
+            problems = self.quarantined
+        if not problems:
+            return []
+        return [worker for worker in self.workers if worker in problems]
+
+
+# the workers whose latest task started at least limit minutes from the
+# snapshot's now (like tc_time.minutes_between(now, started) >= limit)
+def tardy_workers(snapshot, limit):
+    seconds = math.ceil(limit) * 60
+    epochs = snapshot.started_epochs
+    workers = snapshot.started_workers
+    # started long ago, or (clocks) far in the future
+    old = bisect.bisect_right(epochs, snapshot.now - seconds)
+    future = bisect.bisect_left(epochs, snapshot.now + seconds, lo=old)
+    return frozenset(workers[:old] + workers[future:])
+
+
+# returns {queue: QueueClasses}
+def classify(snapshot, limit):
+    tardy = tardy_workers(snapshot, limit)
+    results = {}
+    for queue, configured in snapshot.devicepool_queues_and_workers.items():
+        workers = frozenset(configured)
+        jobs = snapshot.tc_queue_counts[queue]
+        results[queue] = QueueClasses(
+            configured,
+            # not empty, and not more workers than jobs
+            jobs != 0 and jobs >= len(configured),
+            workers - snapshot.known_workers,
+            workers & tardy,
+            workers & snapshot.quarantined_set,
+            workers & snapshot.new_workers,
+        )
+    return results
@@ -0,0 +1,60 @@
+import pytest
+
+import fleet_snapshot
+import missing_workers_benchmark
+import tc_time
+import worker_classifier
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("limit", [0, 30, 95, 95.5, 1000])
+def test_matches_the_loop(seed, limit):
+    snapshot = missing_workers_benchmark.make_snapshot(
+        500, workers_per_queue=7, seed=seed
+    )
+    for exclude in (False, True):
+        assert missing_workers_benchmark.classifier_calculate(
+            snapshot, limit, exclude
+        ) == missing_workers_benchmark.loop_calculate(snapshot, limit, exclude)
+
+
+def test_classes():
+    now = tc_time.parse("2020-01-01T12:00:00.000Z")
+    last_started = {
+        # exactly 95 minutes ago
+        "tardy": "2020-01-01T10:25:00.000Z",
+        "recent": "2020-01-01T10:25:00.001Z",
+        "future": "2020-01-01T13:40:00.000Z",
+        "new": None,
+        "quarantined": "2020-01-01T11:00:00.000Z",
+    }
+    workers = list(last_started) + ["missing"]
+    snapshot = fleet_snapshot.FleetSnapshot(
+        now,
+        now,
+        devicepool_queues_and_workers={"busy": workers, "idle": workers},
+        devicepool_project_to_tc_worker_type={},
+        devicepool_offline_workers={},
+        tc_queue_counts={"busy": 100, "idle": 0},
+        tc_current_worker_types=[],
+        tc_workers={},
+        tc_current_worker_last_started=last_started,
+        quarantined_workers=["quarantined"],
+    )
+    classes = worker_classifier.classify(snapshot, 95)
+    busy = classes["busy"]
+    assert busy.reliable
+    assert busy.missing == {"missing"}
+    assert busy.tardy == {"tardy", "future"}
+    assert busy.quarantined == {"quarantined"}
+    assert busy.new == {"new"}
+    assert busy.problem_workers() == ["tardy", "future", "quarantined", "missing"]
+    assert busy.problem_workers(exclude_quarantined=True) == [
+        "tardy",
+        "future",
+        "missing",
+    ]
+    idle = classes["idle"]
+    assert not idle.reliable
+    assert idle.problem_workers() == ["quarantined"]
+    assert idle.problem_workers(exclude_quarantined=True) == []
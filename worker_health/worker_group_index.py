@@ -0,0 +1,118 @@
+import os
+import sqlite3
+import threading
+import time
+
+# persistent index of (provisioner, workerType, workerId) -> workerGroup
+#
+# - getWorker (and quarantineWorker) need the worker's group, which only
+#   listWorkers has. with the group in the index, a single worker is one
+#   getWorker request.
+# - every listWorkers pass that goes through update() (fitness queue and
+#   provisioner modes, fitness_daemon.py's refreshes) refreshes the worker
+#   type's groups and last seen times
+# - lookup() refreshes the worker type on a miss, or when the caller found the
+#   entry stale (e.g. getWorker 404s because the worker moved groups)
+# - entries not seen for MAX_AGE_SECONDS are dropped
+
+INDEX_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "worker_health", "worker_groups.sqlite3"
+)
+MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+
+
+class WorkerGroupIndex:
+    def __init__(self, path=INDEX_PATH, max_age=MAX_AGE_SECONDS, enabled=True):
+        self.path = path
+        self.max_age = max_age
+        self.enabled = enabled
+        # lookups answered by the index vs by a listWorkers pass
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connection = None
+        if self.enabled:
+            self.open()
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # shared by the fitness thread pools, access is serialized by self.lock
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS workers ("
+                "provisioner TEXT NOT NULL, worker_type TEXT NOT NULL, "
+                "worker_id TEXT NOT NULL, worker_group TEXT NOT NULL, "
+                "last_seen REAL NOT NULL, "
+                "PRIMARY KEY (provisioner, worker_type, worker_id))"
+            )
+        self.prune()
+
+    def prune(self, now=None):
+        now = now or time.time()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM workers WHERE last_seen < ?", (now - self.max_age,)
+            )
+
+    # returns the worker's group, None if it isn't indexed
+    def get(self, provisioner, worker_type, worker_id):
+        if not self.enabled:
+            return None
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT worker_group FROM workers "
+                "WHERE provisioner = ? AND worker_type = ? AND worker_id = ?",
+                (provisioner, worker_type, worker_id),
+            ).fetchone()
+        return row[0] if row else None
+
+    # workers: listWorkers records (workerId and workerGroup are used)
+    def update(self, provisioner, worker_type, workers, now=None):
+        if not self.enabled:
+            return
+        now = now or time.time()
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO workers VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        provisioner,
+                        worker_type,
+                        worker["workerId"],
+                        worker["workerGroup"],
+                        now,
+                    )
+                    for worker in workers
+                ],
+            )
+
+    # returns the worker's group, None if listWorkers doesn't have the worker
+    # - list_workers(provisioner, worker_type) returns listWorkers records, it's
+    #   only called on a miss (or with refresh)
+    def lookup(self, provisioner, worker_type, worker_id, list_workers, refresh=False):
+        if not refresh:
+            worker_group = self.get(provisioner, worker_type, worker_id)
+            if worker_group:
+                with self.lock:
+                    self.hits += 1
+                return worker_group
+        with self.lock:
+            self.misses += 1
+        workers = list(list_workers(provisioner, worker_type))
+        self.update(provisioner, worker_type, workers)
+        for worker in workers:
+            if worker["workerId"] == worker_id:
+                return worker["workerGroup"]
+        return None
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+    def format_stats(self):
+        return "worker group index: %s hits, %s misses (listWorkers passes)" % (
+            self.hits,
+            self.misses,
+        )
@@ -0,0 +1,53 @@
+import pytest
+
+import worker_group_index
+
+
+@pytest.fixture
+def index(tmp_path):
+    i = worker_group_index.WorkerGroupIndex(
+        path=str(tmp_path / "groups.sqlite3"), max_age=3600
+    )
+    yield i
+    i.close()
+
+
+def test_lookup_lists_workers_on_a_miss(index):
+    listed = []
+
+    def list_workers(provisioner, worker_type):
+        listed.append((provisioner, worker_type))
+        return [
+            {"workerId": "w1", "workerGroup": "g1"},
+            {"workerId": "w2", "workerGroup": "g2"},
+        ]
+
+    assert index.lookup("p", "wt", "w2", list_workers) == "g2"
+    assert index.lookup("p", "wt", "w1", list_workers) == "g1"
+    assert listed == [("p", "wt")]
+    assert (index.hits, index.misses) == (1, 1)
+
+    # unknown workers and stale entries go back to listWorkers
+    assert index.lookup("p", "wt", "w3", list_workers) is None
+    assert index.lookup("p", "wt", "w1", list_workers, refresh=True) == "g1"
+    assert len(listed) == 3
+    # other worker types aren't mixed up
+    assert index.get("p", "other", "w1") is None
+
+
+def test_entries_age_out(index):
+    index.update("p", "wt", [{"workerId": "w1", "workerGroup": "g1"}], now=1000)
+    index.update("p", "wt", [{"workerId": "w1", "workerGroup": "g9"}], now=2000)
+    assert index.get("p", "wt", "w1") == "g9"
+    index.prune(now=2000 + 3601)
+    assert index.get("p", "wt", "w1") is None
+
+
+def test_disabled_index_still_answers(tmp_path):
+    index = worker_group_index.WorkerGroupIndex(
+        path=str(tmp_path / "groups.sqlite3"), enabled=False
+    )
+    workers = [{"workerId": "w1", "workerGroup": "g1"}]
+    assert index.lookup("p", "wt", "w1", lambda _p, _wt: workers) == "g1"
+    assert index.get("p", "wt", "w1") is None
+    assert not (tmp_path / "groups.sqlite3").exists()
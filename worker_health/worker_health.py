@@ -3,16 +3,22 @@ import getpass
 import logging
 import os
 import pprint
-import re
 import shutil
 import subprocess
 import sys
 import time
+from multiprocessing.pool import ThreadPool
 
-import pendulum
 import yaml
 
+import fleet_snapshot
+import journal_reader
+import phase_profiler
+import task_status_cache
+import tc_client
+import tc_time
 import utils
+import worker_classifier
 
 # log_format = '%(asctime)s %(levelname)-10s %(funcName)s: %(message)s'
 log_format = "%(levelname)-10s %(funcName)s: %(message)s"
@@ -23,6 +29,9 @@ logger = logging.getLogger()
 REPO_UPDATE_SECONDS = 300
 MAX_WORKER_TYPES = 50
 MAX_WORKER_COUNT = 50
+# set_current_workers() fetches worker lists and latest task statuses concurrently
+WORKER_TYPE_THREAD_COUNT = 4
+TASK_STATUS_THREAD_COUNT = 16
 USER_AGENT_STRING = "Python (https://github.com/mozilla-platform-ops/android-tools/tree/master/worker_health)"
 
 
@@ -40,7 +49,13 @@ class NonZeroExit(Exception):
 
 
 class WorkerHealth:
-    def __init__(self, verbosity=0):
+    def __init__(
+        self,
+        verbosity=0,
+        task_cache=True,
+        devicepool_config_path=None,
+        snapshot_ttl=fleet_snapshot.SNAPSHOT_TTL_SECONDS,
+    ):
         username = getpass.getuser()
         self.devicepool_client_dir = os.path.join(
             "/", "tmp", ("worker_health.%s" % username), "mozilla-bitbar-devicepool"
@@ -69,16 +84,44 @@ class WorkerHealth:
         # TODO: store these
         self.problem_workers = {}
         self.quarantined_workers = []
+        # from journalctl (empty if the bitbar service isn't present)
+        self.devicepool_offline_workers = {}
+        # read incrementally, each call only reads the new journal entries
+        self.journal_reader = journal_reader.JournalReader()
+        self.journal_offline_workers = journal_reader.OfflineWorkers()
+        # a journal_reader.JournalFollower after follow_journal()
+        self.journal_follower = None
+        self.task_status_cache = task_status_cache.TaskStatusCache(enabled=task_cache)
+        # one tc_time.now() per gather_data(), for the tardy worker checks
+        self.now = None
+        # the latest fleet_snapshot.FleetSnapshot (see get_snapshot())
+        self.snapshot = None
+        self.snapshot_ttl = snapshot_ttl
+        # update the devicepool checkout before gathering (vs a given config)
+        self.manage_devicepool_repo = not devicepool_config_path
+        # size the shared http pool for set_current_workers()' thread pools
+        tc_client.set_pool_size(
+            max(
+                WORKER_TYPE_THREAD_COUNT + TASK_STATUS_THREAD_COUNT,
+                tc_client.get_stats()["pool_size"],
+            )
+        )
 
         if verbosity == 1:
             logger.setLevel(logging.INFO)
         if verbosity == 2:
             logger.setLevel(logging.DEBUG)
 
-        # clone or update repo
-        self.clone_or_update(self.devicepool_git_clone_url, self.devicepool_client_dir)
-        # pick devicepool config file path
-        self.set_devicepool_configuration_path()
+        if devicepool_config_path:
+            # use the given config file (e.g. from fake_tc_queue.py)
+            self.devicepool_config_yaml_path = devicepool_config_path
+        else:
+            # clone or update repo
+            self.clone_or_update(
+                self.devicepool_git_clone_url, self.devicepool_client_dir
+            )
+            # pick devicepool config file path
+            self.set_devicepool_configuration_path()
 
     def run_cmd(self, cmd):
         return (
@@ -219,9 +262,9 @@ class WorkerHealth:
         # get the queues with data
         # https://queue.taskcluster.net/v1/provisioners/proj-autophone/worker-types?limit=100
         url = (
-            "https://firefox-ci-tc.services.mozilla.com/api/queue/v1/provisioners/%s/worker-types/?limit=%s"
+            "%s/provisioners/%s/worker-types/?limit=%s"
             # "https://queue.taskcluster.net/v1/provisioners/proj-autophone/worker-types?limit=%s"
-            % ("proj-autophone", MAX_WORKER_TYPES)
+            % (tc_client.queue_url(), "proj-autophone", MAX_WORKER_TYPES)
         )
         json_1 = utils.get_jsonc(url, self.verbosity)
         for item in json_1["workerTypes"]:
@@ -229,104 +272,143 @@ class WorkerHealth:
 
     # gets and sets the devices working in each queue
     def set_current_workers(self):
+        # the worker lists and their latest tasks' statuses are fetched
+        # concurrently (a worker type's statuses as soon as its list arrives),
+        # then recorded in worker type and worker order, like a sequential run
+        workers = {}
+        # {task id: AsyncResult}
+        statuses = {}
+        # the task ids get_latest_task_status() fetched (vs found in the cache)
+        fetched = set()
+        with ThreadPool(TASK_STATUS_THREAD_COUNT) as task_pool:
+            with ThreadPool(WORKER_TYPE_THREAD_COUNT) as worker_type_pool:
+                for item, item_workers in worker_type_pool.imap_unordered(
+                    self.get_current_workers, self.tc_current_worker_types
+                ):
+                    workers[item] = item_workers
+                    for worker in item_workers:
+                        if "latestTask" not in worker:
+                            continue
+                        task_id = worker["latestTask"]["taskId"]
+                        if task_id not in statuses:
+                            statuses[task_id] = task_pool.apply_async(
+                                self.get_latest_task_status, (task_id, fetched)
+                            )
+            for item in self.tc_current_worker_types:
+                self.tc_workers[item] = []
+                for worker in workers[item]:
+                    json_result2 = None
+                    if "latestTask" in worker:
+                        json_result2 = statuses[worker["latestTask"]["taskId"]].get()
+                    self.set_current_worker(item, worker, json_result2)
+        # the fetched statuses are cached in one transaction
+        self.task_status_cache.put_many(
+            (task_id, result.get())
+            for task_id, result in statuses.items()
+            if task_id in fetched
+        )
+
+    # returns (worker type, its workers)
+    def get_current_workers(self, item):
         # get the workers and count of workers
         # https://queue.taskcluster.net/v1/provisioners/proj-autophone/worker-types/gecko-t-ap-unit-p2/workers?limit=15
-        for item in self.tc_current_worker_types:
-            url = (
-                "https://firefox-ci-tc.services.mozilla.com/api/queue/v1/provisioners/%s/worker-types/%s/workers?limit=%s"
-                # "https://queue.taskcluster.net/v1/provisioners/proj-autophone/worker-types/%s/workers?limit=%s"
-                % ("proj-autophone", item, MAX_WORKER_COUNT)
+        url = (
+            "%s/provisioners/%s/worker-types/%s/workers?limit=%s"
+            # "https://queue.taskcluster.net/v1/provisioners/proj-autophone/worker-types/%s/workers?limit=%s"
+            % (tc_client.queue_url(), "proj-autophone", item, MAX_WORKER_COUNT)
+        )
+        if self.verbosity > 2:
+            print("")
+            print("%s (%s)" % (item, url))
+
+        retries_left = 2
+        # tc can sometimes return empty results for this query, retry a few times
+        while True:
+            workers = list(utils.iter_jsonc(url, "workers", self.verbosity))
+            if workers or retries_left == 0:
+                # if not workers:
+                #     logger.warning(
+                #         "no workers in %s... strange. let aerickson know if it continues"
+                #         % item
+                #     )
+                #     logger.warning(url)
+                return item, workers
+            retries_left = retries_left - 1
+
+    # adds task_id to fetched if it wasn't cached (the caller caches it)
+    def get_latest_task_status(self, task_id, fetched):
+        json_result2 = self.task_status_cache.get(task_id)
+        if json_result2 is None:
+            an_url = (
+                "%s/task/%s/status"
+                # "https://queue.taskcluster.net/v1/task/%s/status"
+                % (tc_client.queue_url(), task_id)
             )
-            json_result = utils.get_jsonc(url, self.verbosity)
-            if self.verbosity > 2:
-                print("")
-                print("%s (%s)" % (item, url))
-                self.pp.pprint(json_result)
-
-            retries_left = 2
-            # tc can sometimes return empty results for this query, retry a few times
-            while json_result["workers"] == []:
-                json_result = utils.get_jsonc(url, self.verbosity)
-                retries_left = retries_left - 1
-                if retries_left == 0:
-                    break
-
-            # if json_result["workers"] == []:
-            #     logger.warning(
-            #         "no workers in %s... strange. let aerickson know if it continues"
-            #         % item
-            #     )
-            #     logger.warning(url)
-
-            self.tc_workers[item] = []
-            for worker in json_result["workers"]:
-                self.tc_workers[item].append(worker["workerId"])
-                # TODO: quarantine data
-                if "quarantineUntil" in worker:
-                    self.quarantined_workers.append(worker["workerId"])
-                if "latestTask" not in worker:
-                    # worker has no lastesttask... brand new or tc restart?
-                    # TODO: eventually alert if this persists
-                    # print("worker %s has no latestTask" % worker["workerId"])
-                    continue
-                an_url = (
-                    "https://firefox-ci-tc.services.mozilla.com/api/queue/v1/task/%s/status"
-                    # "https://queue.taskcluster.net/v1/task/%s/status"
-                    % worker["latestTask"]["taskId"]
-                )
-                json_result2 = utils.get_jsonc(an_url, self.verbosity)
-                if self.verbosity > 2:
-                    print("%s result2: " % worker["workerId"])
-                    self.pp.pprint(json_result2)
-
-                # if a quarantined host's last job is old it will
-                # expire and we can't look at it
-                if "code" in json_result2:
-                    if json_result2["code"] == "ResourceNotFound":
-                        continue
-
-                # look at the last record for the task, could be rescheduled
-                strange_result = True
-                try:
-                    if "status" in json_result2:
-                        if "runs" in json_result2["status"]:
-                            # test pool workers, new workers
-                            # - workers that just started won't have a 'started'
-                            strange_result = False
-                            # normal workers
-                            # - set started_time if data
-                            if "started" in json_result2["status"]["runs"][-1]:
-                                started_time = json_result2["status"]["runs"][-1][
-                                    "started"
-                                ]
-                                if (
-                                    worker["workerId"]
-                                    in self.tc_current_worker_last_started
-                                ):
-                                    if (
-                                        self.tc_current_worker_last_started[
-                                            worker["workerId"]
-                                        ]
-                                        < started_time
-                                    ):
-                                        self.tc_current_worker_last_started[
-                                            worker["workerId"]
-                                        ] = started_time
-                                else:
-                                    self.tc_current_worker_last_started[
-                                        worker["workerId"]
-                                    ] = started_time
-                except KeyError:
-                    # pass, because we mention the strange result below
-                    pass
+            json_result2 = utils.get_jsonc(an_url, self.verbosity)
+            fetched.add(task_id)
+        return json_result2
+
+    # records a worker's quarantine state and the start time of its latest task
+    # (json_result2 is the latest task's status)
+    def set_current_worker(self, item, worker, json_result2):
+        self.tc_workers[item].append(worker["workerId"])
+        # TODO: quarantine data
+        if "quarantineUntil" in worker:
+            self.quarantined_workers.append(worker["workerId"])
+        if "latestTask" not in worker:
+            # worker has no lastesttask... brand new or tc restart?
+            # TODO: eventually alert if this persists
+            # print("worker %s has no latestTask" % worker["workerId"])
+            return
+        if self.verbosity > 2:
+            print("%s result2: " % worker["workerId"])
+            self.pp.pprint(json_result2)
+
+        # if a quarantined host's last job is old it will
+        # expire and we can't look at it
+        if "code" in json_result2:
+            if json_result2["code"] == "ResourceNotFound":
+                return
 
-                if strange_result:
-                    logger.warning(
-                        "strange json_result2 for worker %s: %s"
-                        % (worker["workerId"], json_result2)
-                    )
+        # look at the last record for the task, could be rescheduled
+        strange_result = True
+        try:
+            if "status" in json_result2:
+                if "runs" in json_result2["status"]:
+                    # test pool workers, new workers
+                    # - workers that just started won't have a 'started'
+                    strange_result = False
+                    # normal workers
+                    # - set started_time if data
+                    if "started" in json_result2["status"]["runs"][-1]:
+                        started_time = json_result2["status"]["runs"][-1]["started"]
+                        if worker["workerId"] in self.tc_current_worker_last_started:
+                            if (
+                                self.tc_current_worker_last_started[worker["workerId"]]
+                                < started_time
+                            ):
+                                self.tc_current_worker_last_started[
+                                    worker["workerId"]
+                                ] = started_time
+                        else:
+                            self.tc_current_worker_last_started[
+                                worker["workerId"]
+                            ] = started_time
+        except KeyError:
+            # pass, because we mention the strange result below
+            pass
+
+        if strange_result:
+            logger.warning(
+                "strange json_result2 for worker %s: %s"
+                % (worker["workerId"], json_result2)
+            )
 
-    def show_last_started_report(self, limit=95, show_all=False, verbosity=0):
+    def show_last_started_report(
+        self, limit=95, show_all=False, verbosity=0, snapshot=None
+    ):
+        if snapshot is None:
+            snapshot = self.get_snapshot()
         # TODO: show all queues, not just the ones with data
         # TODO: now that we're defaulting limit, move limit mode to use verbosity.
 
@@ -345,10 +427,10 @@ class WorkerHealth:
             #     % (len(self.devicepool_queues_and_workers))
             # )
 
-        for queue in self.devicepool_queues_and_workers:
+        for queue in snapshot.devicepool_queues_and_workers:
             show_details = True
-            workers = len(self.devicepool_queues_and_workers[queue])
-            jobs = self.tc_queue_counts[queue]
+            workers = len(snapshot.devicepool_queues_and_workers[queue])
+            jobs = snapshot.tc_queue_counts[queue]
             offline_or_tardy = []
 
             print("  %s (%s workers, %s jobs)" % (queue, workers, jobs))
@@ -362,16 +444,17 @@ class WorkerHealth:
                     show_details = False
 
             if show_details:
-                for worker in self.devicepool_queues_and_workers[queue]:
-                    if worker in self.tc_current_worker_last_started:
-                        if self.tc_current_worker_last_started[worker] is None:
+                for worker in snapshot.devicepool_queues_and_workers[queue]:
+                    if worker in snapshot.tc_current_worker_last_started:
+                        if snapshot.tc_current_worker_last_started[worker] is None:
                             print("    %s: present, no task start time!" % worker)
                             continue
-                        now_dt = pendulum.now(tz="UTC")
-                        last_started_dt = pendulum.parse(
-                            self.tc_current_worker_last_started[worker]
+                        difference = tc_time.minutes_between(
+                            snapshot.now,
+                            tc_time.parse(
+                                snapshot.tc_current_worker_last_started[worker]
+                            ),
                         )
-                        difference = now_dt.diff(last_started_dt).in_minutes()
 
                         # display logic
                         display_host = False
@@ -387,7 +470,7 @@ class WorkerHealth:
                                 "    %s: %s: %s"
                                 % (
                                     worker,
-                                    self.tc_current_worker_last_started[worker],
+                                    snapshot.tc_current_worker_last_started[worker],
                                     difference,
                                 )
                             )
@@ -414,65 +497,23 @@ class WorkerHealth:
         # sys.exit(0)
         pass
 
-    # TODO: unit test this
-    def calculate_missing_workers_from_tc(self, limit, exclude_quarantined=False):
+    # returns {queue: [problem workers]}, workers are problems if they're
+    # quarantined (unless exclude_quarantined), or if the queue has more jobs
+    # than workers and they're missing or tardy (see worker_classifier.py)
+    def calculate_missing_workers_from_tc(
+        self, limit, exclude_quarantined=False, snapshot=None
+    ):
+        if snapshot is None:
+            snapshot = self.get_snapshot()
         # TODO: get rid of intermittents
         # store a file with last_seen_online for each host
         #   - if not offline, remove
         #   - if offline, update timestamp in file
         #   - for alerting, see if last_seen_online exceeds threshold (2-5 minutes)
-
-        mw2 = {}
-        for queue in self.devicepool_queues_and_workers:
-            mw2[queue] = []
-
-            # queue-level flags used in decisions below
-            #   - check that there are jobs in this queue, if not continue
-            queue_empty = False
-            if self.tc_queue_counts[queue] == 0:
-                queue_empty = True
-            #   - ensure # of jobs > # of workers
-            #     - only case we're sure the device is having issues
-            more_workers_than_jobs = False
-            if self.tc_queue_counts[queue] < len(
-                self.devicepool_queues_and_workers[queue]
-            ):
-                more_workers_than_jobs = True
-
-            for worker in self.devicepool_queues_and_workers[queue]:
-                if not exclude_quarantined and worker in self.quarantined_workers:
-                    mw2[queue].append(worker)
-                    continue
-
-                if worker in self.tc_current_worker_last_started:
-                    # new workers
-                    if self.tc_current_worker_last_started[worker] is None:
-                        # TODO: track these in a new datastructure
-                        #   - not a 'problem worker' per se
-                        #     - shouldn't alert partners or logging, but good to know
-                        continue
-                    if queue_empty:
-                        continue
-                    if more_workers_than_jobs:
-                        continue
-                    # tardy workers
-                    now_dt = pendulum.now(tz="UTC")
-                    last_started_dt = pendulum.parse(
-                        self.tc_current_worker_last_started[worker]
-                    )
-                    difference = now_dt.diff(last_started_dt).in_minutes()
-                    if difference >= limit:
-                        if exclude_quarantined and worker in self.quarantined_workers:
-                            continue
-                        mw2[queue].append(worker)
-                else:
-                    if queue_empty:
-                        continue
-                    if more_workers_than_jobs:
-                        continue
-                    # fully missing worker
-                    mw2[queue].append(worker)
-        return mw2
+        return {
+            queue: classes.problem_workers(exclude_quarantined)
+            for queue, classes in worker_classifier.classify(snapshot, limit).items()
+        }
 
     def gen_influx_mw_lines(self, queue_to_worker_map, provisioner="proj-autophone"):
         lines = []
@@ -496,9 +537,9 @@ class WorkerHealth:
     def set_queue_counts(self):
         for queue in self.devicepool_queues_and_workers:
             an_url = (
-                "https://firefox-ci-tc.services.mozilla.com/api/queue/v1/pending/%s/%s"
+                "%s/pending/%s/%s"
                 # "https://queue.taskcluster.net/v1/pending/proj-autophone/%s"
-                % ("proj-autophone", queue)
+                % (tc_client.queue_url(), "proj-autophone", queue)
             )
             json_result = utils.get_jsonc(an_url, self.verbosity)
             if "pendingTasks" in json_result:
@@ -552,23 +593,17 @@ class WorkerHealth:
         flattened.sort()
         return flattened
 
-    def get_journalctl_output(self):
-        MINUTES_OF_LOGS_TO_INSPECT = 5
-
-        # NOTE: user running needs to be in adm group to not need sudo
-        cmd = (
-            "journalctl -u bitbar --since '%s minutes ago'" % MINUTES_OF_LOGS_TO_INSPECT
-        )
-        try:
-            res = self.run_cmd(cmd)
-        except subprocess.TimeoutExpired:
-            # just try again for now... should work this time
-            # if not, explode and let systemd restart
-            res = self.run_cmd(cmd)
-        lines = res.split("\n")
-        # output = len(lines)
-        # TODO: check res?
-        return lines
+    # tails the journal in a thread (vs reading the new entries in each
+    # gather_data()). subscribers are called with each JournalEvent.
+    def follow_journal(self, subscribers=()):
+        if not self.journal_follower:
+            self.journal_follower = journal_reader.JournalFollower(
+                self.journal_reader, self.journal_offline_workers
+            )
+            for subscriber in subscribers:
+                self.journal_follower.subscribe(subscriber)
+            self.journal_follower.start()
+        return self.journal_follower
 
     def csv_string_to_list(self, csv_string):
         return list(csv.reader([csv_string], skipinitialspace=True))[0]
@@ -577,47 +612,99 @@ class WorkerHealth:
         if not utils.bitbar_systemd_service_present():
             logger.debug("bitbar systemd service not present, returning early.")
             return {}
-        pattern = r": (.*) WARNING (.*) DISABLED (\d+) OFFLINE (\d+) (.*)"
-        lines = self.get_journalctl_output()
+        # the follower keeps journal_offline_workers up to date. if its thread
+        # died, read the new entries here (the cursor is shared).
+        follower = self.journal_follower
+        if not (follower and follower.thread and follower.thread.is_alive()):
+            with phase_profiler.phase("journalctl"):
+                # only the entries since the last call
+                for timestamp, message in self.journal_reader.read():
+                    self.journal_offline_workers.add(timestamp, message)
         offline_dict = {}
-        for line in lines:
-            m = re.search(pattern, line)
-            if m:
-                # TODO: use worker type as key vs project
-                # - gecko-t-bitbar-gw-perf-p2
-                project = m.group(1).strip()
-                device_group_name = self.devicepool_project_to_tc_worker_type[project]
-                # queue = m.group(2)
-                # disabled_count = m.group(3)
-                # offline_count = m.group(4)
-                offline_hosts = m.group(5)
-                offline_dict[device_group_name] = self.csv_string_to_list(offline_hosts)
+        for project, offline_hosts in self.journal_offline_workers.get(
+            tc_time.now()
+        ).items():
+            # TODO: use worker type as key vs project
+            # - gecko-t-bitbar-gw-perf-p2
+            device_group_name = self.devicepool_project_to_tc_worker_type[project]
+            offline_dict[device_group_name] = self.csv_string_to_list(offline_hosts)
 
         # for k,v in offline_dict.items():
         #     print("%s: %s" % (k, v))
 
         return offline_dict
 
-    # gathers and generates data
+    # gathers the data and returns it as a new snapshot (also kept in
+    # self.snapshot)
     def gather_data(self):
+        started = tc_time.now()
+        # start from scratch, an instance can gather many times (e.g. in
+        # worker_health_daemon.py)
+        self.devicepool_bitbar_device_groups = {}
+        self.devicepool_project_to_tc_worker_type = {}
+        self.devicepool_queues_and_workers = {}
+        self.devicepool_offline_workers = {}
+        self.tc_queue_counts = {}
+        self.tc_current_worker_types = []
+        self.tc_current_worker_last_started = {}
+        self.tc_workers = {}
+        self.quarantined_workers = []
         # from devicepool
-        self.set_configured_worker_counts()
+        with phase_profiler.phase("devicepool config"):
+            if self.manage_devicepool_repo:
+                # only updates every REPO_UPDATE_SECONDS
+                self.clone_or_update(
+                    self.devicepool_git_clone_url, self.devicepool_client_dir
+                )
+            self.set_configured_worker_counts()
         # from queue.tc
-        self.set_queue_counts()
+        with phase_profiler.phase("queue counts"):
+            self.set_queue_counts()
         # from tc
-        self.set_current_worker_types()
-        self.set_current_workers()
+        with phase_profiler.phase("worker types"):
+            self.set_current_worker_types()
+        with phase_profiler.phase("workers and latest tasks"):
+            self.set_current_workers()
+        # from devicepool
+        self.devicepool_offline_workers = self.get_offline_workers_from_journalctl()
+        # after the data, so last started times aren't in the future
+        self.now = tc_time.now()
         # TODO: write these two
         # - missing and offline separate?
         # self.set_problem_workers()
         # self.set_configured_workers()
+        self.snapshot = fleet_snapshot.FleetSnapshot(
+            started,
+            self.now,
+            devicepool_queues_and_workers=self.devicepool_queues_and_workers,
+            devicepool_project_to_tc_worker_type=self.devicepool_project_to_tc_worker_type,
+            devicepool_offline_workers=self.devicepool_offline_workers,
+            tc_queue_counts=self.tc_queue_counts,
+            tc_current_worker_types=self.tc_current_worker_types,
+            tc_workers=self.tc_workers,
+            tc_current_worker_last_started=self.tc_current_worker_last_started,
+            quarantined_workers=self.quarantined_workers,
+        )
+        return self.snapshot
+
+    # returns the latest snapshot, gathering a new one if there isn't one or
+    # it's older than snapshot_ttl seconds
+    def get_snapshot(self, refresh=False):
+        if (
+            refresh
+            or self.snapshot is None
+            or not self.snapshot.is_fresh(self.snapshot_ttl)
+        ):
+            self.gather_data()
+        return self.snapshot
 
     # merged taskcluster tardy and devicepool offline data to one list
     # TODO: add taskcluster missing data
     def get_problem_workers(
-        self, time_limit=None, verbosity=0, exclude_quarantined=False
+        self, time_limit=None, verbosity=0, exclude_quarantined=False, snapshot=None
     ):
-        self.gather_data()
+        if snapshot is None:
+            snapshot = self.get_snapshot()
 
         missing_workers = {}
         missing_workers_flattened = []
@@ -625,12 +712,12 @@ class WorkerHealth:
         offline_workers_flattened = []
 
         missing_workers = self.calculate_missing_workers_from_tc(
-            time_limit, exclude_quarantined=exclude_quarantined
+            time_limit, exclude_quarantined=exclude_quarantined, snapshot=snapshot
         )
         missing_workers_flattened = self.flatten_list(missing_workers.values())
         missing_workers_flattened.sort()
         # print("tc: %s" % missing_workers_flattened)
-        offline_workers = self.get_offline_workers_from_journalctl()
+        offline_workers = snapshot.devicepool_offline_workers
         offline_workers_flattened = self.flatten_list(offline_workers.values())
         offline_workers_flattened.sort()
         # print("dp: %s" % offline_workers_flattened)
@@ -646,16 +733,18 @@ class WorkerHealth:
 
     # returns a dict vs list
     def get_problem_workers2(
-        self, time_limit=None, verbosity=0, exclude_quarantined=False
+        self, time_limit=None, verbosity=0, exclude_quarantined=False, snapshot=None
     ):
-        # TODO: stop calling gather_data in processing/calculation code
-        # - only call when necessary, push up to higher level
-        self.gather_data()
+        if snapshot is None:
+            snapshot = self.get_snapshot()
 
         missing_workers = self.calculate_missing_workers_from_tc(
-            time_limit, exclude_quarantined=exclude_quarantined
+            time_limit, exclude_quarantined=exclude_quarantined, snapshot=snapshot
         )
-        offline_workers = self.get_offline_workers_from_journalctl()
+        # copied, dict_merge_with_dedupe() modifies it
+        offline_workers = {
+            k: list(v) for k, v in snapshot.devicepool_offline_workers.items()
+        }
 
         merged2 = self.dict_merge_with_dedupe(missing_workers, offline_workers)
 
@@ -668,12 +757,16 @@ class WorkerHealth:
         # use flatten_dict if needed in list
         return merged2
 
-    def show_report(self, show_all=False, time_limit=None, verbosity=0):
-        self.gather_data()
+    def show_report(self, show_all=False, time_limit=None, verbosity=0, snapshot=None):
+        if snapshot is None:
+            snapshot = self.get_snapshot()
 
         if verbosity:
             self.show_last_started_report(
-                limit=time_limit, show_all=show_all, verbosity=verbosity
+                limit=time_limit,
+                show_all=show_all,
+                verbosity=verbosity,
+                snapshot=snapshot,
             )
             print("")
 
@@ -687,7 +780,7 @@ class WorkerHealth:
 
             # exclude quarantined as we mention them specifically later
             missing_workers = self.calculate_missing_workers_from_tc(
-                time_limit, exclude_quarantined=True
+                time_limit, exclude_quarantined=True, snapshot=snapshot
             )
             missing_workers_flattened = self.flatten_list(missing_workers.values())
             print(
@@ -698,17 +791,17 @@ class WorkerHealth:
                 )
             )
 
-            if self.quarantined_workers:
+            if snapshot.quarantined_workers:
                 print(
                     output_format
                     % (
-                        "tc-quarantined (%s)" % len(self.quarantined_workers),
-                        self.quarantined_workers,
+                        "tc-quarantined (%s)" % len(snapshot.quarantined_workers),
+                        list(snapshot.quarantined_workers),
                     )
                 )
 
             if utils.bitbar_systemd_service_present():
-                offline_workers = self.get_offline_workers_from_journalctl()
+                offline_workers = snapshot.devicepool_offline_workers
                 offline_workers_flattened = self.flatten_list(offline_workers.values())
                 print(
                     output_format
@@ -734,8 +827,9 @@ class WorkerHealth:
                 )
 
     # devicepool specific
-    def get_report(self, show_all=False, time_limit=None, verbosity=0):
-        self.gather_data()
+    def get_report(self, show_all=False, time_limit=None, verbosity=0, snapshot=None):
+        if snapshot is None:
+            snapshot = self.get_snapshot()
 
         missing_workers = {}
         missing_workers_flattened = []
@@ -747,7 +841,7 @@ class WorkerHealth:
         if time_limit:
             # exclude quarantined as we mention them specifically later
             missing_workers = self.calculate_missing_workers_from_tc(
-                time_limit, exclude_quarantined=True
+                time_limit, exclude_quarantined=True, snapshot=snapshot
             )
             missing_workers_flattened = self.flatten_list(missing_workers.values())
             result_dict["tc"]: missing_workers_flattened
@@ -763,7 +857,7 @@ class WorkerHealth:
             #     )
 
             if utils.bitbar_systemd_service_present():
-                offline_workers = self.get_offline_workers_from_journalctl()
+                offline_workers = snapshot.devicepool_offline_workers
                 offline_workers_flattened = self.flatten_list(offline_workers.values())
                 result_dict["devicepool"] = offline_workers_flattened
 
@@ -777,9 +871,11 @@ class WorkerHealth:
 
             return result_dict
 
-    def influx_report(self, time_limit=None, verbosity=0):
+    def influx_report(self, time_limit=None, verbosity=0, snapshot=None):
+        if snapshot is None:
+            snapshot = self.get_snapshot()
         problem_workers = self.get_problem_workers2(
-            time_limit=time_limit, exclude_quarantined=False
+            time_limit=time_limit, exclude_quarantined=False, snapshot=snapshot
         )
 
         logger.info("generating influx log lines for problem workers...")
@@ -787,7 +883,7 @@ class WorkerHealth:
 
         logger.info("generating influx log lines for configured workers...")
         self.influx_log_lines_to_send.extend(
-            self.gen_influx_cw_lines(self.devicepool_queues_and_workers)
+            self.gen_influx_cw_lines(snapshot.devicepool_queues_and_workers)
         )
 
         # return so caller can display
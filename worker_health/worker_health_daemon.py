@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+import time
+
+import schedule
+
+import phase_profiler
+import tc_client
+import utils
+from influx_logger import InfluxLogger
+from slack_alert import SlackAlert
+from worker_health import WorkerHealth, logger
+
+# runs influx_logger.py's and slack_alert.py's jobs in one process
+#
+# - the jobs share one WorkerHealth, so the fleet is gathered once per
+#   interval instead of once per job. the influx job gathers a new snapshot
+#   every --interval minutes, the hourly slack alert reuses the latest one
+#   while it's younger than --snapshot-ttl seconds (default is the interval).
+# - the jobs read their usual config files (~/.bitbar_influx_logger.toml and
+#   ~/.bitbar_slack_alert.toml)
+# - with --follow-journal the bitbar journal is tailed continuously: the
+#   reports see devicepool's offline workers as of the latest line, and the
+#   jobs get each offline change and test run as it's logged (influx writes
+#   it, slack mentions newly offline workers)
+
+INFLUX_MINUTES = 15
+SLACK_MINUTE_OF_HOUR = 7
+
+
+class WorkerHealthDaemon:
+    def __init__(
+        self,
+        log_level,
+        time_limit,
+        testing_mode,
+        interval=INFLUX_MINUTES,
+        snapshot_ttl=None,
+        profiler=None,
+        follow_journal=False,
+    ):
+        self.testing_mode = testing_mode
+        self.follow_journal = follow_journal
+        self.interval = interval
+        if snapshot_ttl is None:
+            # the influx job's snapshots are stale by its next run
+            snapshot_ttl = interval * 60
+        self.worker_health = WorkerHealth(log_level, snapshot_ttl=snapshot_ttl)
+        self.influx_logger = InfluxLogger(
+            log_level,
+            time_limit,
+            testing_mode,
+            profiler=profiler,
+            worker_health=self.worker_health,
+        )
+        self.slack_alert = SlackAlert(
+            log_level,
+            time_limit,
+            testing_mode,
+            profiler=profiler,
+            worker_health=self.worker_health,
+        )
+
+    def main(self):
+        if self.influx_logger.logging_enabled:
+            logger.info(
+                "influx logging enabled! host is %s" % self.influx_logger.influx_host
+            )
+        else:
+            logger.warning(
+                "influx logging _not_ enabled. please edit '%s' and rerun."
+                % self.influx_logger.configuration_file
+            )
+        if self.slack_alert.alerting_enabled:
+            logger.info("alerting enabled!")
+        else:
+            logger.warning(
+                "alerting _not_ enabled. please edit '%s' and rerun."
+                % self.slack_alert.configuration_file
+            )
+
+        if self.testing_mode:
+            utils.bitbar_systemd_service_present(warn=True)
+            logger.warning(
+                "testing mode enabled! logging and messages can still occur if configured."
+            )
+        elif not utils.bitbar_systemd_service_present(error=True):
+            # check call messages
+            sys.exit(1)
+
+        if self.follow_journal and utils.bitbar_systemd_service_present():
+            logger.info("following the bitbar journal")
+            self.worker_health.follow_journal(
+                subscribers=[
+                    self.influx_logger.on_journal_event,
+                    self.slack_alert.on_journal_event,
+                ]
+            )
+
+        logger.info("influx job will run every %s minutes" % self.interval)
+        schedule.every(self.interval).minutes.do(
+            self.influx_logger.do_worker_influx_logging
+        )
+        minute_at_string = ":%s" % str(SLACK_MINUTE_OF_HOUR).zfill(2)
+        logger.info("slack job will run every hour at %s" % minute_at_string)
+        schedule.every().hour.at(minute_at_string).do(self.slack_alert.slack_alert)
+
+        # run one right now
+        logger.info("running influx job once immediately")
+        self.influx_logger.do_worker_influx_logging()
+        if self.testing_mode:
+            # reuses the influx job's snapshot
+            logger.info("running slack job once immediately")
+            self.slack_alert.slack_alert()
+
+        while True:
+            schedule.run_pending()
+            time.sleep(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="run the influx logging and slack alert jobs with one "
+        "collection per interval."
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        dest="log_level",
+        default=0,
+        help="specify multiple times for even more verbosity",
+    )
+    parser.add_argument(
+        "-t",
+        "--time-limit",
+        type=int,
+        default=95,
+        help="for tc, devices are missing if not reporting for longer than this many minutes. defaults to 95.",
+    )
+    parser.add_argument(
+        "-i",
+        "--interval",
+        type=int,
+        default=INFLUX_MINUTES,
+        help="minutes between collections (and influx logging). defaults to %s."
+        % INFLUX_MINUTES,
+    )
+    parser.add_argument(
+        "--snapshot-ttl",
+        type=int,
+        help="seconds a collection is reused for (defaults to the interval).",
+    )
+    parser.add_argument(
+        "--follow-journal",
+        action="store_true",
+        default=False,
+        help="tail the bitbar journal and pass devicepool's changes to the jobs as they happen.",
+    )
+    parser.add_argument(
+        "--testing-mode",
+        action="store_true",
+        default=False,
+        help="enable testing mode (runs the slack job immediately too).",
+    )
+    tc_client.add_arguments(parser)
+    phase_profiler.add_arguments(parser)
+    args = parser.parse_args()
+    tc_client.from_args(args)
+
+    daemon = WorkerHealthDaemon(
+        args.log_level,
+        args.time_limit,
+        args.testing_mode,
+        interval=args.interval,
+        snapshot_ttl=args.snapshot_ttl,
+        profiler=phase_profiler.from_args(args),
+        follow_journal=args.follow_journal,
+    )
+    daemon.main()
@@ -1,5 +1,10 @@
+import threading
+
 import pytest
 
+import fake_tc_queue
+import journal_reader
+import tc_client
 import worker_health
 
 
@@ -60,3 +65,90 @@ def test_dict_merge_with_dedupe2(wh_instance):
     c = {"a": [1, 3], "b": [4, 5, 6]}
     result = wh_instance.dict_merge_with_dedupe(a, b)
     assert c == result
+
+
+def gather(config_path):
+    wh = worker_health.WorkerHealth(
+        task_cache=False, devicepool_config_path=config_path
+    )
+    wh.gather_data()
+    return wh
+
+
+def test_concurrent_collection_matches_sequential(tmp_path, monkeypatch):
+    fleet = fake_tc_queue.FakeFleet(workers=60, worker_types=4)
+    config_path = str(tmp_path / "config.yml")
+    fleet.write_devicepool_config(config_path)
+    root_url = tc_client.ROOT_URL
+    try:
+        with fake_tc_queue.FakeQueueServer(fleet, page_size=7) as server:
+            tc_client.set_root_url(server.root_url)
+            concurrent = gather(config_path)
+            monkeypatch.setattr(worker_health, "WORKER_TYPE_THREAD_COUNT", 1)
+            monkeypatch.setattr(worker_health, "TASK_STATUS_THREAD_COUNT", 1)
+            sequential = gather(config_path)
+    finally:
+        tc_client.set_root_url(root_url)
+    assert concurrent.tc_current_worker_last_started
+    assert (
+        concurrent.tc_current_worker_last_started
+        == sequential.tc_current_worker_last_started
+    )
+    assert concurrent.tc_workers == sequential.tc_workers
+    assert sum(len(workers) for workers in concurrent.tc_workers.values()) == 60
+    assert concurrent.quarantined_workers == sequential.quarantined_workers
+
+
+def test_reports_share_a_snapshot(tmp_path, capsys):
+    fleet = fake_tc_queue.FakeFleet(workers=20, worker_types=2)
+    config_path = str(tmp_path / "config.yml")
+    fleet.write_devicepool_config(config_path)
+    root_url = tc_client.ROOT_URL
+    try:
+        with fake_tc_queue.FakeQueueServer(fleet) as server:
+            tc_client.set_root_url(server.root_url)
+            wh = worker_health.WorkerHealth(
+                task_cache=False, devicepool_config_path=config_path
+            )
+            tc_client.reset_stats()
+            snapshot = wh.get_snapshot()
+            requests = tc_client.get_stats()["requests"]
+            wh.show_report(time_limit=95, verbosity=1)
+            wh.get_report(time_limit=95)
+            wh.influx_report(time_limit=95)
+            wh.get_problem_workers(time_limit=95)
+            assert wh.get_snapshot() is snapshot
+            assert tc_client.get_stats()["requests"] == requests
+
+            wh.snapshot_ttl = 0
+            fresh = wh.get_snapshot()
+    finally:
+        tc_client.set_root_url(root_url)
+    assert fresh is not snapshot
+    # gathering again starts from scratch
+    assert fresh.tc_workers == snapshot.tc_workers
+    assert fresh.quarantined_workers == snapshot.quarantined_workers
+    assert "tc-quarantined" in capsys.readouterr().out
+
+
+def test_journal_is_read_if_the_follower_died(wh_instance, monkeypatch):
+    now = worker_health.tc_time.now()
+    line = "fake-test-0 WARNING pool DISABLED 0 OFFLINE 1 fake-1"
+    reader = journal_reader.JournalReader()
+    reader.read = lambda: iter([(now, line)])
+    wh_instance.journal_reader = reader
+    wh_instance.devicepool_project_to_tc_worker_type = {
+        "fake-test-0": "gecko-t-fake-test-0"
+    }
+    monkeypatch.setattr(
+        worker_health.utils, "bitbar_systemd_service_present", lambda: True
+    )
+    wh_instance.journal_follower = journal_reader.JournalFollower(
+        reader, wh_instance.journal_offline_workers
+    )
+    wh_instance.journal_follower.thread = threading.Thread(target=lambda: None)
+    wh_instance.journal_follower.thread.start()
+    wh_instance.journal_follower.thread.join()
+    assert wh_instance.get_offline_workers_from_journalctl() == {
+        "gecko-t-fake-test-0": ["fake-1"]
+    }